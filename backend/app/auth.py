@@ -1,19 +1,84 @@
 from fastapi import Header, HTTPException, Depends
+from sqlalchemy import select, event, inspect
 from sqlalchemy.orm import Session
-from .database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from dataclasses import dataclass
+import hmac
+import os
+import uuid
+from .cache import TTLCache, MISSING
+from .database import get_db, get_async_db, AsyncSessionLocal
 from .models import Merchant
+from .ratelimit import rate_limiter, too_many_requests
 
-def get_current_merchant(
-    x_api_key: str = Header(..., alias="X-Api-Key"),
-    x_api_secret: str = Header(..., alias="X-Api-Secret"),
-    db: Session = Depends(get_db)
-) -> Merchant:
-    
-    # Find merchant by API Key
-    merchant = db.query(Merchant).filter(Merchant.api_key == x_api_key).first()
-    
-    # Validate exists and secret matches
-    if not merchant or merchant.api_secret != x_api_secret:
+MERCHANT_CACHE_SIZE = int(os.getenv("MERCHANT_CACHE_SIZE", "10000"))
+MERCHANT_CACHE_TTL = float(os.getenv("MERCHANT_CACHE_TTL", "60"))
+MERCHANT_CACHE_NEGATIVE_TTL = float(os.getenv("MERCHANT_CACHE_NEGATIVE_TTL", "10"))
+
+@dataclass(frozen=True)
+class MerchantSnapshot:
+    """Immutable copy of a merchant row, safe to share between requests."""
+    id: uuid.UUID
+    name: str
+    email: str
+    api_key: str
+    api_secret: str
+    webhook_url: str | None
+    is_active: bool
+
+    @classmethod
+    def from_model(cls, merchant: Merchant) -> "MerchantSnapshot":
+        return cls(
+            id=merchant.id, name=merchant.name, email=merchant.email,
+            api_key=merchant.api_key, api_secret=merchant.api_secret,
+            webhook_url=merchant.webhook_url, is_active=merchant.is_active is not False
+        )
+
+# api_key -> MerchantSnapshot, or None for keys known not to exist (negative entry)
+merchant_cache = TTLCache(maxsize=MERCHANT_CACHE_SIZE, ttl=MERCHANT_CACHE_TTL)
+
+# Compared against on negative hits so unknown keys take as long as wrong secrets
+_DUMMY_SECRET = b"x" * 64
+
+def invalidate_merchant(api_key: str | None = None):
+    """Drop a cached merchant (e.g. after key rotation or deactivation); no key clears everything."""
+    if api_key is None:
+        merchant_cache.clear()
+    else:
+        merchant_cache.pop(api_key)
+
+@event.listens_for(Merchant, "after_insert")
+@event.listens_for(Merchant, "after_update")
+@event.listens_for(Merchant, "after_delete")
+def _invalidate_on_change(mapper, connection, target):
+    # Dropped only once the change commits: at flush time a concurrent miss would re-cache the old row
+    state = inspect(target)
+    keys = state.session.info.setdefault("merchant_cache_keys", set())
+    # Cover both the old and the new key when the api_key itself was rotated
+    keys.update(key for key in {target.api_key, *state.attrs.api_key.history.deleted} if key)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    for key in session.info.pop("merchant_cache_keys", ()):
+        invalidate_merchant(key)
+
+@event.listens_for(Session, "after_rollback")
+def _keep_on_rollback(session):
+    session.info.pop("merchant_cache_keys", None)
+
+def _remember(api_key: str, merchant: Merchant | None) -> MerchantSnapshot | None:
+    if merchant is None:
+        merchant_cache.set(api_key, None, ttl=MERCHANT_CACHE_NEGATIVE_TTL)
+        return None
+    snapshot = MerchantSnapshot.from_model(merchant)
+    merchant_cache.set(api_key, snapshot)
+    return snapshot
+
+def _check_credentials(merchant: MerchantSnapshot | None, x_api_secret: str) -> MerchantSnapshot:
+    # Validate exists, is active and secret matches (constant-time compare)
+    expected = merchant.api_secret.encode() if merchant else _DUMMY_SECRET
+    secret_ok = hmac.compare_digest(expected, x_api_secret.encode())
+    if not merchant or not merchant.is_active or not secret_ok:
         raise HTTPException(
             status_code=401, 
             detail={
@@ -24,4 +89,60 @@ def get_current_merchant(
             }
         )
     
-    return merchant
\ No newline at end of file
+    return merchant
+
+def _admit(merchant: MerchantSnapshot) -> MerchantSnapshot:
+    # Per-merchant token bucket, shared by all workers (see app.ratelimit)
+    wait = rate_limiter.merchant_wait(merchant.id)
+    if wait:
+        raise too_many_requests(wait)
+    return merchant
+
+async def _admit_async(merchant: MerchantSnapshot) -> MerchantSnapshot:
+    wait = await rate_limiter.merchant_wait_async(merchant.id)
+    if wait:
+        raise too_many_requests(wait)
+    return merchant
+
+def get_current_merchant(
+    x_api_key: str = Header(..., alias="X-Api-Key"),
+    x_api_secret: str = Header(..., alias="X-Api-Secret"),
+    db: Session = Depends(get_db)
+) -> MerchantSnapshot:
+    
+    # Find merchant by API Key (cache first)
+    merchant = merchant_cache.get(x_api_key)
+    if merchant is MISSING:
+        row = db.query(Merchant).filter(Merchant.api_key == x_api_key).first()
+        merchant = _remember(x_api_key, row)
+    
+    return _admit(_check_credentials(merchant, x_api_secret))
+
+async def authenticate(api_key: str, api_secret: str) -> MerchantSnapshot | None:
+    """The merchant these credentials belong to, or None if they are invalid.
+
+    For middleware that must know the caller before the route runs; no rate
+    limiting, the route's own dependency still applies it.
+    """
+    merchant = merchant_cache.get(api_key)
+    if merchant is MISSING:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Merchant).where(Merchant.api_key == api_key))
+            merchant = _remember(api_key, result.scalars().first())
+    try:
+        return _check_credentials(merchant, api_secret)
+    except HTTPException:
+        return None
+
+async def get_current_merchant_async(
+    x_api_key: str = Header(..., alias="X-Api-Key"),
+    x_api_secret: str = Header(..., alias="X-Api-Secret"),
+    db: AsyncSession = Depends(get_async_db)
+) -> MerchantSnapshot:
+    """Same as get_current_merchant, for `async def` routes."""
+    merchant = merchant_cache.get(x_api_key)
+    if merchant is MISSING:
+        result = await db.execute(select(Merchant).where(Merchant.api_key == x_api_key))
+        merchant = _remember(x_api_key, result.scalars().first())
+
+    return await _admit_async(_check_credentials(merchant, x_api_secret))
\ No newline at end of file
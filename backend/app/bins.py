@@ -0,0 +1,72 @@
+import csv
+import os
+from dataclasses import dataclass
+
+# Range file: range_start,range_end,network,issuer,card_type,country
+# Both bounds are digit prefixes of the same length ("51","55" = 51xxxx..55xxxx).
+# More specific (longer) ranges override shorter ones.
+BIN_TABLE_PATH = os.getenv("BIN_TABLE_PATH", os.path.join(os.path.dirname(__file__), "data", "bin_ranges.csv"))
+# Refuse ranges that would expand into an unreasonable number of prefixes
+MAX_PREFIXES_PER_RANGE = 100_000
+
+
+@dataclass(frozen=True)
+class BinInfo:
+    network: str
+    issuer: str | None = None
+    card_type: str | None = None # credit / debit / prepaid
+    country: str | None = None # ISO 3166-1 alpha-2
+
+
+UNKNOWN = BinInfo("unknown")
+
+
+class BinTable:
+    """Prefix index over BIN ranges.
+
+    Each range is expanded into its fixed-length prefixes and stored in one dict
+    per prefix length, so a lookup is a handful of dict probes (longest length
+    first) regardless of how many ranges are loaded.
+    """
+
+    def __init__(self, ranges: list[tuple[str, str, BinInfo]]):
+        self._by_length: dict[int, dict[str, BinInfo]] = {}
+        for start, end, info in ranges:
+            if len(start) != len(end) or not (start + end).isdigit() or int(start) > int(end):
+                raise ValueError(f"Bad BIN range {start}-{end}")
+            if int(end) - int(start) >= MAX_PREFIXES_PER_RANGE:
+                raise ValueError(f"BIN range {start}-{end} is too wide")
+            prefixes = self._by_length.setdefault(len(start), {})
+            for value in range(int(start), int(end) + 1):
+                prefixes[str(value).zfill(len(start))] = info
+        self._lengths = sorted(self._by_length, reverse=True)
+
+    @classmethod
+    def load(cls, path: str) -> "BinTable":
+        # Ranges share a handful of distinct BinInfo values; keep one object per value
+        interned: dict[BinInfo, BinInfo] = {}
+        ranges = []
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                info = BinInfo(
+                    network=row["network"],
+                    issuer=row.get("issuer") or None,
+                    card_type=row.get("card_type") or None,
+                    country=row.get("country") or None,
+                )
+                ranges.append((row["range_start"].strip(), row["range_end"].strip(), interned.setdefault(info, info)))
+        return cls(ranges)
+
+    def lookup(self, digits: str) -> BinInfo:
+        """Most specific match for a digits-only card number (or BIN)."""
+        for length in self._lengths:
+            info = self._by_length[length].get(digits[:length])
+            if info is not None:
+                return info
+        return UNKNOWN
+
+    def __len__(self) -> int:
+        return sum(len(prefixes) for prefixes in self._by_length.values())
+
+
+bin_table = BinTable.load(BIN_TABLE_PATH)
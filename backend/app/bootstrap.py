@@ -0,0 +1,121 @@
+"""One-shot startup tasks: schema migrations, this month's partitions and the test merchant.
+
+    python -m app.bootstrap   # run them and exit (a release / pre-deploy step)
+
+They run once per deployment, not once per worker: `python -m app.serve` runs
+them in the supervisor before starting its workers and tells the workers to
+skip them (RUN_STARTUP_TASKS=false). A plain `uvicorn app.main:app` still runs
+them from the lifespan hook. Processes that get here at the same time queue on
+a lock (a Postgres advisory lock, or a file lock next to a SQLite database),
+and all but the first find nothing left to do.
+"""
+import contextlib
+import fcntl
+import os
+import sys
+import uuid
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect, text
+
+from .database import SessionLocal, engine
+from .models import Merchant
+from .partitions import enabled as partitions_enabled, ensure_partitions
+
+# false in workers whose supervisor (or a release step) already ran the tasks
+RUN_STARTUP_TASKS = os.getenv("RUN_STARTUP_TASKS", "true").lower() == "true"
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+# Databases created by create_all before migrations existed have at least this
+# schema; the revisions after it only add what such a database is missing
+BASELINE_REVISION = "0001"
+# pg_advisory_lock key serialising startup tasks across processes and hosts
+_STARTUP_LOCK = 0x626F6F74 # "boot"
+
+TEST_MERCHANT_ID = uuid.UUID("550e8400-e29b-41d4-a716-446655440000")
+
+
+def alembic_config(connection=None) -> Config:
+    """Alembic config for this app; migrations run on `connection` when given."""
+    config = Config(ALEMBIC_INI)
+    config.attributes["connection"] = connection
+    return config
+
+
+@contextlib.contextmanager
+def startup_lock(conn):
+    """Held for the duration of the startup tasks; blocks while another process holds it."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _STARTUP_LOCK})
+        conn.commit() # session-level: outlives the transactions below
+        try:
+            yield
+        finally:
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _STARTUP_LOCK})
+            conn.commit()
+    elif conn.dialect.name == "sqlite" and conn.engine.url.database not in (None, "", ":memory:"):
+        with open(f"{conn.engine.url.database}.startup.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX) # released when the file closes
+            yield
+    else:
+        yield
+
+
+def migrate(conn) -> str | None:
+    """Upgrade the schema to the newest revision; returns the revision it started from (None: empty)."""
+    config = alembic_config(conn)
+    current = MigrationContext.configure(conn).get_current_revision()
+    head = ScriptDirectory.from_config(config).get_current_head()
+    if current != head:
+        if current is None and inspect(conn).has_table("merchants"):
+            print(f"🗄️ Schema predates migrations, stamping it at revision {BASELINE_REVISION}")
+            command.stamp(config, BASELINE_REVISION)
+            current = BASELINE_REVISION
+        command.upgrade(config, "head")
+        print(f"🗄️ Schema migrated from {current or 'empty'} to {head}")
+    conn.commit() # the migrations ran inside this connection's transaction
+    return current
+
+
+def seed_test_merchant():
+    db = SessionLocal()
+    try:
+        existing = db.query(Merchant).filter(Merchant.id == TEST_MERCHANT_ID).first()
+        if not existing:
+            print("🌱 Seeding Test Merchant...")
+            test_merchant = Merchant(
+                id=TEST_MERCHANT_ID, name="Test Merchant", email="test@example.com",
+                api_key="key_test_abc123", api_secret="secret_test_xyz789", is_active=True
+            )
+            db.add(test_merchant)
+            db.commit()
+    except Exception as e:
+        print(f"❌ Seeding Failed: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def run_startup_tasks():
+    """Migrate, provision partitions and seed, under the startup lock."""
+    with engine.connect() as conn, startup_lock(conn):
+        migrate(conn)
+        if partitions_enabled(conn):
+            # Inserts fail outright without a partition for the current month
+            with conn.begin():
+                for name in ensure_partitions(conn):
+                    print(f"🗓️ Created partition {name}")
+        seed_test_merchant()
+
+
+if __name__ == "__main__":
+    try:
+        run_startup_tasks()
+    except Exception as e:
+        print(f"❌ Startup tasks failed: {e}")
+        sys.exit(1)
+    print("✅ Startup tasks done")
@@ -0,0 +1,123 @@
+import os
+import uuid
+from dataclasses import dataclass
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from .cache import TTLCache, MISSING
+from .ids import first_by_id_async
+from .models import Merchant, Order
+
+# Checkout links are shared widely (flash sales), so the public order lookup is
+# read-through cached. Orders and merchant names are cached separately: a
+# merchant rename then drops one entry instead of every order view.
+CHECKOUT_CACHE_SIZE = int(os.getenv("CHECKOUT_CACHE_SIZE", "50000"))
+CHECKOUT_CACHE_TTL = float(os.getenv("CHECKOUT_CACHE_TTL", "30"))
+CHECKOUT_CACHE_NEGATIVE_TTL = float(os.getenv("CHECKOUT_CACHE_NEGATIVE_TTL", "5"))
+MERCHANT_NAME_CACHE_TTL = float(os.getenv("MERCHANT_NAME_CACHE_TTL", "300"))
+
+
+@dataclass(frozen=True)
+class CheckoutOrder:
+    """The few order fields the checkout page shows."""
+    id: str
+    amount: int
+    currency: str
+    status: str
+    merchant_id: uuid.UUID
+
+
+# order_id -> CheckoutOrder, or None for ids known not to exist (negative entry)
+checkout_cache = TTLCache(maxsize=CHECKOUT_CACHE_SIZE, ttl=CHECKOUT_CACHE_TTL)
+# merchant_id -> display name
+merchant_name_cache = TTLCache(maxsize=CHECKOUT_CACHE_SIZE, ttl=MERCHANT_NAME_CACHE_TTL)
+
+
+# Entries are dropped once the change commits: dropped at flush, a concurrent
+# miss could cache the old row (or a 404 for a new order) again before then.
+def _stage(target, name: str):
+    inspect(target).session.info.setdefault(name, set()).add(target.id)
+
+
+def forget_orders(session, order_ids):
+    """Drop `order_ids` from the checkout cache when `session` commits.
+
+    For rows written without the ORM's flush events, e.g. bulk INSERTs.
+    """
+    session.info.setdefault("checkout_orders", set()).update(order_ids)
+
+
+@event.listens_for(Order, "after_update")
+@event.listens_for(Order, "after_delete")
+def _invalidate_order(mapper, connection, target):
+    _stage(target, "checkout_orders")
+
+
+@event.listens_for(Order, "after_insert")
+def _forget_missing_order(mapper, connection, target):
+    # A link opened before its order was committed may have cached a 404
+    _stage(target, "checkout_orders")
+
+
+@event.listens_for(Merchant, "after_update")
+@event.listens_for(Merchant, "after_delete")
+def _invalidate_merchant_name(mapper, connection, target):
+    _stage(target, "checkout_merchant_names")
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    for order_id in session.info.pop("checkout_orders", ()):
+        checkout_cache.pop(order_id)
+    for merchant_id in session.info.pop("checkout_merchant_names", ()):
+        merchant_name_cache.pop(merchant_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _keep_on_rollback(session):
+    session.info.pop("checkout_orders", None)
+    session.info.pop("checkout_merchant_names", None)
+
+
+async def get_checkout_view(db_factory, order_id: str) -> dict | None:
+    """Public view of an order, or None when it does not exist.
+
+    Cache hits never touch the database; `db_factory` (e.g. AsyncSessionLocal)
+    is only opened on a miss.
+    """
+    order = checkout_cache.get(order_id)
+    if order is None:
+        return None
+
+    if order is MISSING:
+        async with db_factory() as db:
+            async def fetch(criteria):
+                return (await db.execute(
+                    select(Order.id, Order.amount, Order.currency, Order.status, Order.merchant_id, Merchant.name)
+                    .join(Merchant, Merchant.id == Order.merchant_id)
+                    .where(*criteria)
+                )).first()
+
+            row = await first_by_id_async(Order, order_id, fetch)
+        if row is None:
+            checkout_cache.set(order_id, None, ttl=CHECKOUT_CACHE_NEGATIVE_TTL)
+            return None
+        order = CheckoutOrder(id=row.id, amount=row.amount, currency=row.currency, status=row.status, merchant_id=row.merchant_id)
+        merchant_name = row.name
+        checkout_cache.set(order_id, order)
+        merchant_name_cache.set(order.merchant_id, merchant_name)
+    else:
+        merchant_name = merchant_name_cache.get(order.merchant_id)
+        if merchant_name is MISSING:
+            async with db_factory() as db:
+                merchant_name = (await db.execute(select(Merchant.name).where(Merchant.id == order.merchant_id))).scalar()
+            merchant_name_cache.set(order.merchant_id, merchant_name)
+
+    return {
+        "id": order.id,
+        "amount": order.amount,
+        "currency": order.currency,
+        "status": order.status,
+        "merchant_name": merchant_name,
+    }
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import os
+
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from .database import ASYNC_DATABASE_URL
+
+# Postgres channel carrying payment status changes between workers
+PAYMENT_EVENTS_CHANNEL = os.getenv("PAYMENT_EVENTS_CHANNEL", "payment_status")
+PAYMENT_EVENTS_RECONNECT_DELAY = 1.0
+
+
+class PaymentEventHub:
+    """In-process fan-out of payment status changes to parked SSE clients.
+
+    With Postgres, status changes are sent with NOTIFY inside the writing
+    transaction and every worker LISTENs, so a client parked on any worker
+    wakes up. Without it (SQLite stand-in) events are delivered after commit
+    to subscribers in the same process only.
+    """
+
+    def __init__(self):
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._listener: asyncio.Task | None = None
+        self.listening = False
+        self.published = 0
+
+    # --- Subscribers (event loop only) ---
+    def subscribe(self, payment_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(payment_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, payment_id: str, queue: asyncio.Queue):
+        waiters = self._subscribers.get(payment_id)
+        if waiters is not None:
+            waiters.discard(queue)
+            if not waiters:
+                del self._subscribers[payment_id]
+
+    def _deliver(self, message: dict):
+        self.published += 1
+        for queue in self._subscribers.get(message["id"], ()):
+            queue.put_nowait(message)
+
+    def publish_local(self, message: dict):
+        """Wake subscribers in this process; callable from any thread."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._deliver, message)
+
+    # --- Producers ---
+    async def stage(self, db, payment):
+        """Queue a status event on `db`'s transaction; it goes out only if the commit succeeds."""
+        message = {
+            "id": payment.id,
+            "status": payment.status,
+            "error_code": payment.error_code,
+            "error_description": payment.error_description,
+        }
+        if self.listening:
+            await db.execute(select(func.pg_notify(PAYMENT_EVENTS_CHANNEL, json.dumps(message))))
+        else:
+            db.sync_session.info.setdefault("payment_events", []).append(message)
+
+    # --- Lifecycle ---
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        if make_url(ASYNC_DATABASE_URL).get_backend_name() == "postgresql" and self._listener is None:
+            self._listener = asyncio.create_task(self._listen_forever())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        self.listening = False
+
+    async def _listen_forever(self):
+        import asyncpg
+
+        dsn = make_url(ASYNC_DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+
+        def on_notify(connection, pid, channel, payload):
+            self._deliver(json.loads(payload))
+
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _: lost.set())
+                await conn.add_listener(PAYMENT_EVENTS_CHANNEL, on_notify)
+                self.listening = True
+                await lost.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Payment event listener error: {e}")
+            finally:
+                self.listening = False
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(PAYMENT_EVENTS_RECONNECT_DELAY)
+
+
+payment_events = PaymentEventHub()
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session):
+    for message in session.info.pop("payment_events", ()):
+        payment_events.publish_local(message)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session):
+    session.info.pop("payment_events", None)
@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from .auth import authenticate
+from .cache import TTLCache, MISSING
+from .database import AsyncSessionLocal
+from .ids import is_unique_violation
+from .models import IdempotencyKey
+
+# POST endpoints that honour the Idempotency-Key header
+IDEMPOTENT_PATHS = {"/api/v1/payments", "/api/v1/orders", "/api/v1/orders/batch"}
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+# How long a claim may stay "in progress" before another worker may take it over
+IDEMPOTENCY_LOCK_TIMEOUT = float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "60"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_CACHE_TTL = float(os.getenv("IDEMPOTENCY_CACHE_TTL", "300"))
+IDEMPOTENCY_SWEEP_INTERVAL = float(os.getenv("IDEMPOTENCY_SWEEP_INTERVAL", "300"))
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    request_hash: str
+    status_code: int
+    body: bytes
+
+
+def _should_store(status_code: int) -> bool:
+    # Only keep responses produced by the endpoint itself; auth failures,
+    # throttling and server errors can succeed on a retry
+    return status_code < 500 and status_code not in (401, 409, 429)
+
+
+def _error(status_code: int, code: str, description: str) -> StoredResponse:
+    body = json.dumps({"detail": {"error": {"code": code, "description": description}}}).encode()
+    return StoredResponse(request_hash="", status_code=status_code, body=body)
+
+
+class IdempotencyStore:
+    """Idempotency-Key records: DB table for durability, TTLCache in front of it."""
+
+    def __init__(self):
+        self.cache = TTLCache(maxsize=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_CACHE_TTL)
+        self._sweeper: asyncio.Task | None = None
+        self.swept = 0
+
+    async def claim(self, scope: str, key: str, request_hash: str) -> IdempotencyKey | None:
+        """Insert an in-progress row. Returns None when we own the key, else the existing row."""
+        now = datetime.now(timezone.utc)
+        async with AsyncSessionLocal() as db:
+            # An expired record (or an abandoned claim) no longer protects the key
+            await db.execute(delete(IdempotencyKey).where(
+                IdempotencyKey.scope == scope, IdempotencyKey.key == key, IdempotencyKey.expires_at <= now
+            ))
+            db.add(IdempotencyKey(
+                scope=scope, key=key, request_hash=request_hash,
+                expires_at=now + timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT)
+            ))
+            try:
+                await db.commit()
+                return None
+            except IntegrityError as e:
+                await db.rollback()
+                if not is_unique_violation(e):
+                    raise
+            result = await db.execute(select(IdempotencyKey).where(IdempotencyKey.scope == scope, IdempotencyKey.key == key))
+            return result.scalars().first()
+
+    async def complete(self, scope: str, key: str, record: StoredResponse):
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=IDEMPOTENCY_TTL)
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(IdempotencyKey).where(IdempotencyKey.scope == scope, IdempotencyKey.key == key).values(
+                status_code=record.status_code, response_body=record.body.decode(), expires_at=expires_at
+            ))
+            await db.commit()
+        self.cache.set((scope, key), record)
+
+    async def release(self, scope: str, key: str):
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(IdempotencyKey).where(IdempotencyKey.scope == scope, IdempotencyKey.key == key))
+            await db.commit()
+
+    async def wait_for(self, scope: str, key: str) -> IdempotencyKey | None:
+        """Poll a key another worker is executing until it completes or the lock times out."""
+        deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_LOCK_TIMEOUT
+        while asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.1)
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(IdempotencyKey).where(IdempotencyKey.scope == scope, IdempotencyKey.key == key))
+                row = result.scalars().first()
+            if row is None or row.status_code is not None:
+                return row
+        return None
+
+    async def sweep(self) -> int:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.now(timezone.utc)))
+            await db.commit()
+        self.swept += result.rowcount or 0
+        return result.rowcount or 0
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(IDEMPOTENCY_SWEEP_INTERVAL)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"❌ Idempotency sweep failed: {e}")
+
+    async def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+
+idempotency_store = IdempotencyStore()
+
+
+class IdempotencyMiddleware:
+    """Replays the stored response for a repeated Idempotency-Key.
+
+    Concurrent requests with the same key in this process wait on the first
+    one instead of executing again; across processes the DB row acts as the lock.
+    """
+
+    def __init__(self, app, store: IdempotencyStore = idempotency_store):
+        self.app = app
+        self.store = store
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in IDEMPOTENT_PATHS:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        key = headers.get(b"idempotency-key", b"").decode()
+        api_key = headers.get(b"x-api-key", b"").decode("latin-1")
+        api_secret = headers.get(b"x-api-secret", b"").decode("latin-1")
+        if not key or not api_key:
+            return await self.app(scope, receive, send)
+        if len(key) > 255:
+            return await self._send(send, _error(400, "BAD_REQUEST_ERROR", "Idempotency-Key is too long"), replayed=False)
+
+        # Authenticate before touching stored responses: bad credentials go
+        # straight to the route (401) and can neither replay nor claim a key
+        merchant = await authenticate(api_key, api_secret)
+        if merchant is None:
+            return await self.app(scope, receive, send)
+
+        # Keys are per merchant and per endpoint
+        store_key = (hashlib.sha256(f"{merchant.id}\n{scope['path']}".encode()).hexdigest(), key)
+        body = await _read_body(receive)
+        request_hash = hashlib.sha256(scope["path"].encode() + b"\n" + body).hexdigest()
+
+        while True:
+            record = self.store.cache.get(store_key)
+            if record is not MISSING:
+                return await self._replay(send, record, request_hash)
+
+            leader = self._inflight.get(store_key)
+            if leader is None:
+                break
+            record = await asyncio.shield(leader)
+            if record is not None:
+                return await self._replay(send, record, request_hash)
+            # The first attempt failed without a stored response; loop and run it ourselves
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[store_key] = future
+        record = None
+        try:
+            record = await self._execute(scope, receive, send, store_key, body, request_hash)
+        finally:
+            self._inflight.pop(store_key, None)
+            future.set_result(record)
+
+    async def _execute(self, scope, receive, send, store_key, body, request_hash) -> StoredResponse | None:
+        existing = await self.store.claim(*store_key, request_hash)
+        if existing is not None and existing.status_code is None:
+            # Another worker is running this key right now
+            existing = await self.store.wait_for(*store_key)
+            if existing is None or existing.status_code is None:
+                return await self._send(send, _error(409, "IDEMPOTENCY_IN_PROGRESS", "A request with this Idempotency-Key is still being processed"), replayed=False)
+        if existing is not None:
+            record = StoredResponse(existing.request_hash, existing.status_code, existing.response_body.encode())
+            self.store.cache.set(store_key, record)
+            await self._replay(send, record, request_hash)
+            return record
+
+        # We own the key: run the endpoint, teeing the response
+        status_code = 500
+        chunks = []
+
+        async def capture(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, _replay_body(body, receive), capture)
+        except BaseException:
+            await asyncio.shield(self.store.release(*store_key))
+            raise
+
+        if not _should_store(status_code):
+            await self.store.release(*store_key)
+            return None
+        record = StoredResponse(request_hash, status_code, b"".join(chunks))
+        await self.store.complete(*store_key, record)
+        return record
+
+    async def _replay(self, send, record: StoredResponse, request_hash: str):
+        if record.request_hash != request_hash:
+            return await self._send(send, _error(422, "IDEMPOTENCY_ERROR", "Idempotency-Key was already used with a different request"), replayed=False)
+        return await self._send(send, record, replayed=True)
+
+    @staticmethod
+    async def _send(send, record: StoredResponse, replayed: bool):
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(record.body)).encode())]
+        if replayed:
+            headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": record.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": record.body})
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def _replay_body(body: bytes, receive):
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay
@@ -0,0 +1,131 @@
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.exc import IntegrityError
+
+# IDs are `<prefix>_` + 16 base62 chars: 8 chars of millisecond timestamp followed
+# by 8 chars holding 47 bits from the OS CSPRNG. The alphabet is in
+# ASCII order, so IDs sort by creation time and new rows land at the right edge
+# of the primary-key B-tree instead of at random pages.
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+TIME_CHARS = 8
+RANDOM_CHARS = 8
+RANDOM_BITS = 47 # 2**47 < 62**8, so it always fits in RANDOM_CHARS
+ID_INSERT_ATTEMPTS = 3
+# Orders and payments take created_at from their id; rows written before that
+# still landed within this much of the time in their id
+ID_TIME_SLACK = timedelta(minutes=1)
+
+_BASE = len(ALPHABET)
+_PAIR_BASE = _BASE * _BASE
+_PAIRS = [a + b for a in ALPHABET for b in ALPHABET]
+_DIGITS = {char: value for value, char in enumerate(ALPHABET)}
+_sysrand = secrets.SystemRandom()
+
+
+def _encode8(value: int) -> str:
+    # Fixed-width base62, two digits per divmod
+    value, d = divmod(value, _PAIR_BASE)
+    value, c = divmod(value, _PAIR_BASE)
+    a, b = divmod(value, _PAIR_BASE)
+    return _PAIRS[a] + _PAIRS[b] + _PAIRS[c] + _PAIRS[d]
+
+
+def new_id(prefix: str) -> str:
+    millis = time.time_ns() // 1_000_000
+    return f"{prefix}_{_encode8(millis)}{_encode8(_sysrand.getrandbits(RANDOM_BITS))}"
+
+
+def new_order_id() -> str:
+    """Format: order_ + 16 alphanumeric chars"""
+    return new_id("order")
+
+
+def new_payment_id() -> str:
+    """Format: pay_ + 16 alphanumeric chars"""
+    return new_id("pay")
+
+
+def id_created_at(value: str) -> datetime:
+    """Creation time encoded in an ID produced by new_id; ValueError if it has none.
+
+    Orders and payments take their created_at from it (see app.models).
+    """
+    _, separator, body = value.partition("_")
+    if not separator or len(body) != TIME_CHARS + RANDOM_CHARS or not _DIGITS.keys() >= set(body):
+        raise ValueError(f"{value!r} is not a <prefix>_<16 base62 chars> ID")
+    millis = 0
+    for char in body[:TIME_CHARS]:
+        millis = millis * _BASE + _DIGITS[char]
+    return datetime.fromtimestamp(millis / 1000, tz=timezone.utc)
+
+
+# --- Lookup by id ---
+# Orders and payments are partitioned on created_at, so a lookup by id alone
+# probes every partition. Bounding created_at by the time in the id lets
+# Postgres prune to one month; rows whose id carries no time (created before
+# ids did) are found by a second, unbounded lookup.
+
+def id_window(model, value: str) -> tuple:
+    """created_at predicates for the row with this id; () if the id carries no time."""
+    try:
+        created_at = id_created_at(value)
+    except ValueError:
+        return ()
+    return (model.created_at >= created_at - ID_TIME_SLACK, model.created_at <= created_at + ID_TIME_SLACK)
+
+
+def first_by_id(model, value: str, fetch):
+    """`fetch(criteria)` for the id within its created_at window, then for the id alone."""
+    window = id_window(model, value)
+    row = fetch((model.id == value, *window))
+    if row is None and window:
+        row = fetch((model.id == value,))
+    return row
+
+
+async def first_by_id_async(model, value: str, fetch):
+    window = id_window(model, value)
+    row = await fetch((model.id == value, *window))
+    if row is None and window:
+        row = await fetch((model.id == value,))
+    return row
+
+
+def is_unique_violation(exc: IntegrityError) -> bool:
+    orig = exc.orig
+    code = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+    if code:
+        return code == "23505"
+    return "UNIQUE constraint failed" in str(orig)
+
+
+# --- Insert with retry ---
+# Uniqueness is left to the primary key: insert, and only on a duplicate-key
+# error roll back, draw a fresh ID and try again.
+
+def commit_with_new_id(db, obj, make_id):
+    for attempt in range(ID_INSERT_ATTEMPTS):
+        db.add(obj)
+        try:
+            db.commit()
+            return obj
+        except IntegrityError as e:
+            db.rollback()
+            if attempt == ID_INSERT_ATTEMPTS - 1 or not is_unique_violation(e):
+                raise
+            obj.id = make_id()
+
+
+async def commit_with_new_id_async(db, obj, make_id):
+    for attempt in range(ID_INSERT_ATTEMPTS):
+        db.add(obj)
+        try:
+            await db.commit()
+            return obj
+        except IntegrityError as e:
+            await db.rollback()
+            if attempt == ID_INSERT_ATTEMPTS - 1 or not is_unique_violation(e):
+                raise
+            obj.id = make_id()
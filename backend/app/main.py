@@ -1,40 +1,59 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
 from contextlib import asynccontextmanager
-import uuid
-
-from .database import engine, Base, SessionLocal
-from .models import Merchant
-from .routers import health, test_routes, orders, payments, public # <--- Added public
-
-def seed_test_merchant():
-    db = SessionLocal()
-    try:
-        TEST_ID = uuid.UUID("550e8400-e29b-41d4-a716-446655440000")
-        existing = db.query(Merchant).filter(Merchant.id == TEST_ID).first()
-        if not existing:
-            print("🌱 Seeding Test Merchant...")
-            test_merchant = Merchant(
-                id=TEST_ID, name="Test Merchant", email="test@example.com",
-                api_key="key_test_abc123", api_secret="secret_test_xyz789", is_active=True
-            )
-            db.add(test_merchant)
-            db.commit()
-    except Exception as e:
-        print(f"❌ Seeding Failed: {e}")
-        db.rollback()
-    finally:
-        db.close()
+
+from .database import async_engine
+from .bootstrap import RUN_STARTUP_TASKS, run_startup_tasks
+from .settlement import settlement_queue
+from .processing import payment_processor
+from .recovery import recovery_sweeper
+from .idempotency import IdempotencyMiddleware, idempotency_store
+from .metrics import MetricsMiddleware, metrics_sampler
+from .partitions import partition_maintainer
+from .replicas import ReadYourWritesMiddleware, read_router
+from .ratelimit import rate_limiter
+from .profiling import ProfilingMiddleware, loop_watchdog, middleware_enabled
+from .events import payment_events
+from .webhooks import webhook_dispatcher
+from .routers import health, test_routes, orders, payments, public, stats, cards # <--- Added public
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    Base.metadata.create_all(bind=engine)
-    seed_test_merchant()
+    # Migrations, partitions and seeding; skipped in `python -m app.serve` workers, whose supervisor ran them once
+    if RUN_STARTUP_TASKS:
+        run_startup_tasks()
+    await partition_maintainer.start()
+    await read_router.start()
+    await rate_limiter.start()
+    await payment_events.start()
+    await settlement_queue.start(payment_processor.settle)
+    await recovery_sweeper.start()
+    await idempotency_store.start()
+    await webhook_dispatcher.start()
+    await loop_watchdog.start()
+    await metrics_sampler.start()
     yield
+    await metrics_sampler.stop()
+    await loop_watchdog.stop()
+    await webhook_dispatcher.stop()
+    await idempotency_store.stop()
+    await recovery_sweeper.stop()
+    await settlement_queue.stop()
+    await payment_events.stop()
+    await partition_maintainer.stop()
+    await read_router.stop()
+    await rate_limiter.stop()
+    await async_engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
 
+# --- Idempotency-Key replay for POST /payments and /orders (inside CORS) ---
+app.add_middleware(IdempotencyMiddleware)
+
+# --- Read-your-writes pinning for replica routing (only with DATABASE_REPLICA_URLS) ---
+if read_router.enabled:
+    app.add_middleware(ReadYourWritesMiddleware)
+
 # --- CORS (Allow Frontend to talk to Backend) ---
 app.add_middleware(
     CORSMiddleware,
@@ -42,13 +61,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Prev-Cursor", "X-Has-More", "Idempotent-Replayed", "X-Profile-File", "Retry-After"],
 )
 
+# --- Opt-in request profiling / slow-query attribution (PROFILE_*, SLOW_QUERY_MS) ---
+if middleware_enabled():
+    app.add_middleware(ProfilingMiddleware)
+
+# --- Prometheus request metrics (outermost, so it times everything above) ---
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(health.router)
 app.include_router(test_routes.router)
 app.include_router(orders.router)
 app.include_router(payments.router)
 app.include_router(public.router) # <--- Register Public Router
+app.include_router(stats.router)
+app.include_router(cards.router)
 
 @app.get("/")
 def read_root():
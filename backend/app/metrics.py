@@ -0,0 +1,272 @@
+import asyncio
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# With PROMETHEUS_MULTIPROC_DIR (app.serve sets it for several workers) each
+# worker writes its samples there and any worker's /metrics reports them all;
+# gauges say how they combine (multiprocess_mode). Without it, everything here
+# is per process.
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+# Seconds between background refreshes of sampled gauges (0 = off)
+METRICS_SAMPLE_INTERVAL = float(os.getenv("METRICS_SAMPLE_INTERVAL", "5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+# --- HTTP ---
+REQUESTS = Counter("http_requests_total", "HTTP requests by route template and status", ["method", "route", "status"])
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route"], buckets=LATENCY_BUCKETS)
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served", ["method"], multiprocess_mode="livesum")
+RATE_LIMITED = Counter("http_rate_limited_total", "Requests refused by admission control (429/503)", ["scope"])
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements", "SQL statements executed per request", ["route"],
+    buckets=(0, 1, 2, 3, 4, 5, 8, 12, 20, 50, 100)
+)
+REQUEST_SQL_SECONDS = Histogram("http_request_sql_seconds", "Time spent in SQL per request", ["route"], buckets=SQL_BUCKETS)
+
+# --- Database ---
+# _count doubles as the statement counter
+SQL_LATENCY = Histogram("db_statement_duration_seconds", "SQL statement execution time", ["engine"], buckets=SQL_BUCKETS)
+POOL_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ["engine"], buckets=SQL_BUCKETS)
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out", ["engine"], multiprocess_mode="livesum")
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond pool_size", ["engine"], multiprocess_mode="livesum")
+POOL_SIZE = Gauge("db_pool_size", "Configured pool_size", ["engine"], multiprocess_mode="livesum")
+SLOW_QUERIES = Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ["route"])
+READ_SESSIONS = Counter("db_read_sessions_total", "Read sessions by where they went and why", ["target", "reason"])
+REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds", "Replication lag at the last check (NaN = unreachable)", ["replica"],
+    multiprocess_mode="livemostrecent"
+)
+
+# --- Event loop ---
+LOOP_BLOCKS = Histogram(
+    "event_loop_blocked_seconds", "Stalls of the event loop longer than LOOP_BLOCK_MS",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+# --- Payments ---
+PAYMENTS = Counter("payments_total", "Payments that reached a final status", ["method", "status"])
+PROCESSING_BACKLOG = Gauge(
+    "payments_processing_backlog", "Payments in status=processing (all workers, from the DB every METRICS_SAMPLE_INTERVAL)",
+    multiprocess_mode="livemostrecent"
+)
+PAYMENTS_IN_FLIGHT = Gauge(
+    "payments_in_flight", "Payment creations in progress (capped per worker by PAYMENT_MAX_IN_FLIGHT / WEB_CONCURRENCY)",
+    multiprocess_mode="livesum"
+)
+PAYMENTS_RECOVERED = Counter("payments_recovered_total", "Stale processing payments claimed by the recovery sweeper", ["outcome"])
+RECOVERY_STUCK_SECONDS = Histogram(
+    "payments_recovery_stuck_seconds", "How long recovered payments had been processing",
+    buckets=(60, 300, 900, 1800, 3600, 4 * 3600, 24 * 3600, 7 * 24 * 3600)
+)
+SETTLEMENT_QUEUE_DEPTH = Gauge(
+    "settlement_queue_depth", "Payments queued or reserved in the workers' settlement pools", multiprocess_mode="livesum"
+)
+WEBHOOK_LAG = Gauge(
+    "webhook_outbox_lag_seconds", "Age of the oldest due webhook event at the last claim", multiprocess_mode="livemax"
+)
+
+
+def render() -> bytes:
+    """The /metrics body: this process, or every worker under PROMETHEUS_MULTIPROC_DIR."""
+    if not MULTIPROCESS:
+        return generate_latest()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+# --- Sampled gauges ---
+class MetricsSampler:
+    """Keeps gauges that are read, not counted, current.
+
+    track() gauges read this worker's own state (pool checkouts, queue
+    depths). A single process reads them at scrape time; under
+    PROMETHEUS_MULTIPROC_DIR the scraped worker cannot read the others, so
+    each worker writes its value every METRICS_SAMPLE_INTERVAL instead.
+    poll() gauges run a query, so they are always refreshed in the
+    background and a scrape never touches the database.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self._tracked: list[tuple] = []
+        self._polled: list[tuple] = []
+
+    def track(self, gauge, read):
+        if MULTIPROCESS:
+            self._tracked.append((gauge, read))
+        else:
+            gauge.set_function(read)
+
+    def poll(self, gauge, query):
+        """Refresh `gauge` from the coroutine function `query`."""
+        self._polled.append((gauge, query))
+
+    async def start(self):
+        if METRICS_SAMPLE_INTERVAL <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._sample_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if MULTIPROCESS:
+            # Drop this worker's live* gauges from the other workers' scrapes
+            multiprocess.mark_process_dead(os.getpid())
+
+    async def sample_once(self):
+        for gauge, read in self._tracked:
+            gauge.set(read())
+        for gauge, query in self._polled:
+            gauge.set(await query())
+
+    async def _sample_forever(self):
+        while True:
+            try:
+                await self.sample_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Metrics sampling failed: {e}")
+            await asyncio.sleep(METRICS_SAMPLE_INTERVAL)
+
+
+metrics_sampler = MetricsSampler()
+
+
+# --- Per-request SQL accounting ---
+class _RequestSql:
+    __slots__ = ("statements", "seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+
+# Mutable holder shared with the threadpool / greenlet the route runs in
+_request_sql: ContextVar[_RequestSql | None] = ContextVar("request_sql", default=None)
+
+
+def instrument_engine(sync_engine, name: str):
+    """Count and time statements on `sync_engine` (use async_engine.sync_engine for the async one)."""
+    latency = SQL_LATENCY.labels(name)
+
+    # retval=True skips SQLAlchemy's signature-adapting wrapper, a few µs per statement
+    @event.listens_for(sync_engine, "before_cursor_execute", retval=True)
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+        return statement, parameters
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        latency.observe(elapsed)
+        current = _request_sql.get()
+        if current is not None:
+            current.statements += 1
+            current.seconds += elapsed
+
+    pool = sync_engine.pool
+    if hasattr(pool, "checkedout"):
+        metrics_sampler.track(POOL_CHECKED_OUT.labels(name), pool.checkedout)
+        metrics_sampler.track(POOL_OVERFLOW.labels(name), lambda: max(0, pool.overflow()))
+        metrics_sampler.track(POOL_SIZE.labels(name), pool.size)
+
+
+# --- Pools that time checkout waits ---
+class _TimedCheckout:
+    metrics_name: str
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.labels(self.metrics_name).observe(time.perf_counter() - started)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    metrics_name = "sync"
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    metrics_name = "async"
+
+
+# --- Middleware ---
+class _RouteMetrics:
+    """Label children for one (method, route), resolved once; .labels() takes a lock per call."""
+    __slots__ = ("method", "route", "latency", "sql_statements", "sql_seconds", "statuses")
+
+    def __init__(self, method: str, route: str):
+        self.method = method
+        self.route = route
+        self.latency = REQUEST_LATENCY.labels(method, route)
+        self.sql_statements = REQUEST_SQL_STATEMENTS.labels(route)
+        self.sql_seconds = REQUEST_SQL_SECONDS.labels(route)
+        self.statuses = {}
+
+    def requests(self, status: int):
+        counter = self.statuses.get(status)
+        if counter is None:
+            counter = self.statuses[status] = REQUESTS.labels(self.method, self.route, str(status))
+        return counter
+
+
+class MetricsMiddleware:
+    """Per-route latency, in-flight and SQL-per-request metrics.
+
+    Labels use the matched route template (/api/v1/payments/{payment_id}), never
+    the raw path, so cardinality stays bounded. Responses sent before routing
+    (CORS preflights, idempotent replays, 404s) are labelled "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: dict[tuple[str, str], _RouteMetrics] = {}
+
+    def _route_metrics(self, method: str, route: str) -> _RouteMetrics:
+        metrics = self._routes.get((method, route))
+        if metrics is None:
+            metrics = self._routes[(method, route)] = _RouteMetrics(method, route)
+        return metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = 500
+        sql = _RequestSql()
+        token = _request_sql.set(sql)
+        # The route is only known once routing has run, so in-flight is per method
+        in_flight = IN_FLIGHT.labels(method)
+        in_flight.inc()
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_flight.dec()
+            _request_sql.reset(token)
+            route = scope.get("route")
+            metrics = self._route_metrics(method, route.path if route is not None else "unmatched")
+            metrics.latency.observe(elapsed)
+            metrics.sql_statements.observe(sql.statements)
+            metrics.sql_seconds.observe(sql.seconds)
+            metrics.requests(status).inc()
@@ -1,8 +1,20 @@
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, Text, JSON, CheckConstraint
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Integer, BigInteger, Boolean, DateTime, ForeignKey, Text, JSON, CheckConstraint, Index
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.orm import validates
 from sqlalchemy.sql import func
 import uuid
 from .database import Base
+from .ids import id_created_at
+
+
+def _created_at_from_id(obj, key, value):
+    # created_at is the time encoded in the id, so a given id always lands in the same
+    # (id, created_at) primary key and partition, and a retried id moves created_at with it
+    try:
+        obj.created_at = id_created_at(value)
+    except ValueError:
+        pass # not a new_id() id: the server default applies
+    return value
 
 class Merchant(Base):
     __tablename__ = "merchants"
@@ -21,24 +33,39 @@ class Order(Base):
     __tablename__ = "orders"
 
     id = Column(String(64), primary_key=True) # Format: order_ + 16 chars
-    merchant_id = Column(UUID(as_uuid=True), ForeignKey("merchants.id"), nullable=False, index=True)
+    merchant_id = Column(UUID(as_uuid=True), ForeignKey("merchants.id"), nullable=False)
     amount = Column(Integer, nullable=False) # Minimum 100
     currency = Column(String(3), default='INR')
     receipt = Column(String(255), nullable=True)
-    notes = Column(JSON, nullable=True)
+    notes = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True) # JSONB on Postgres for @> search
     status = Column(String(20), default='created')
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Partition key on Postgres (monthly RANGE, see app.partitions), hence part of the primary key
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    # Order search (GET /api/v1/orders): merchant then (created_at, id) for keyset pagination,
+    # receipt exact/prefix (pattern ops so LIKE 'abc%' can use it), notes containment
     __table_args__ = (
         CheckConstraint('amount >= 100', name='check_min_amount'),
+        Index('ix_orders_merchant_created', 'merchant_id', 'created_at', 'id'),
+        Index('ix_orders_merchant_receipt', 'merchant_id', 'receipt', 'created_at', 'id',
+              postgresql_ops={'receipt': 'varchar_pattern_ops'}),
+        Index('ix_orders_notes', 'notes', postgresql_using='gin', postgresql_ops={'notes': 'jsonb_path_ops'}).ddl_if(dialect='postgresql'),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
+    # Server-generated timestamps come back with INSERT/UPDATE ... RETURNING, not a later SELECT.
+    # Rows are still identified by id alone in the ORM. The database only enforces (id, created_at),
+    # which keeps ids unique because created_at is derived from the id; look rows up with
+    # app.ids.first_by_id so the created_at bound prunes partitions.
+    __mapper_args__ = {"eager_defaults": True, "primary_key": [id]}
+
+    _created_at_from_id = validates("id")(_created_at_from_id)
 
 class Payment(Base):
     __tablename__ = "payments"
 
     id = Column(String(64), primary_key=True) # Format: pay_ + 16 chars
-    order_id = Column(String(64), ForeignKey("orders.id"), nullable=False, index=True)
+    order_id = Column(String(64), nullable=False) # orders.id; no FK, orders is partitioned
     merchant_id = Column(UUID(as_uuid=True), ForeignKey("merchants.id"), nullable=False)
     amount = Column(Integer, nullable=False)
     currency = Column(String(3), default='INR')
@@ -49,5 +76,59 @@ class Payment(Base):
     card_last4 = Column(String(4), nullable=True)
     error_code = Column(String(50), nullable=True)
     error_description = Column(Text, nullable=True)
+    # Partition key on Postgres (monthly RANGE, see app.partitions), hence part of the primary key
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Keyset pagination for list_payments: merchant (+ optional filter) then (created_at, id)
+    __table_args__ = (
+        Index('ix_payments_merchant_created', 'merchant_id', 'created_at', 'id'),
+        Index('ix_payments_merchant_status_created', 'merchant_id', 'status', 'created_at', 'id'),
+        Index('ix_payments_merchant_method_created', 'merchant_id', 'method', 'created_at', 'id'),
+        Index('ix_payments_order_created', 'order_id', 'created_at', 'id'),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    __mapper_args__ = {"eager_defaults": True, "primary_key": [id]}
+
+    _created_at_from_id = validates("id")(_created_at_from_id)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    scope = Column(String(64), primary_key=True) # sha256 of the merchant id and the endpoint path
+    key = Column(String(255), primary_key=True) # Idempotency-Key header
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True) # NULL while the first request is still running
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class PaymentStatsHourly(Base):
+    __tablename__ = "payment_stats_hourly"
+
+    # Maintained by app.stats on every payment insert / status change
+    merchant_id = Column(UUID(as_uuid=True), ForeignKey("merchants.id"), primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True) # Hour of created_at (UTC)
+    status = Column(String(20), primary_key=True)
+    method = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    amount = Column(BigInteger, nullable=False, default=0) # Sum in paise
+
+class WebhookEvent(Base):
+    __tablename__ = "webhook_events"
+
+    id = Column(String(64), primary_key=True) # Format: evt_ + 16 chars
+    merchant_id = Column(UUID(as_uuid=True), ForeignKey("merchants.id"), nullable=False)
+    event_type = Column(String(50), nullable=False) # payment.success / payment.failed
+    payload = Column(JSON, nullable=False)
+    status = Column(String(20), default='pending') # pending -> delivered / failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_error = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
\ No newline at end of file
+    delivered_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Dispatcher claims: WHERE status = 'pending' AND next_attempt_at <= now ORDER BY next_attempt_at
+        Index('ix_webhook_events_due', 'status', 'next_attempt_at'),
+    )
\ No newline at end of file
@@ -0,0 +1,60 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+
+# Keyset (cursor) pagination over (created_at DESC, id DESC).
+# Cursors are opaque to clients: base64url(JSON {"t": created_at, "id": id}).
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    raw = json.dumps({"t": created_at.isoformat(), "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["t"]), str(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail={"error": {"code": "BAD_REQUEST_ERROR", "description": "Invalid cursor"}})
+
+
+def keyset_page(query, model, limit: int, starting_after: str | None = None, ending_before: str | None = None):
+    """Apply the cursor to `query` and fetch one page, newest first.
+
+    Returns (rows, has_older, has_newer). `starting_after` walks towards older
+    rows, `ending_before` towards newer ones; page N costs the same as page 1
+    as long as an index ends in (created_at, id).
+    """
+    if starting_after and ending_before:
+        raise HTTPException(status_code=400, detail={"error": {"code": "BAD_REQUEST_ERROR", "description": "Use only one of starting_after / ending_before"}})
+
+    # The plain created_at bound duplicates the row comparison so Postgres can
+    # prune monthly partitions; it does not prune on (created_at, id) tuples
+    key = tuple_(model.created_at, model.id)
+    if ending_before:
+        created_at, row_id = decode_cursor(ending_before)
+        query = query.filter(model.created_at >= created_at, key > (created_at, row_id))
+        rows = query.order_by(model.created_at.asc(), model.id.asc()).limit(limit + 1).all()
+        has_newer = len(rows) > limit
+        return list(reversed(rows[:limit])), True, has_newer
+
+    if starting_after:
+        created_at, row_id = decode_cursor(starting_after)
+        query = query.filter(model.created_at <= created_at, key < (created_at, row_id))
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    has_older = len(rows) > limit
+    return rows[:limit], has_older, starting_after is not None
+
+
+def set_cursor_headers(response: Response, rows, has_older: bool, has_newer: bool):
+    """Expose the neighbouring page cursors without changing the list response body."""
+    response.headers["X-Has-More"] = "true" if has_older else "false"
+    if rows and has_older:
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1].created_at, rows[-1].id)
+    if rows and has_newer:
+        response.headers["X-Prev-Cursor"] = encode_cursor(rows[0].created_at, rows[0].id)
@@ -0,0 +1,347 @@
+"""Monthly RANGE partitions on created_at for orders and payments (Postgres only).
+
+    python -m app.partitions maintain   # create the coming months, archive expired ones
+    python -m app.partitions status
+
+Migration 0003 turns the plain tables into partitioned parents (migrate()). The
+maintenance job keeps PARTITION_MONTHS_AHEAD months provisioned ahead of time
+and, when PARTITION_RETENTION_MONTHS is set, detaches partitions older than
+that, writes each to a gzip CSV under PARTITION_ARCHIVE_DIR and drops it.
+On SQLite every function here is a no-op.
+"""
+import asyncio
+import csv
+import gzip
+import os
+import re
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from .database import engine
+from .models import Order, Payment
+
+_TABLES = {"orders": Order.__table__, "payments": Payment.__table__}
+PARTITIONED_TABLES = tuple(_TABLES)
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+# Months kept attached before archival (0 = keep everything)
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "0"))
+PARTITION_ARCHIVE_DIR = os.getenv("PARTITION_ARCHIVE_DIR", "archive")
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL", str(6 * 3600)))
+
+# pg_try_advisory_lock key, so only one worker runs maintenance at a time
+_MAINTENANCE_LOCK = 0x70617274 # "part"
+# Detaching takes an exclusive lock on the parent; give up instead of queueing traffic behind it
+_DDL_LOCK_TIMEOUT = "5s"
+_BOUND = re.compile(r"FROM \((.+)\) TO \((.+)\)")
+
+
+# --- Month arithmetic (UTC) ---
+def month_start(value: datetime) -> datetime:
+    value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def _parse_bound(value: str) -> datetime | None:
+    # pg_get_expr renders bounds as 'YYYY-MM-DD HH:MM:SS+00' or MINVALUE / MAXVALUE
+    value = value.strip()
+    if not value.startswith("'"):
+        return None
+    value = value.strip("'")
+    if re.search(r"[+-]\d\d$", value):
+        value += ":00"
+    return datetime.fromisoformat(value)
+
+
+# --- Catalog ---
+def enabled(bind=engine) -> bool:
+    return bind.dialect.name == "postgresql"
+
+
+def is_partitioned(conn, table: str) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"), {"table": table}
+    ).first() is not None
+
+
+def list_partitions(conn, table: str) -> list[dict]:
+    """Attached partitions of `table`, oldest first: name, lower and upper bound (None = unbounded)."""
+    rows = conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:table)
+    """), {"table": table}).all()
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND.search(bound)
+        lower, upper = (_parse_bound(match.group(1)), _parse_bound(match.group(2))) if match else (None, None)
+        partitions.append({"name": name, "from": lower, "to": upper})
+    return sorted(partitions, key=lambda p: p["from"] or datetime.min.replace(tzinfo=timezone.utc))
+
+
+def _detached(conn, table: str) -> list[str]:
+    # Partitions detached by an archive run that did not get as far as the drop
+    return list(conn.execute(text("""
+        SELECT relname FROM pg_class
+        WHERE relkind = 'r' AND NOT relispartition AND relnamespace = 'public'::regnamespace
+          AND relname ~ :pattern
+        ORDER BY relname
+    """), {"pattern": rf"^{table}_(p\d{{4}}_\d{{2}}|legacy)$"}).scalars())
+
+
+def _overlaps(partitions: list[dict], lower: datetime, upper: datetime) -> bool:
+    return any(
+        (p["from"] is None or p["from"] < upper) and (p["to"] is None or p["to"] > lower)
+        for p in partitions
+    )
+
+
+# --- Provisioning ---
+def ensure_partitions(conn, months_ahead: int = PARTITION_MONTHS_AHEAD, since: datetime | None = None) -> list[str]:
+    """Create monthly partitions from `since` (default: this month) to `months_ahead` months out.
+
+    Months already covered by an attached partition are skipped. Returns the
+    names created.
+    """
+    created = []
+    if not enabled(conn):
+        return created
+    now = month_start(datetime.now(timezone.utc))
+    first = month_start(since) if since is not None else now
+    last = add_months(now, months_ahead)
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(conn, table):
+            continue
+        partitions = list_partitions(conn, table)
+        month = first
+        while month <= last:
+            upper = add_months(month, 1)
+            if not _overlaps(partitions, month, upper):
+                name = partition_name(table, month)
+                conn.execute(text(
+                    f"CREATE TABLE {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+                ))
+                partitions.append({"name": name, "from": month, "to": upper})
+                created.append(name)
+            month = upper
+    return created
+
+
+def months_provisioned(conn, table: str) -> int:
+    """Whole months ahead of the current one that inserts can already land in."""
+    current = month_start(datetime.now(timezone.utc))
+    ahead = -1
+    month = current
+    partitions = list_partitions(conn, table)
+    while _overlaps(partitions, month, add_months(month, 1)):
+        ahead += 1
+        month = add_months(month, 1)
+    return ahead
+
+
+# --- Archival ---
+def archive_partition(name: str, archive_dir: str = PARTITION_ARCHIVE_DIR) -> str:
+    """Write a detached partition to `<archive_dir>/<name>.csv.gz`, check the row count, then drop it."""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(f"SELECT count(*) FROM {name}")
+        expected = cursor.fetchone()[0]
+        with gzip.open(path + ".tmp", "wt", newline="") as f:
+            cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", f)
+        with gzip.open(path + ".tmp", "rt", newline="") as f:
+            written = sum(1 for _ in csv.reader(f)) - 1
+        if written != expected:
+            raise RuntimeError(f"{name}: archived {written} rows, table holds {expected}")
+        os.replace(path + ".tmp", path)
+        cursor.execute(f"DROP TABLE {name}")
+        raw.commit()
+    finally:
+        raw.close()
+    return path
+
+
+def archive_expired(retention_months: int = PARTITION_RETENTION_MONTHS, archive_dir: str = PARTITION_ARCHIVE_DIR) -> list[str]:
+    """Detach and archive partitions entirely older than `retention_months` months."""
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(month_start(datetime.now(timezone.utc)), -retention_months)
+    archived = []
+    for table in PARTITIONED_TABLES:
+        with engine.begin() as conn:
+            if not is_partitioned(conn, table):
+                continue
+            expired = [p["name"] for p in list_partitions(conn, table) if p["to"] is not None and p["to"] <= cutoff]
+        for name in expired:
+            with engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{_DDL_LOCK_TIMEOUT}'"))
+                conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        with engine.connect() as conn:
+            detached = _detached(conn, table)
+        for name in detached:
+            path = archive_partition(name, archive_dir)
+            print(f"📦 Archived partition {name} to {path}")
+            archived.append(path)
+    return archived
+
+
+# --- Migration of existing plain tables ---
+def migrate(conn, parents: dict | None = None) -> list[str]:
+    """Convert plain orders/payments tables into partitioned parents, in place.
+
+    Each existing table is renamed to `<table>_legacy` and attached as the
+    partition for everything before next month, so no rows are copied; an
+    empty table is simply replaced. The parents are created from `parents`
+    (table name -> Table; default: the current models). The primary key
+    becomes (id, created_at) and payments.order_id loses its foreign key (a
+    partitioned orders table cannot back one). Holds an exclusive lock on
+    both tables while the new primary keys are built, so run it in a
+    maintenance window.
+    """
+    parents = parents or _TABLES
+    cutoff = add_months(month_start(datetime.now(timezone.utc)), 1)
+    migrated = []
+    conn.execute(text("LOCK TABLE payments, orders IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text("ALTER TABLE payments DROP CONSTRAINT IF EXISTS payments_order_id_fkey"))
+    for table in PARTITIONED_TABLES:
+        if is_partitioned(conn, table):
+            continue
+        if conn.execute(text(f"SELECT NOT EXISTS (SELECT 1 FROM {table})")).scalar():
+            conn.execute(text(f"DROP TABLE {table}"))
+            parents[table].create(conn)
+            migrated.append(table)
+            continue
+        legacy = f"{table}_legacy"
+        conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+        # Free the index names for the new parent; matching indexes are re-used on ATTACH
+        for index in conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :t"), {"t": legacy}).scalars().all():
+            conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index[:56]}_legacy"'))
+        # The old primary key is replaced; foreign keys come back from the parent on ATTACH
+        for constraint in conn.execute(text(
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:t) AND contype IN ('p', 'f')"
+        ), {"t": legacy}).scalars().all():
+            conn.execute(text(f'ALTER TABLE {legacy} DROP CONSTRAINT "{constraint}"'))
+        conn.execute(text(f"UPDATE {legacy} SET created_at = now() WHERE created_at IS NULL"))
+        conn.execute(text(f"ALTER TABLE {legacy} ALTER COLUMN created_at SET NOT NULL"))
+        conn.execute(text(f"ALTER TABLE {legacy} ADD PRIMARY KEY (id, created_at)"))
+        parents[table].create(conn)
+        conn.execute(text(
+            f"ALTER TABLE {table} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO ('{cutoff.isoformat()}')"
+        ))
+        migrated.append(table)
+    return migrated
+
+
+# --- Maintenance job ---
+class PartitionMaintainer:
+    """Periodic provisioning and archival, run by whichever worker holds the advisory lock."""
+
+    def __init__(self):
+        self.last_run: str | None = None
+        self.created: list[str] = []
+        self.archived: list[str] = []
+        self._task: asyncio.Task | None = None
+
+    def run_once(self) -> dict:
+        with engine.connect() as conn:
+            locked = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": _MAINTENANCE_LOCK}).scalar()
+            conn.commit() # the advisory lock is session-level and outlives the transaction
+            if not locked:
+                return {"created": [], "archived": []}
+            try:
+                with conn.begin():
+                    created = ensure_partitions(conn)
+                archived = archive_expired()
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _MAINTENANCE_LOCK})
+                conn.commit()
+        for name in created:
+            print(f"🗓️ Created partition {name}")
+        self.created += created
+        self.archived += archived
+        self.last_run = datetime.now(timezone.utc).isoformat()
+        return {"created": created, "archived": archived}
+
+    async def _maintain_forever(self):
+        while True:
+            await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                print(f"❌ Partition maintenance failed: {e}")
+
+    async def start(self):
+        if not enabled() or self._task is not None:
+            return
+        # Inserts fail outright without a partition for the current month, so provision before serving
+        try:
+            await asyncio.to_thread(self.run_once)
+        except Exception as e:
+            print(f"❌ Partition maintenance failed: {e}")
+        self._task = asyncio.create_task(self._maintain_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        if not enabled():
+            return {"enabled": False}
+        tables = {}
+        with engine.connect() as conn:
+            for table in PARTITIONED_TABLES:
+                if not is_partitioned(conn, table):
+                    tables[table] = {"partitioned": False}
+                    continue
+                partitions = list_partitions(conn, table)
+                tables[table] = {
+                    "partitioned": True,
+                    "partitions": [p["name"] for p in partitions],
+                    "months_ahead": months_provisioned(conn, table),
+                }
+        return {
+            "enabled": True,
+            "months_ahead_target": PARTITION_MONTHS_AHEAD,
+            "retention_months": PARTITION_RETENTION_MONTHS,
+            "last_run": self.last_run,
+            "created": self.created[-20:],
+            "archived": self.archived[-20:],
+            "tables": tables,
+        }
+
+
+partition_maintainer = PartitionMaintainer()
+
+
+def main(argv: list[str]) -> int:
+    command = argv[0] if argv else "status"
+    if not enabled():
+        print("❌ Partitioning needs Postgres (DATABASE_URL is not a postgresql URL)")
+        return 1
+    if command == "maintain":
+        print(partition_maintainer.run_once())
+    elif command == "status":
+        print(partition_maintainer.stats())
+    else:
+        print(f"❌ Unknown command {command!r}, expected maintain or status")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
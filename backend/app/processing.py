@@ -0,0 +1,227 @@
+import asyncio
+import os
+import random
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import func, select, update
+
+from .database import AsyncSessionLocal
+from .events import payment_events
+from .ids import new_payment_id, id_window, commit_with_new_id_async
+from .metrics import PAYMENTS, PROCESSING_BACKLOG, metrics_sampler
+from .models import Order, Payment
+from .schemas import PaymentCreate
+from .settlement import SettlementQueue, settlement_queue
+from .stats import record_status_change # importing stats also registers the rollup listener
+from .bins import bin_table
+from .utils import validate_vpa, card_digits, luhn_ok, validate_expiry
+from .webhooks import enqueue_payment_webhook
+
+# Acquirer simulation, read once when the module is imported
+UPI_SUCCESS_RATE = float(os.getenv("UPI_SUCCESS_RATE", "0.90"))
+CARD_SUCCESS_RATE = float(os.getenv("CARD_SUCCESS_RATE", "0.95"))
+PROCESSING_DELAY_MIN = float(os.getenv("PROCESSING_DELAY_MIN", "5"))
+PROCESSING_DELAY_MAX = float(os.getenv("PROCESSING_DELAY_MAX", "10"))
+
+TEST_MODE = os.getenv("TEST_MODE", "false").lower() == "true"
+TEST_PAYMENT_SUCCESS = os.getenv("TEST_PAYMENT_SUCCESS", "true").lower() == "true"
+TEST_PROCESSING_DELAY = int(os.getenv("TEST_PROCESSING_DELAY", "1000"))
+
+
+# --- Acquirers ---
+class AcquirerSimulator(ABC):
+    """Stands in for the bank: waits, then approves or declines."""
+
+    @abstractmethod
+    async def authorize(self, method: str) -> bool:
+        """True if the bank approves a payment by `method`."""
+
+
+class RandomAcquirer(AcquirerSimulator):
+    def __init__(self, upi_success_rate: float, card_success_rate: float, delay_min: float, delay_max: float):
+        self.upi_success_rate = upi_success_rate
+        self.card_success_rate = card_success_rate
+        self.delay_min = delay_min
+        self.delay_max = delay_max
+
+    async def authorize(self, method: str) -> bool:
+        await asyncio.sleep(random.uniform(self.delay_min, self.delay_max))
+        rate = self.upi_success_rate if method == "upi" else self.card_success_rate
+        return random.random() < rate
+
+
+class FixedAcquirer(AcquirerSimulator):
+    """Deterministic outcome for evaluation runs (TEST_MODE)."""
+
+    def __init__(self, success: bool, delay: float):
+        self.success = success
+        self.delay = delay
+
+    async def authorize(self, method: str) -> bool:
+        await asyncio.sleep(self.delay)
+        return self.success
+
+
+def acquirer_from_env() -> AcquirerSimulator:
+    if TEST_MODE:
+        return FixedAcquirer(TEST_PAYMENT_SUCCESS, TEST_PROCESSING_DELAY / 1000)
+    return RandomAcquirer(UPI_SUCCESS_RATE, CARD_SUCCESS_RATE, PROCESSING_DELAY_MIN, PROCESSING_DELAY_MAX)
+
+
+# --- Errors ---
+class PaymentError(Exception):
+    def __init__(self, status_code: int, code: str, description: str, headers: dict | None = None):
+        super().__init__(description)
+        self.status_code = status_code
+        self.code = code
+        self.description = description
+        self.headers = headers
+
+    def as_http(self, public: bool = False) -> HTTPException:
+        # Public checkout routes answer with a plain string detail
+        detail = self.description if public else {"error": {"code": self.code, "description": self.description}}
+        return HTTPException(status_code=self.status_code, detail=detail, headers=self.headers)
+
+
+# --- Processor ---
+class PaymentProcessor:
+    """Validation, record creation and settlement shared by the merchant API and checkout."""
+
+    def __init__(self, acquirer: AcquirerSimulator, queue: SettlementQueue):
+        self.acquirer = acquirer
+        self.queue = queue
+
+    @staticmethod
+    def validate(pay_data: PaymentCreate) -> tuple[str | None, str | None]:
+        """Returns (card_network, card_last4)."""
+        if pay_data.method == "upi":
+            if not pay_data.vpa or not validate_vpa(pay_data.vpa):
+                raise PaymentError(400, "INVALID_VPA", "Invalid VPA format")
+            return None, None
+
+        if pay_data.method == "card":
+            if not pay_data.card:
+                raise PaymentError(400, "BAD_REQUEST_ERROR", "Card details required")
+            digits = card_digits(pay_data.card.number) # Cleaned once for every check below
+            if not luhn_ok(digits):
+                raise PaymentError(400, "INVALID_CARD", "Invalid card number")
+            if not validate_expiry(pay_data.card.expiry_month, pay_data.card.expiry_year):
+                raise PaymentError(400, "EXPIRED_CARD", "Card expired")
+            return bin_table.lookup(digits).network, digits[-4:]
+
+        return None, None
+
+    async def create_payment(self, db, order: Order, pay_data: PaymentCreate) -> Payment:
+        card_network, card_last4 = self.validate(pay_data)
+
+        # Reserve a settlement slot up front (async mode) so a full queue rejects cleanly
+        queued = self.queue.enabled
+        if queued and not self.queue.try_reserve():
+            raise PaymentError(503, "SERVICE_UNAVAILABLE", "Payment processing queue is full", headers={"Retry-After": "1"})
+
+        payment = Payment(
+            id=new_payment_id(),
+            order_id=order.id,
+            merchant_id=order.merchant_id,
+            amount=order.amount,
+            currency=order.currency,
+            method=pay_data.method,
+            status="processing",
+            vpa=pay_data.vpa,
+            card_network=card_network,
+            card_last4=card_last4
+            # created_at comes from the id (app.models), so the stats rollup knows the bucket at flush time
+        )
+
+        # Async mode: the worker pool settles it, the client follows the status
+        # INSERT ... RETURNING fills the server timestamps, and the session does not
+        # expire on commit, so the payment is returned without re-reading it
+        if queued:
+            try:
+                await commit_with_new_id_async(db, payment, new_payment_id)
+            except BaseException:
+                self.queue.release()
+                raise
+            self.queue.submit(payment.id, payment.method)
+            return payment
+
+        # Commit releases the connection, so nothing is held while we wait on the bank
+        await commit_with_new_id_async(db, payment, new_payment_id)
+        success = await self.acquirer.authorize(payment.method)
+        settled = await self.finalize(db, payment.id, success, created_at=payment.created_at)
+        if settled is None: # settled elsewhere in the meantime
+            result = await db.execute(
+                select(Payment).where(Payment.id == payment.id, Payment.created_at == payment.created_at),
+                execution_options={"populate_existing": True}
+            )
+            settled = result.scalars().one()
+        return settled
+
+    async def settle(self, payment_id: str, method: str):
+        """Settlement worker entry point for queued payments."""
+        success = await self.acquirer.authorize(method)
+        async with AsyncSessionLocal() as db:
+            await self.finalize(db, payment_id, success)
+
+    async def finalize(
+        self, db, payment_id: str, success: bool, values: dict | None = None, created_at: datetime | None = None
+    ) -> Payment | None:
+        """Record the bank's answer and commit it with the status event and webhook.
+
+        One conditional UPDATE ... RETURNING both checks the payment is still
+        processing and reads back the row; returns None if it was not.
+        `values` overrides the columns set for `success` (see expired_values).
+        `created_at` (else the window from the id) keeps the UPDATE to one partition.
+        """
+        located = (Payment.created_at == created_at,) if created_at is not None else id_window(Payment, payment_id)
+        result = await db.execute(
+            update(Payment)
+            .where(Payment.id == payment_id, *located, Payment.status == "processing")
+            .values(**(values or self.result_values(success)))
+            .returning(Payment),
+            execution_options={"populate_existing": True}
+        )
+        payment = result.scalars().first()
+        if payment is None:
+            return None
+        # Bulk UPDATEs bypass the flush listener that maintains the stats rollup
+        await db.run_sync(record_status_change, payment, "processing", payment.status)
+        await self.announce_status(db, payment)
+        await db.commit()
+        PAYMENTS.labels(payment.method, payment.status).inc()
+        return payment
+
+    @staticmethod
+    def result_values(success: bool) -> dict:
+        if success:
+            return {"status": "success"}
+        return {"status": "failed", "error_code": "PAYMENT_FAILED", "error_description": "Bank declined transaction"}
+
+    @staticmethod
+    def expired_values() -> dict:
+        # Stuck so long (see app.recovery) that charging the customer now would surprise them
+        return {"status": "failed", "error_code": "PAYMENT_TIMEOUT", "error_description": "Payment timed out before the bank responded"}
+
+    @staticmethod
+    async def announce_status(db, payment: Payment):
+        """Stage everything that must go out with a status change, inside the same transaction."""
+        await payment_events.stage(db, payment)
+        await enqueue_payment_webhook(db, payment)
+
+
+async def processing_backlog() -> float:
+    """Payments still waiting on the bank, across every worker; sampled in the background."""
+    try:
+        async with AsyncSessionLocal() as db:
+            query = select(func.count()).select_from(Payment).where(Payment.status == "processing")
+            return (await db.execute(query)).scalar_one()
+    except Exception as e:
+        print(f"⚠️ Processing backlog unavailable: {e}")
+        return float("nan")
+
+
+metrics_sampler.poll(PROCESSING_BACKLOG, processing_backlog)
+
+payment_processor = PaymentProcessor(acquirer_from_env(), settlement_queue)
@@ -0,0 +1,296 @@
+import asyncio
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+from .metrics import LOOP_BLOCKS, SLOW_QUERIES
+
+# All three hooks are opt-in and cost nothing while switched off.
+# Sampling profiler: requests sent with `X-Profile: 1` (when PROFILE_REQUESTS=true)
+# plus a random PROFILE_SAMPLE_RATE fraction of all requests
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Statements slower than this are logged with their route (0 = off)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+# Event loop stalls longer than this are logged with the blocking stack (0 = off)
+LOOP_BLOCK_MS = float(os.getenv("LOOP_BLOCK_MS", "0"))
+
+RECENT_MAX = 100
+STATEMENT_MAX_CHARS = 2000
+
+# Scope of the request being served; read by the slow-query log for attribution
+_current_scope: ContextVar[dict | None] = ContextVar("current_scope", default=None)
+
+
+def middleware_enabled() -> bool:
+    return PROFILE_REQUESTS or PROFILE_SAMPLE_RATE > 0 or SLOW_QUERY_MS > 0
+
+
+def current_route() -> str:
+    """Route template of the request running in this context, "background" for workers."""
+    scope = _current_scope.get()
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+# --- Stack folding ---
+def _frame_label(code) -> str:
+    name = getattr(code, "co_qualname", code.co_name) # co_qualname is 3.11+
+    return f"{os.path.basename(code.co_filename)}:{name}"
+
+
+def fold_stack(frame) -> list[str]:
+    """Outermost-first frame labels, the order flamegraph.pl and speedscope expect."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _idle(frame) -> bool:
+    # Parked threadpool workers and helper threads
+    code = frame.f_code
+    return code.co_name == "wait" and code.co_filename.endswith("threading.py")
+
+
+# --- Sampling profiler ---
+class RequestProfile:
+    """Samples every thread's stack until stopped.
+
+    Sync routes run in the threadpool and async ones on the loop, so all
+    threads are sampled, rooted at the thread name. Requests served
+    concurrently show up in the same profile.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or _idle(frame):
+                    continue
+                stack = [names.get(ident, str(ident)), *fold_stack(frame)]
+                self.samples[";".join(stack)] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def _wants_profile(scope) -> bool:
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return True
+    return PROFILE_REQUESTS and dict(scope["headers"]).get(b"x-profile") == b"1"
+
+
+def _write_profile(profile: RequestProfile, name: str, elapsed: float):
+    profile.stop()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, name)
+    with open(path, "w") as f:
+        f.write(profile.folded())
+    print(f"🔬 Profile written: {path} ({sum(profile.samples.values())} samples, {elapsed * 1000:.1f} ms)")
+
+
+class ProfilingMiddleware:
+    """Tracks the current request for the slow-query log and profiles the requests asked for.
+
+    A profiled response carries `X-Profile-File` naming the folded-stack file
+    written under PROFILE_DIR.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        token = _current_scope.set(scope)
+        try:
+            if _wants_profile(scope):
+                await self._profiled(scope, receive, send)
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            _current_scope.reset(token)
+
+    async def _profiled(self, scope, receive, send):
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_")[:60]
+        name = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}_{scope['method']}_{slug}_{os.urandom(3).hex()}.folded"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-file", name.encode())]}
+            await send(message)
+
+        profile = RequestProfile(PROFILE_INTERVAL_MS / 1000)
+        profile.start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Joining the sampler and writing the file stay off the loop
+            await asyncio.to_thread(_write_profile, profile, name, time.perf_counter() - started)
+
+
+# --- Slow-query log ---
+slow_queries: deque = deque(maxlen=RECENT_MAX)
+
+
+def _shape(parameters) -> str:
+    # Types only: parameter values carry VPAs and card data
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def parameter_shape(parameters, executemany: bool) -> str:
+    if executemany and parameters:
+        return f"{len(parameters)} x {_shape(parameters[0])}"
+    return _shape(parameters)
+
+
+def log_slow_queries(sync_engine):
+    """Log statements over SLOW_QUERY_MS on `sync_engine` (async_engine.sync_engine for the async one)."""
+    if SLOW_QUERY_MS <= 0:
+        return
+    threshold = SLOW_QUERY_MS / 1000
+
+    @event.listens_for(sync_engine, "before_cursor_execute", retval=True)
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        context._slow_query_started = time.perf_counter()
+        return statement, parameters
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._slow_query_started
+        if elapsed < threshold:
+            return
+        route = current_route()
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "route": route,
+            "duration_ms": round(elapsed * 1000, 1),
+            "statement": " ".join(statement.split())[:STATEMENT_MAX_CHARS],
+            "parameters": parameter_shape(parameters, executemany),
+        }
+        slow_queries.append(entry)
+        SLOW_QUERIES.labels(route).inc()
+        print(f"🐢 Slow query {entry['duration_ms']} ms [{route}] {entry['statement']} params={entry['parameters']}")
+
+
+# --- Event loop watchdog ---
+class LoopWatchdog:
+    """Reports callbacks that hold the event loop longer than `threshold` seconds.
+
+    A heartbeat task measures how late it wakes up; a watchdog thread notices
+    the missed beat while the stall is still going on and captures the loop
+    thread's stack, so the report names the blocking code.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.interval = threshold / 2
+        self.blocks: deque = deque(maxlen=RECENT_MAX)
+        self._beat = 0.0
+        self._stall_stack: list[str] | None = None
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    async def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        await asyncio.to_thread(self._thread.join)
+        self._task = self._thread = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            if now - expected >= self.threshold:
+                self._report(now - expected, self._stall_stack)
+            self._stall_stack = None
+            self._beat = now
+
+    def _watch(self):
+        while not self._stop.wait(self.interval / 2):
+            if self._stall_stack is None and time.monotonic() - self._beat > self.interval + self.threshold:
+                frame = sys._current_frames().get(self._loop_thread)
+                self._stall_stack = fold_stack(frame) if frame is not None else []
+
+    def _report(self, blocked: float, stack: list[str] | None):
+        stack = stack or []
+        self.blocks.append({
+            "at": datetime.now(timezone.utc).isoformat(),
+            "blocked_ms": round(blocked * 1000, 1),
+            "stack": ";".join(stack),
+        })
+        LOOP_BLOCKS.observe(blocked)
+        where = " < ".join(reversed(stack[-5:])) or "unknown"
+        print(f"⚠️ Event loop blocked for {blocked * 1000:.0f} ms at {where}")
+
+
+loop_watchdog = LoopWatchdog(LOOP_BLOCK_MS / 1000)
+
+
+def stats() -> dict:
+    return {
+        "profile_requests": PROFILE_REQUESTS,
+        "profile_sample_rate": PROFILE_SAMPLE_RATE,
+        "slow_query_ms": SLOW_QUERY_MS,
+        "loop_block_ms": LOOP_BLOCK_MS,
+        "slow_queries": list(slow_queries),
+        "loop_blocks": list(loop_watchdog.blocks),
+    }
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request
+
+from .database import WEB_CONCURRENCY
+from .metrics import PAYMENTS_IN_FLIGHT, RATE_LIMITED, metrics_sampler
+
+# Admission control in front of the API (RATE_LIMIT_ENABLED=false turns all of it off). Token buckets live in a small SQLite
+# file (on /dev/shm when available), so every uvicorn worker on the host draws
+# from the same buckets.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_STORE = os.getenv(
+    "RATE_LIMIT_STORE",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "payment_gateway_ratelimit.db"),
+)
+# Authenticated API, per merchant: sustained requests/second and burst size
+RATE_LIMIT_MERCHANT_RATE = float(os.getenv("RATE_LIMIT_MERCHANT_RATE", "50"))
+RATE_LIMIT_MERCHANT_BURST = float(os.getenv("RATE_LIMIT_MERCHANT_BURST", "100"))
+# Per-merchant quotas: {"<merchant id>": [rate, burst], ...}
+RATE_LIMIT_MERCHANT_OVERRIDES = json.loads(os.getenv("RATE_LIMIT_MERCHANT_OVERRIDES", "{}"))
+# Public checkout routes, per client IP
+RATE_LIMIT_PUBLIC_RATE = float(os.getenv("RATE_LIMIT_PUBLIC_RATE", "10"))
+RATE_LIMIT_PUBLIC_BURST = float(os.getenv("RATE_LIMIT_PUBLIC_BURST", "30"))
+# Public payment attempts, per order (card testing against one checkout link)
+RATE_LIMIT_ORDER_RATE = float(os.getenv("RATE_LIMIT_ORDER_RATE", "0.2"))
+RATE_LIMIT_ORDER_BURST = float(os.getenv("RATE_LIMIT_ORDER_BURST", "5"))
+# Use the first X-Forwarded-For address as the client IP (only behind a proxy that sets it)
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+# Payments being created at once on this host; beyond this new ones are shed with 503 (0 = no cap).
+# Split evenly across the WEB_CONCURRENCY workers, each of which counts its own.
+PAYMENT_MAX_IN_FLIGHT = int(os.getenv("PAYMENT_MAX_IN_FLIGHT", "200"))
+PAYMENT_MAX_IN_FLIGHT_PER_WORKER = PAYMENT_MAX_IN_FLIGHT and max(1, PAYMENT_MAX_IN_FLIGHT // WEB_CONCURRENCY)
+
+# Buckets untouched this long are full again and can be forgotten
+_IDLE_BUCKET_SECONDS = 3600
+_SWEEP_INTERVAL = 60
+
+
+@dataclass(frozen=True)
+class Quota:
+    rate: float   # tokens per second
+    burst: float  # bucket capacity
+
+    def __post_init__(self):
+        # Checked when the settings are read, so a bad quota fails startup instead of requests
+        if not self.rate > 0 or not self.burst >= 1:
+            raise ValueError(f"Rate limit quota needs rate > 0 and burst >= 1, got rate={self.rate} burst={self.burst}")
+
+
+class TokenBucketStore:
+    """Token buckets in a SQLite file shared by all worker processes.
+
+    A take is one UPSERT: refill from the elapsed time, then spend a token if
+    at least one is there. SQLite serialises writers, so concurrent workers
+    never hand out the same token. The state is disposable; nothing is fsynced.
+    A take can wait up to a second on the file lock, so async code calls it
+    through a thread (RateLimiter's *_wait_async methods).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def take(self, key: str, quota: Quota) -> float:
+        """Spend one token from `key`'s bucket; 0 when admitted, else seconds until a token is due."""
+        now = time.time()
+        params = {"key": key, "now": now, "rate": quota.rate, "burst": quota.burst}
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("""
+                INSERT INTO buckets (key, tokens, updated) SELECT :key, :burst - 1, :now WHERE :burst >= 1
+                ON CONFLICT (key) DO UPDATE SET
+                    tokens = min(:burst, tokens + (:now - updated) * :rate) - 1,
+                    updated = :now
+                WHERE min(:burst, tokens + (:now - updated) * :rate) >= 1
+                RETURNING tokens
+            """, params).fetchone()
+            if row is not None:
+                return 0.0
+            state = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+        tokens, updated = state or (0.0, now) # no row: the insert was refused too
+        available = min(quota.burst, tokens + (now - updated) * quota.rate)
+        return (1 - available) / quota.rate
+
+    def sweep(self) -> int:
+        with self._lock:
+            cursor = self._connection().execute("DELETE FROM buckets WHERE updated < ?", (time.time() - _IDLE_BUCKET_SECONDS,))
+        return cursor.rowcount
+
+
+class RateLimiter:
+    def __init__(self, store: TokenBucketStore):
+        self.store = store
+        self.merchant_quota = Quota(RATE_LIMIT_MERCHANT_RATE, RATE_LIMIT_MERCHANT_BURST)
+        self.overrides = {merchant_id: Quota(*quota) for merchant_id, quota in RATE_LIMIT_MERCHANT_OVERRIDES.items()}
+        self.public_quota = Quota(RATE_LIMIT_PUBLIC_RATE, RATE_LIMIT_PUBLIC_BURST)
+        self.order_quota = Quota(RATE_LIMIT_ORDER_RATE, RATE_LIMIT_ORDER_BURST)
+        self.payments_in_flight = 0
+        self.store_errors = 0
+        self._sweeper: asyncio.Task | None = None
+
+    def _wait(self, scope: str, key: str, quota: Quota) -> float:
+        """Seconds the caller must wait (0 = admitted). Fails open if the store is unusable."""
+        try:
+            wait = self.store.take(f"{scope}:{key}", quota)
+        except sqlite3.Error as e:
+            self.store_errors += 1
+            print(f"⚠️ Rate limit store unavailable, admitting: {e}")
+            return 0.0
+        if wait > 0:
+            RATE_LIMITED.labels(scope).inc()
+        return wait
+
+    def merchant_wait(self, merchant_id) -> float:
+        if not RATE_LIMIT_ENABLED:
+            return 0.0
+        key = str(merchant_id)
+        return self._wait("merchant", key, self.overrides.get(key, self.merchant_quota))
+
+    def public_wait(self, client_ip: str) -> float:
+        return self._wait("public_ip", client_ip, self.public_quota) if RATE_LIMIT_ENABLED else 0.0
+
+    def order_wait(self, order_id: str) -> float:
+        return self._wait("public_order", order_id, self.order_quota) if RATE_LIMIT_ENABLED else 0.0
+
+    # The store blocks on its file lock; keep it off the event loop
+    async def merchant_wait_async(self, merchant_id) -> float:
+        return await asyncio.to_thread(self.merchant_wait, merchant_id) if RATE_LIMIT_ENABLED else 0.0
+
+    async def order_wait_async(self, order_id: str) -> float:
+        return await asyncio.to_thread(self.order_wait, order_id) if RATE_LIMIT_ENABLED else 0.0
+
+    # --- Background sweep of idle buckets ---
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(_SWEEP_INTERVAL)
+            try:
+                await asyncio.to_thread(self.store.sweep)
+            except Exception as e:
+                print(f"❌ Rate limit sweep failed: {e}")
+
+    async def start(self):
+        if RATE_LIMIT_ENABLED and self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": RATE_LIMIT_ENABLED,
+            "store": self.store.path,
+            "merchant": {"rate": self.merchant_quota.rate, "burst": self.merchant_quota.burst, "overrides": len(self.overrides)},
+            "public_ip": {"rate": self.public_quota.rate, "burst": self.public_quota.burst},
+            "public_order": {"rate": self.order_quota.rate, "burst": self.order_quota.burst},
+            "payments_in_flight": self.payments_in_flight,
+            "payment_max_in_flight": PAYMENT_MAX_IN_FLIGHT,
+            "payment_max_in_flight_per_worker": PAYMENT_MAX_IN_FLIGHT_PER_WORKER,
+            "store_errors": self.store_errors,
+        }
+
+
+rate_limiter = RateLimiter(TokenBucketStore(RATE_LIMIT_STORE))
+metrics_sampler.track(PAYMENTS_IN_FLIGHT, lambda: rate_limiter.payments_in_flight)
+
+
+def _retry_after(wait: float) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(wait)))}
+
+
+def too_many_requests(wait: float, public: bool = False) -> HTTPException:
+    if public:
+        return HTTPException(status_code=429, detail="Too many requests", headers=_retry_after(wait))
+    return HTTPException(
+        status_code=429,
+        detail={"error": {"code": "RATE_LIMIT_ERROR", "description": "Too many requests, retry later"}},
+        headers=_retry_after(wait),
+    )
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def limit_public_client(request: Request):
+    """Router dependency for /api/v1/public/*: one bucket per client IP."""
+    wait = rate_limiter.public_wait(client_ip(request))
+    if wait:
+        raise too_many_requests(wait, public=True)
+
+
+async def limit_public_order(order_id: str):
+    """Payment attempts against one order, whichever IPs they come from."""
+    wait = await rate_limiter.order_wait_async(order_id)
+    if wait:
+        raise too_many_requests(wait, public=True)
+
+
+async def payment_slot(request: Request):
+    """Dependency for the payment-creating routes: holds one of this worker's payment slots.
+
+    When they are all taken the request is shed at once with 503 instead of
+    queueing for a pool connection behind the others.
+    """
+    if RATE_LIMIT_ENABLED and PAYMENT_MAX_IN_FLIGHT and rate_limiter.payments_in_flight >= PAYMENT_MAX_IN_FLIGHT_PER_WORKER:
+        RATE_LIMITED.labels("payments_in_flight").inc()
+        public = request.url.path.startswith("/api/v1/public/")
+        detail = "Service busy, retry shortly" if public else {
+            "error": {"code": "SERVICE_UNAVAILABLE_ERROR", "description": "Too many payments in progress, retry shortly"}
+        }
+        raise HTTPException(status_code=503, detail=detail, headers=_retry_after(1))
+    rate_limiter.payments_in_flight += 1
+    try:
+        yield
+    finally:
+        rate_limiter.payments_in_flight -= 1
@@ -0,0 +1,147 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, tuple_, update
+
+from .database import AsyncSessionLocal
+from .metrics import PAYMENTS_RECOVERED, RECOVERY_STUCK_SECONDS
+from .models import Payment
+from .processing import PaymentProcessor, payment_processor
+
+# A payment still "processing" this long after its last update has lost its
+# worker. Keep it well above PROCESSING_DELAY_MAX plus any settlement queue wait.
+RECOVERY_STALE_AFTER = float(os.getenv("RECOVERY_STALE_AFTER", "300"))
+# Payments created longer ago than this are failed without asking the bank again
+RECOVERY_EXPIRE_AFTER = float(os.getenv("RECOVERY_EXPIRE_AFTER", "3600"))
+# Only payments created this recently are swept, so the claim scans the recent
+# partitions instead of all of history; keep it well above RECOVERY_EXPIRE_AFTER
+RECOVERY_MAX_AGE = float(os.getenv("RECOVERY_MAX_AGE", str(7 * 24 * 3600)))
+RECOVERY_INTERVAL = float(os.getenv("RECOVERY_INTERVAL", "30")) # 0 disables the sweeper
+RECOVERY_BATCH_SIZE = int(os.getenv("RECOVERY_BATCH_SIZE", "100"))
+
+
+# --- Sweeper ---
+class RecoverySweeper:
+    """Settles payments left in "processing" by a worker that died mid-payment.
+
+    Every RECOVERY_INTERVAL seconds it claims up to RECOVERY_BATCH_SIZE stale
+    payments with FOR UPDATE SKIP LOCKED, so each worker and instance can run
+    it. Claiming bumps updated_at, which hides the payment from other
+    sweepers for another RECOVERY_STALE_AFTER; a payment whose resolution
+    fails is simply claimed again then. Claimed payments go through the same
+    acquirer and conditional finalize as live ones, so a payment that its
+    original worker settles in the meantime is left alone.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self.outcomes: dict[str, int] = {}
+        self.errors = 0
+        self.in_flight = 0
+        self.longest_stuck_seconds = 0.0
+        self.last_sweep: str | None = None
+
+    async def start(self):
+        if RECOVERY_INTERVAL <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            # Claimed but unresolved payments are claimed again once they go stale
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def claim(self, limit: int) -> list:
+        """Lease up to `limit` stale payments: (id, method, created_at) rows, oldest update first."""
+        now = datetime.now(timezone.utc)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Payment.id, Payment.method, Payment.created_at)
+                .where(
+                    Payment.status == "processing",
+                    Payment.created_at >= now - timedelta(seconds=RECOVERY_MAX_AGE),
+                    Payment.updated_at < now - timedelta(seconds=RECOVERY_STALE_AFTER),
+                )
+                .order_by(Payment.updated_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            rows = result.all()
+            if rows:
+                await db.execute(
+                    update(Payment)
+                    .where(tuple_(Payment.id, Payment.created_at).in_([(row.id, row.created_at) for row in rows]))
+                    .values(updated_at=now)
+                )
+                await db.commit()
+        return rows
+
+    async def resolve(self, payment_id: str, method: str, created_at: datetime) -> str:
+        """Settle one claimed payment; returns its outcome."""
+        if created_at.tzinfo is None: # SQLite hands back naive datetimes (its binds ignore tzinfo either way)
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        stuck = (datetime.now(timezone.utc) - created_at).total_seconds()
+        expired = stuck >= RECOVERY_EXPIRE_AFTER
+        # Ask the bank before opening a session, so no connection is held meanwhile
+        success = False if expired else await payment_processor.acquirer.authorize(method)
+        async with AsyncSessionLocal() as db:
+            values = PaymentProcessor.expired_values() if expired else None
+            payment = await payment_processor.finalize(db, payment_id, success, values, created_at=created_at)
+        if payment is None:
+            return "already_settled"
+        RECOVERY_STUCK_SECONDS.observe(stuck)
+        self.longest_stuck_seconds = max(self.longest_stuck_seconds, stuck)
+        outcome = "expired" if expired else payment.status
+        print(f"🩹 Recovered {payment_id} after {stuck:.0f}s stuck: {outcome}")
+        return outcome
+
+    async def sweep_once(self) -> int:
+        """Claim and resolve one batch; returns how many payments were claimed."""
+        rows = await self.claim(RECOVERY_BATCH_SIZE)
+        self.in_flight += len(rows)
+        try:
+            results = await asyncio.gather(*(self.resolve(*row) for row in rows), return_exceptions=True)
+        finally:
+            self.in_flight -= len(rows)
+        for row, result in zip(rows, results):
+            if isinstance(result, BaseException):
+                self.errors += 1
+                print(f"❌ Recovery failed for {row.id}: {result}")
+                continue
+            self.outcomes[result] = self.outcomes.get(result, 0) + 1
+            PAYMENTS_RECOVERED.labels(result).inc()
+        self.last_sweep = datetime.now(timezone.utc).isoformat()
+        return len(rows)
+
+    async def _sweep_forever(self):
+        while True:
+            try:
+                # A full batch means more may be waiting: go again without sleeping
+                if await self.sweep_once() == RECOVERY_BATCH_SIZE:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Payment recovery sweep failed: {e}")
+            await asyncio.sleep(RECOVERY_INTERVAL)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": RECOVERY_INTERVAL > 0,
+            "interval": RECOVERY_INTERVAL,
+            "stale_after": RECOVERY_STALE_AFTER,
+            "expire_after": RECOVERY_EXPIRE_AFTER,
+            "max_age": RECOVERY_MAX_AGE,
+            "batch_size": RECOVERY_BATCH_SIZE,
+            "in_flight": self.in_flight,
+            "recovered": dict(self.outcomes),
+            "errors": self.errors,
+            "longest_stuck_seconds": round(self.longest_stuck_seconds, 3),
+            "last_sweep": self.last_sweep,
+        }
+
+
+recovery_sweeper = RecoverySweeper()
@@ -0,0 +1,244 @@
+import asyncio
+import itertools
+import os
+from datetime import datetime, timedelta, timezone
+
+from fastapi import Request
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from .cache import TTLCache, MISSING
+from .database import POOL_SIZES, SessionLocal, engine
+from .ids import ID_TIME_SLACK, id_created_at
+from .metrics import READ_SESSIONS, REPLICA_LAG, TimedQueuePool, instrument_engine
+from .profiling import log_slow_queries
+
+# Read replicas for GET routes. Unset = every read goes to the primary (DATABASE_URL).
+# Comma-separated sync URLs, e.g. postgresql+psycopg2://...@replica-1/db,postgresql+psycopg2://...@replica-2/db
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Replicas further behind than this (seconds) are skipped until they catch up
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "2"))
+# After a merchant writes, its reads stay on the primary this long (seconds, per process)
+READ_YOUR_WRITES_WINDOW = float(os.getenv("READ_YOUR_WRITES_WINDOW", "5"))
+READ_PIN_CACHE_SIZE = int(os.getenv("READ_PIN_CACHE_SIZE", "100000"))
+
+# Seconds since the last replayed transaction; 0 when fully caught up (or not a standby at all)
+_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+_WRITE_METHODS = {b"POST", b"PUT", b"PATCH", b"DELETE"}
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        # Pool checkout waits reported under this replica's name, not "sync"
+        poolclass = type(f"TimedQueuePool_{name}", (TimedQueuePool,), {"metrics_name": name})
+        connect_args = {"connect_timeout": 2} if url.startswith("postgres") else {}
+        # Replica reads would otherwise run on the sync pool, so a replica gets the same per-worker share
+        sizing = {"pool_size": POOL_SIZES["sync"], "max_overflow": 0} if POOL_SIZES else {}
+        self.engine = create_engine(url, poolclass=poolclass, connect_args=connect_args, **sizing)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine, expire_on_commit=False)
+        instrument_engine(self.engine, name)
+        log_slow_queries(self.engine)
+        self.lag: float | None = None # None until the first successful check
+        self.error: str | None = None
+        self._over = 0 # consecutive checks above REPLICA_MAX_LAG
+
+    @property
+    def healthy(self) -> bool:
+        # The replay-timestamp lag jumps by the primary's idle time whenever new WAL
+        # arrives after a quiet spell, so one reading over the limit is not enough
+        return self.lag is not None and self._over < 2
+
+    def check(self):
+        try:
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name == "postgresql":
+                    self.lag = float(conn.execute(_LAG_SQL).scalar())
+                else:
+                    # SQLite stand-in: a copy of the primary with no replication to lag behind
+                    conn.execute(text("SELECT 1"))
+                    self.lag = 0.0
+            self.error = None
+            self._over = self._over + 1 if self.lag > REPLICA_MAX_LAG else 0
+        except Exception as e:
+            self.lag = None
+            self.error = str(e).splitlines()[0]
+        REPLICA_LAG.labels(self.name).set(self.lag if self.lag is not None else float("nan"))
+
+
+class ReadRouter:
+    """Routes read sessions to a replica that is healthy and close enough, else the primary.
+
+    A background task checks every replica's lag every REPLICA_LAG_CHECK_INTERVAL
+    seconds. A merchant that just wrote reads from the primary for
+    READ_YOUR_WRITES_WINDOW seconds, so it sees its own changes.
+    """
+
+    def __init__(self, urls: list[str]):
+        self.replicas = [Replica(f"replica{i}", url) for i, url in enumerate(urls)]
+        self._turn = itertools.count()
+        self._pins = TTLCache(maxsize=READ_PIN_CACHE_SIZE, ttl=READ_YOUR_WRITES_WINDOW)
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    # --- Read-your-writes ---
+    def pin(self, key: str):
+        self._pins.set(key, True)
+
+    def pinned(self, key: str | None) -> bool:
+        return key is not None and self._pins.get(key) is not MISSING
+
+    # --- Routing ---
+    def _choose(self, key: str | None) -> Replica | None:
+        if not self.replicas:
+            return None
+        if self.pinned(key):
+            READ_SESSIONS.labels("primary", "pinned").inc()
+            return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            READ_SESSIONS.labels("primary", "no_healthy_replica").inc()
+            return None
+        READ_SESSIONS.labels("replica", "ok").inc()
+        return healthy[next(self._turn) % len(healthy)]
+
+    def session(self, key: str | None = None):
+        replica = self._choose(key)
+        return replica.SessionLocal() if replica else SessionLocal()
+
+    def engine_for(self, key: str | None = None):
+        replica = self._choose(key)
+        return replica.engine if replica else engine
+
+    # --- Lag checks ---
+    def check(self):
+        for replica in self.replicas:
+            was_healthy = replica.healthy
+            replica.check()
+            if was_healthy and not replica.healthy:
+                reason = replica.error or f"lag {replica.lag:.1f}s > {REPLICA_MAX_LAG}s"
+                print(f"⚠️ Read replica {replica.name} out of rotation: {reason}")
+            elif replica.healthy and not was_healthy:
+                print(f"✅ Read replica {replica.name} in rotation (lag {replica.lag:.1f}s)")
+
+    async def _check_forever(self):
+        while True:
+            await asyncio.sleep(REPLICA_LAG_CHECK_INTERVAL)
+            try:
+                await asyncio.to_thread(self.check)
+            except Exception as e:
+                print(f"❌ Replica lag check failed: {e}")
+
+    async def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        await asyncio.to_thread(self.check)
+        self._task = asyncio.create_task(self._check_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for replica in self.replicas:
+            replica.engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "max_lag_seconds": REPLICA_MAX_LAG,
+            "read_your_writes_window": READ_YOUR_WRITES_WINDOW,
+            "pinned_merchants": len(self._pins),
+            "replicas": [
+                {"name": r.name, "healthy": r.healthy, "lag_seconds": r.lag, "error": r.error}
+                for r in self.replicas
+            ],
+        }
+
+
+read_router = ReadRouter(DATABASE_REPLICA_URLS)
+
+
+def get_read_db(request: Request):
+    """Session for read-only routes: a replica when one is fit to serve, else the primary."""
+    db = read_router.session(request.headers.get("x-api-key"))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def on_replica(db) -> bool:
+    return db.get_bind() is not engine
+
+
+def first_or_primary(db, fetch):
+    """`fetch(db)`, retried on the primary when a replica finds nothing.
+
+    A row written moments ago (possibly through another worker, where no pin
+    applies) may not have reached the replica yet; a 404 is only final from
+    the primary.
+    """
+    row = fetch(db)
+    if row is None and on_replica(db):
+        with SessionLocal() as primary:
+            row = fetch(primary)
+    return row
+
+
+def written_recently(ids: list[str]) -> list[str]:
+    """The IDs created within READ_YOUR_WRITES_WINDOW, going by the time in each ID.
+
+    The ID-level counterpart of a pin, for writes that went through another
+    worker: only these may still be missing from a replica in rotation. IDs
+    without a time, or random ones that decode to a time in the future,
+    predate them and have long been replicated.
+    """
+    now = datetime.now(timezone.utc)
+    since, until = now - timedelta(seconds=READ_YOUR_WRITES_WINDOW), now + ID_TIME_SLACK
+    recent = []
+    for value in ids:
+        try:
+            if since <= id_created_at(value) <= until:
+                recent.append(value)
+        except ValueError:
+            pass
+    return recent
+
+
+class ReadYourWritesMiddleware:
+    """Pins a merchant's reads to the primary when it sends a write (keyed by X-Api-Key).
+
+    The pin is taken when the write arrives and renewed when its response
+    starts, so the window runs from the commit even for slow writes.
+    """
+
+    def __init__(self, app, router: ReadRouter = read_router):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"].encode() not in _WRITE_METHODS:
+            return await self.app(scope, receive, send)
+        key = dict(scope["headers"]).get(b"x-api-key")
+        if key is None:
+            return await self.app(scope, receive, send)
+        key = key.decode("latin-1")
+        self.router.pin(key)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                self.router.pin(key)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
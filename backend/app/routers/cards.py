@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, HTTPException
+from ..schemas import CardValidateBatch, CardValidateBatchResponse
+from ..auth import MerchantSnapshot, get_current_merchant
+from ..bins import bin_table
+from ..utils import card_digits, luhn_ok, validate_expiry
+from datetime import datetime
+
+router = APIRouter(prefix="/api/v1/cards", tags=["Cards"])
+
+@router.post("/validate/batch", response_model=CardValidateBatchResponse)
+def validate_cards(
+    batch: CardValidateBatch,
+    merchant: MerchantSnapshot = Depends(get_current_merchant)
+):
+    # CPU only, no DB: a plain `def` so a large batch runs in the threadpool, not on the event loop
+    if not batch.cards:
+        raise HTTPException(status_code=400, detail={"error": {"code": "BAD_REQUEST_ERROR", "description": "No cards in batch"}})
+
+    now = datetime.now()
+    results = []
+    for index, card in enumerate(batch.cards):
+        digits = card_digits(card.number)
+        info = bin_table.lookup(digits)
+        # Same checks, codes and order as payment creation
+        error = None
+        if not luhn_ok(digits):
+            error = {"code": "INVALID_CARD", "description": "Invalid card number"}
+        elif (card.expiry_month or card.expiry_year) and not validate_expiry(card.expiry_month, card.expiry_year, now):
+            error = {"code": "EXPIRED_CARD", "description": "Card expired"}
+        results.append({
+            "index": index,
+            "valid": error is None,
+            "last4": digits[-4:] or None,
+            "network": info.network,
+            "issuer": info.issuer,
+            "card_type": info.card_type,
+            "country": info.country,
+            "error": error,
+        })
+
+    return {"results": results}
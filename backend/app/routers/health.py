@@ -1,8 +1,19 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
+from prometheus_client import CONTENT_TYPE_LATEST
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from ..database import get_db
+from ..database import DB_CONNECTION_BUDGET, POOL_SIZES, WEB_CONCURRENCY, async_engine, engine, get_db
+from ..auth import merchant_cache
+from ..checkout import checkout_cache, merchant_name_cache
+from ..webhooks import webhook_dispatcher
+from ..partitions import partition_maintainer
+from ..recovery import recovery_sweeper
+from ..replicas import read_router
+from ..ratelimit import rate_limiter
+from ..metrics import render
+from .. import profiling
 from datetime import datetime, timezone
+import os
 
 router = APIRouter()
 
@@ -21,4 +32,63 @@ def health_check(db: Session = Depends(get_db)):
         "status": "healthy",
         "database": db_status,
         "timestamp": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-    }
\ No newline at end of file
+    }
+
+@router.get("/health/caches")
+def cache_stats():
+    # Hit/miss/eviction counters for sizing the in-process caches
+    return {
+        "merchants": merchant_cache.stats(),
+        "checkout_orders": checkout_cache.stats(),
+        "checkout_merchant_names": merchant_name_cache.stats()
+    }
+
+@router.get("/health/webhooks")
+def webhook_stats():
+    # Delivery throughput counters and outbox lag for this process
+    return webhook_dispatcher.stats()
+
+@router.get("/health/partitions")
+def partition_stats():
+    # Attached partitions, months provisioned ahead and recent maintenance runs
+    return partition_maintainer.stats()
+
+@router.get("/health/recovery")
+def recovery_stats():
+    # Stuck payments this process has recovered, by outcome
+    return recovery_sweeper.stats()
+
+@router.get("/health/replicas")
+def replica_stats():
+    # Replica lag and rotation as last checked by this process
+    return read_router.stats()
+
+@router.get("/health/ratelimit")
+def ratelimit_stats():
+    # Quotas, payments in flight in this worker and store errors (limits fail open)
+    return rate_limiter.stats()
+
+@router.get("/health/pools")
+def pool_stats():
+    # This worker's connection pools and its share of DB_CONNECTION_BUDGET
+    def pool(p):
+        return {"size": p.size(), "checked_out": p.checkedout(), "overflow": max(0, p.overflow())} if hasattr(p, "checkedout") else {}
+
+    return {
+        "pid": os.getpid(),
+        "workers": WEB_CONCURRENCY,
+        "connection_budget": DB_CONNECTION_BUDGET or None,
+        "per_worker": POOL_SIZES,
+        "sync": pool(engine.pool),
+        "async": pool(async_engine.sync_engine.pool),
+    }
+
+@router.get("/health/profiling")
+def profiling_stats():
+    # Recent slow queries and event loop stalls for this process
+    return profiling.stats()
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    # Prometheus text format; every worker's samples under PROMETHEUS_MULTIPROC_DIR, else this process's
+    return Response(render(), media_type=CONTENT_TYPE_LATEST)
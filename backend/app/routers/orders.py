@@ -1,59 +1,170 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import ValidationError
+from sqlalchemy import and_, func, insert, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from ..database import get_db
-from ..models import Order, Merchant
-from ..schemas import OrderCreate, OrderResponse
-from ..auth import get_current_merchant
-import string
-import random
+from ..replicas import get_read_db, first_or_primary
+from ..models import Order
+from ..schemas import OrderCreate, OrderResponse, OrderBatchCreate, OrderBatchResponse
+from ..auth import MerchantSnapshot, get_current_merchant
+from ..checkout import forget_orders
+from ..ids import new_order_id, id_created_at, first_by_id, commit_with_new_id, is_unique_violation, ID_INSERT_ATTEMPTS
+from ..pagination import keyset_page, set_cursor_headers
+from typing import List, Optional
+from datetime import datetime
+import json
 
 router = APIRouter(prefix="/api/v1/orders", tags=["Orders"])
 
-def generate_order_id():
-    """Format: order_ + 16 alphanumeric chars"""
-    chars = string.ascii_letters + string.digits
-    random_str = ''.join(random.choices(chars, k=16))
-    return f"order_{random_str}"
-
 @router.post("", response_model=OrderResponse, status_code=201)
 def create_order(
     order_data: OrderCreate,
-    merchant: Merchant = Depends(get_current_merchant),
+    merchant: MerchantSnapshot = Depends(get_current_merchant),
     db: Session = Depends(get_db)
 ):
-    # 1. Generate Unique ID
-    new_id = generate_order_id()
-    while db.query(Order).filter(Order.id == new_id).first():
-        new_id = generate_order_id() # Retry if collision (rare)
-
-    # 2. Create Order Record
+    # 1. Create Order Record (the primary key guards uniqueness, retried on collision)
     new_order = Order(
-        id=new_id,
+        id=new_order_id(),
         merchant_id=merchant.id,
         amount=order_data.amount,
         currency=order_data.currency,
         receipt=order_data.receipt,
         notes=order_data.notes,
         status="created"
+        # created_at comes from the id (app.models), so it compares with list cursors on SQLite too
     )
 
-    db.add(new_order)
-    db.commit()
-    db.refresh(new_order)
-    
+    # INSERT ... RETURNING fills created_at/updated_at; no refresh needed
+    commit_with_new_id(db, new_order, new_order_id)
     return new_order
 
+@router.post("/batch", response_model=OrderBatchResponse, status_code=201)
+def create_orders_batch(
+    batch: OrderBatchCreate,
+    merchant: MerchantSnapshot = Depends(get_current_merchant),
+    db: Session = Depends(get_db)
+):
+    # 1. Validate each item on its own, collecting per-item errors
+    rows, errors = [], []
+    for index, item in enumerate(batch.orders):
+        try:
+            order_data = OrderCreate.model_validate(item)
+        except ValidationError as e:
+            issue = e.errors()[0]
+            field = ".".join(str(part) for part in issue["loc"])
+            errors.append({"index": index, "error": {"code": "BAD_REQUEST_ERROR", "description": f"{field}: {issue['msg']}"}})
+            continue
+        order_id = new_order_id()
+        rows.append({
+            "id": order_id,
+            "merchant_id": merchant.id,
+            "amount": order_data.amount,
+            "currency": order_data.currency,
+            "receipt": order_data.receipt,
+            "notes": order_data.notes,
+            "status": "created",
+            "created_at": id_created_at(order_id) # bulk INSERTs skip the model's id validator
+        })
+
+    if not rows:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": {"code": "BAD_REQUEST_ERROR", "description": "No valid orders in batch"}, "errors": errors}
+        )
+
+    # 2. One multi-row INSERT ... RETURNING in a single transaction
+    for attempt in range(ID_INSERT_ATTEMPTS):
+        try:
+            created = db.scalars(insert(Order).returning(Order, sort_by_parameter_order=True), rows).all()
+            # Bulk INSERTs skip after_insert: clear any cached 404s for these ids ourselves
+            forget_orders(db, [order.id for order in created])
+            db.commit()
+            break
+        except IntegrityError as e:
+            db.rollback()
+            if attempt == ID_INSERT_ATTEMPTS - 1 or not is_unique_violation(e):
+                raise
+            for row in rows:
+                row["id"] = new_order_id()
+                row["created_at"] = id_created_at(row["id"])
+
+    return {"orders": created, "errors": errors}
+
+def _bad_request(description: str) -> HTTPException:
+    return HTTPException(status_code=400, detail={"error": {"code": "BAD_REQUEST_ERROR", "description": description}})
+
+def notes_filter(db: Session, raw: str):
+    """`notes` contains the JSON object `raw` (Postgres: jsonb @>, served by the GIN index)."""
+    try:
+        wanted = json.loads(raw)
+    except ValueError:
+        wanted = None
+    if not isinstance(wanted, dict) or not wanted:
+        raise _bad_request('notes must be a JSON object, e.g. {"customer_id": "cus_123"}')
+    if db.get_bind().dialect.name == "postgresql":
+        return type_coerce(Order.notes, JSONB).contains(wanted)
+    # SQLite stand-in: each top-level key must equal its value (nested values compared as JSON text)
+    return and_(*(
+        func.json_extract(Order.notes, f'$."{key}"') == (json.dumps(value, separators=(",", ":")) if isinstance(value, (dict, list)) else value)
+        for key, value in wanted.items()
+    ))
+
+def receipt_prefix_filter(prefix: str):
+    # Escaped by hand rather than autoescape, so the pattern stays a plain literal Postgres can turn into an index range
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return Order.receipt.like(escaped + "%", escape="\\")
+
+@router.get("", response_model=List[OrderResponse])
+def list_orders(
+    response: Response,
+    limit: int = Query(100, ge=1, le=100),
+    starting_after: Optional[str] = None,
+    ending_before: Optional[str] = None,
+    status: Optional[str] = None,
+    receipt: Optional[str] = None,
+    receipt_prefix: Optional[str] = Query(None, min_length=1),
+    notes: Optional[str] = Query(None, description='JSON object the order\'s notes must contain, e.g. {"customer_id": "cus_123"}'),
+    created_from: Optional[datetime] = Query(None, alias="from"),
+    created_to: Optional[datetime] = Query(None, alias="to"),
+    merchant: MerchantSnapshot = Depends(get_current_merchant),
+    db: Session = Depends(get_read_db)
+):
+    # Newest first with the same cursors as list_payments. Receipt filters use
+    # ix_orders_merchant_receipt, notes the GIN index, the rest ix_orders_merchant_created
+    if receipt is not None and receipt_prefix is not None:
+        raise _bad_request("Use only one of receipt / receipt_prefix")
+    query = db.query(Order).filter(Order.merchant_id == merchant.id)
+    if status:
+        query = query.filter(Order.status == status)
+    if receipt is not None:
+        query = query.filter(Order.receipt == receipt)
+    if receipt_prefix is not None:
+        query = query.filter(receipt_prefix_filter(receipt_prefix))
+    if notes is not None:
+        query = query.filter(notes_filter(db, notes))
+    if created_from:
+        query = query.filter(Order.created_at >= created_from)
+    if created_to:
+        query = query.filter(Order.created_at < created_to)
+
+    orders, has_older, has_newer = keyset_page(query, Order, limit, starting_after, ending_before)
+    set_cursor_headers(response, orders, has_older, has_newer)
+
+    return orders
+
 @router.get("/{order_id}", response_model=OrderResponse)
 def get_order(
     order_id: str,
-    merchant: Merchant = Depends(get_current_merchant),
-    db: Session = Depends(get_db)
+    merchant: MerchantSnapshot = Depends(get_current_merchant),
+    db: Session = Depends(get_read_db)
 ):
     # Fetch order and ensure it belongs to the authenticated merchant
-    order = db.query(Order).filter(
-        Order.id == order_id, 
+    order = first_or_primary(db, lambda session: first_by_id(Order, order_id, lambda criteria: session.query(Order).filter(
+        *criteria,
         Order.merchant_id == merchant.id
-    ).first()
+    ).first()))
 
     if not order:
         raise HTTPException(
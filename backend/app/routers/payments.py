@@ -1,119 +1,124 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import any_, bindparam, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Session
-from ..database import get_db
-from ..models import Payment, Order, Merchant
-from ..schemas import PaymentCreate, PaymentResponse
-from ..auth import get_current_merchant
-from ..utils import validate_vpa, validate_luhn, get_card_network, validate_expiry
-from typing import List
-import string
-import random
-import asyncio
-import os
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.types import String
+from ..database import SessionLocal, get_async_db
+from ..replicas import get_read_db, first_or_primary, on_replica, read_router, written_recently
+from ..models import Payment, Order
+from ..ids import first_by_id, first_by_id_async
+from ..schemas import PaymentCreate, PaymentResponse, PaymentLookup, PaymentLookupResponse
+from ..auth import MerchantSnapshot, get_current_merchant, get_current_merchant_async
+from ..processing import payment_processor, PaymentError
+from ..pagination import keyset_page, set_cursor_headers
+from ..export import export_query, stream_export, MEDIA_TYPES
+from ..ratelimit import payment_slot
+from typing import List, Optional
+from datetime import datetime
 import re
 
 router = APIRouter(prefix="/api/v1/payments", tags=["Payments"])
 
-# Generate Payment ID
-def generate_pay_id():
-    chars = string.ascii_letters + string.digits
-    random_str = ''.join(random.choices(chars, k=16))
-    return f"pay_{random_str}"
-
-@router.post("", response_model=PaymentResponse, status_code=201)
+@router.post("", response_model=PaymentResponse, status_code=201, dependencies=[Depends(payment_slot)])
 async def create_payment(
     pay_data: PaymentCreate,
-    merchant: Merchant = Depends(get_current_merchant),
-    db: Session = Depends(get_db)
+    merchant: MerchantSnapshot = Depends(get_current_merchant_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # 1. Verify Order exists & belongs to merchant
-    order = db.query(Order).filter(Order.id == pay_data.order_id, Order.merchant_id == merchant.id).first()
+    async def fetch(criteria):
+        result = await db.execute(select(Order).where(*criteria, Order.merchant_id == merchant.id))
+        return result.scalars().first()
+
+    order = await first_by_id_async(Order, pay_data.order_id, fetch)
     if not order:
         raise HTTPException(status_code=404, detail={"error": {"code": "NOT_FOUND_ERROR", "description": "Order not found"}})
 
-    # 2. Validate Inputs
-    card_network = None
-    card_last4 = None
-    
-    if pay_data.method == "upi":
-        if not pay_data.vpa or not validate_vpa(pay_data.vpa):
-            raise HTTPException(status_code=400, detail={"error": {"code": "INVALID_VPA", "description": "Invalid VPA format"}})
-            
-    elif pay_data.method == "card":
-        if not pay_data.card:
-            raise HTTPException(status_code=400, detail={"error": {"code": "BAD_REQUEST_ERROR", "description": "Card details required"}})
-        
-        # Luhn Check
-        if not validate_luhn(pay_data.card.number):
-             raise HTTPException(status_code=400, detail={"error": {"code": "INVALID_CARD", "description": "Invalid card number"}})
-        
-        # Expiry Check
-        if not validate_expiry(pay_data.card.expiry_month, pay_data.card.expiry_year):
-             raise HTTPException(status_code=400, detail={"error": {"code": "EXPIRED_CARD", "description": "Card expired"}})
-             
-        card_network = get_card_network(pay_data.card.number)
-        card_last4 = pay_data.card.number[-4:]
+    # 2. Validate, create and settle (inline mode) or queue (async mode)
+    try:
+        return await payment_processor.create_payment(db, order, pay_data)
+    except PaymentError as e:
+        raise e.as_http()
 
-    # 3. Create Payment (Status: Processing)
-    new_id = generate_pay_id()
-    new_payment = Payment(
-        id=new_id,
-        order_id=order.id,
-        merchant_id=merchant.id,
-        amount=order.amount,
-        currency=order.currency,
-        method=pay_data.method,
-        status="processing",
-        vpa=pay_data.vpa,
-        card_network=card_network,
-        card_last4=card_last4
+# Declared before /{payment_id} so "export" is not taken for an ID
+@router.get("/export")
+def export_payments(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    status: Optional[str] = None,
+    method: Optional[str] = None,
+    created_from: Optional[datetime] = Query(None, alias="from"),
+    created_to: Optional[datetime] = Query(None, alias="to"),
+    merchant: MerchantSnapshot = Depends(get_current_merchant)
+):
+    # Streams every matching payment, oldest first; no session is held by the route itself
+    query = export_query(merchant.id, created_from, created_to, status, method)
+    filename = f"payments.{format}"
+    return StreamingResponse(
+        stream_export(query, format, read_router.engine_for(request.headers.get("x-api-key"))),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
-    
-    db.add(new_payment)
-    db.commit()
-    db.refresh(new_payment)
-    
-    # 4. Simulate Bank Delay (Async)
-    # Check Test Mode
-    is_test_mode = os.getenv("TEST_MODE", "false").lower() == "true"
-    
-    if is_test_mode:
-        delay_ms = int(os.getenv("TEST_PROCESSING_DELAY", "1000"))
-        await asyncio.sleep(delay_ms / 1000)
-        
-        # Force success/fail based on ENV
-        success = os.getenv("TEST_PAYMENT_SUCCESS", "true").lower() == "true"
-    else:
-        # Random Delay 5-10s
-        delay = random.uniform(5, 10)
-        await asyncio.sleep(delay)
-        
-        # Random Success (90% UPI, 95% Card)
-        if pay_data.method == "upi":
-            success = random.random() < 0.90
-        else:
-            success = random.random() < 0.95
 
-    # 5. Update Status
-    if success:
-        new_payment.status = "success"
-    else:
-        new_payment.status = "failed"
-        new_payment.error_code = "PAYMENT_FAILED"
-        new_payment.error_description = "Bank declined transaction"
-        
-    db.commit()
-    db.refresh(new_payment)
-    
-    return new_payment
+def _matches(session: Session, column, ids: list[str]):
+    # Postgres: one array parameter, so the statement text (and its plan) is the same for any number of IDs
+    if session.get_bind().dialect.name == "postgresql":
+        return column == any_(bindparam(None, ids, type_=ARRAY(String)))
+    return column.in_(ids)
+
+def _lookup(session: Session, merchant_id, payment_ids: list[str], order_ids: list[str]) -> list[dict]:
+    conditions = []
+    if payment_ids:
+        conditions.append(_matches(session, Payment.id, payment_ids))
+    if order_ids:
+        conditions.append(_matches(session, Payment.order_id, order_ids))
+    query = select(
+        Payment.id, Payment.order_id, Payment.status, Payment.amount, Payment.error_code
+    ).where(Payment.merchant_id == merchant_id, or_(*conditions))
+    return [row._asdict() for row in session.execute(query)]
+
+def _unknown(found: list[dict], payment_ids: list[str], order_ids: list[str]) -> tuple[list[str], list[str]]:
+    found_payments = {row["id"] for row in found}
+    found_orders = {row["order_id"] for row in found}
+    return [i for i in payment_ids if i not in found_payments], [i for i in order_ids if i not in found_orders]
+
+# POST (IDs in the body), declared before /{payment_id} like /export
+@router.post("/lookup", response_model=PaymentLookupResponse)
+def lookup_payments(
+    lookup: PaymentLookup,
+    merchant: MerchantSnapshot = Depends(get_current_merchant),
+    db: Session = Depends(get_read_db)
+):
+    # Reconciliation: statuses of many known payments (or orders' payments) in one query
+    payment_ids = list(dict.fromkeys(lookup.payment_ids))
+    order_ids = list(dict.fromkeys(lookup.order_ids))
+    if not payment_ids and not order_ids:
+        raise HTTPException(status_code=400, detail={"error": {"code": "BAD_REQUEST_ERROR", "description": "No payment_ids or order_ids to look up"}})
+
+    found = _lookup(db, merchant.id, payment_ids, order_ids)
+    unknown_payments, unknown_orders = _unknown(found, payment_ids, order_ids)
+    # A pinned merchant is already on the primary. Otherwise only IDs created within the
+    # read-your-writes window are re-checked there, so misses on old or made-up IDs stay one query.
+    if on_replica(db):
+        recent_payments, recent_orders = written_recently(unknown_payments), written_recently(unknown_orders)
+        if recent_payments or recent_orders:
+            with SessionLocal() as primary:
+                found += _lookup(primary, merchant.id, recent_payments, recent_orders)
+            unknown_payments, unknown_orders = _unknown(found, payment_ids, order_ids)
+
+    return {"payments": found, "unknown_payment_ids": unknown_payments, "unknown_order_ids": unknown_orders}
 
 @router.get("/{payment_id}", response_model=PaymentResponse)
 def get_payment(
     payment_id: str,
-    merchant: Merchant = Depends(get_current_merchant),
-    db: Session = Depends(get_db)
+    merchant: MerchantSnapshot = Depends(get_current_merchant),
+    db: Session = Depends(get_read_db)
 ):
-    payment = db.query(Payment).filter(Payment.id == payment_id, Payment.merchant_id == merchant.id).first()
+    payment = first_or_primary(db, lambda session: first_by_id(
+        Payment, payment_id, lambda criteria: session.query(Payment).filter(*criteria, Payment.merchant_id == merchant.id).first()
+    ))
     
     if not payment:
          raise HTTPException(status_code=404, detail={"error": {"code": "NOT_FOUND_ERROR", "description": "Payment not found"}})
@@ -122,13 +127,44 @@ def get_payment(
 
 @router.get("", response_model=List[PaymentResponse])
 def list_payments(
-    skip: int = 0, 
-    limit: int = 100,
-    merchant: Merchant = Depends(get_current_merchant),
-    db: Session = Depends(get_db)
+    response: Response,
+    limit: int = Query(100, ge=1, le=100),
+    starting_after: Optional[str] = None,
+    ending_before: Optional[str] = None,
+    status: Optional[str] = None,
+    method: Optional[str] = None,
+    order_id: Optional[str] = None,
+    created_from: Optional[datetime] = Query(None, alias="from"),
+    created_to: Optional[datetime] = Query(None, alias="to"),
+    skip: int = Query(0, ge=0, deprecated=True, description="Removed: page with starting_after / ending_before"),
+    merchant: MerchantSnapshot = Depends(get_current_merchant),
+    db: Session = Depends(get_read_db)
 ):
-    payments = db.query(Payment).filter(
-        Payment.merchant_id == merchant.id
-    ).order_by(Payment.created_at.desc()).offset(skip).limit(limit).all()
+    # Offset paging was replaced by cursors; fail loudly rather than serve page 1 again
+    if skip:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": {
+                "code": "BAD_REQUEST_ERROR",
+                "description": "skip is no longer supported: pass the X-Next-Cursor header of the previous page as starting_after"
+            }}
+        )
+
+    # Every filter combination leads with merchant_id and ends in (created_at, id),
+    # matching the composite indexes on Payment
+    query = db.query(Payment).filter(Payment.merchant_id == merchant.id)
+    if status:
+        query = query.filter(Payment.status == status)
+    if method:
+        query = query.filter(Payment.method == method)
+    if order_id:
+        query = query.filter(Payment.order_id == order_id)
+    if created_from:
+        query = query.filter(Payment.created_at >= created_from)
+    if created_to:
+        query = query.filter(Payment.created_at < created_to)
+
+    payments, has_older, has_newer = keyset_page(query, Payment, limit, starting_after, ending_before)
+    set_cursor_headers(response, payments, has_older, has_newer)
     
     return payments
\ No newline at end of file
@@ -1,100 +1,112 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from ..database import get_db
-from ..models import Order, Payment, Merchant
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db, AsyncSessionLocal
+from ..replicas import get_read_db, first_or_primary
+from ..models import Order, Payment
+from ..ids import first_by_id, first_by_id_async
 from ..schemas import OrderResponse, PaymentCreate, PaymentResponse
-from ..utils import validate_vpa, validate_luhn, get_card_network, validate_expiry
-from .payments import create_payment # Reuse logic if possible, or reimplement slightly
-import string
-import random
+from ..processing import payment_processor, PaymentError
+from ..events import payment_events
+from ..checkout import get_checkout_view
+from ..ratelimit import limit_public_client, limit_public_order, payment_slot
 import asyncio
+import json
 import os
 
-router = APIRouter(prefix="/api/v1/public", tags=["Public Checkout"])
+# Unauthenticated, so limited per client IP (RATE_LIMIT_PUBLIC_*)
+router = APIRouter(prefix="/api/v1/public", tags=["Public Checkout"], dependencies=[Depends(limit_public_client)])
+
+# Server-sent status stream limits (seconds)
+PAYMENT_EVENTS_TIMEOUT = float(os.getenv("PAYMENT_EVENTS_TIMEOUT", "120"))
+PAYMENT_EVENTS_HEARTBEAT = float(os.getenv("PAYMENT_EVENTS_HEARTBEAT", "15"))
 
 # Public Endpoint to fetch Order Details (No Auth needed)
+# Read-through cached: a cache hit opens no session at all
 @router.get("/orders/{order_id}")
-def get_public_order(order_id: str, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
+async def get_public_order(order_id: str):
+    view = await get_checkout_view(AsyncSessionLocal, order_id)
+    if view is None:
         raise HTTPException(status_code=404, detail="Order not found")
-    
+
     # Return minimal info needed for checkout
-    return {
-        "id": order.id,
-        "amount": order.amount,
-        "currency": order.currency,
-        "status": order.status,
-        "merchant_name": "Test Merchant" # In real app, join with Merchant table
-    }
+    return view
 
 # Public Endpoint to Process Payment (No Auth needed, but validated by Order ID)
-@router.post("/payments")
-async def create_public_payment(pay_data: PaymentCreate, db: Session = Depends(get_db)):
+@router.post("/payments", dependencies=[Depends(payment_slot)])
+async def create_public_payment(pay_data: PaymentCreate, db: AsyncSession = Depends(get_async_db)):
+    # Attempts per order, however many IPs they come from
+    await limit_public_order(pay_data.order_id)
+
     # 1. Fetch Order
-    order = db.query(Order).filter(Order.id == pay_data.order_id).first()
+    async def fetch(criteria):
+        return (await db.execute(select(Order).where(*criteria))).scalars().first()
+
+    order = await first_by_id_async(Order, pay_data.order_id, fetch)
     if not order:
          raise HTTPException(status_code=404, detail="Order not found")
          
-    # 2. Re-use the Merchant from the Order
-    merchant = db.query(Merchant).filter(Merchant.id == order.merchant_id).first()
-    
-    # 3. Call the logic directly (re-implementing briefly to avoid dependency circles)
-    # Validate
-    card_network = None
-    card_last4 = None
-    
-    if pay_data.method == "upi":
-        if not pay_data.vpa or not validate_vpa(pay_data.vpa):
-            raise HTTPException(status_code=400, detail="Invalid VPA")
-    elif pay_data.method == "card":
-        if not pay_data.card or not validate_luhn(pay_data.card.number):
-             raise HTTPException(status_code=400, detail="Invalid Card")
-        card_network = get_card_network(pay_data.card.number)
-        card_last4 = pay_data.card.number[-4:]
-
-    # Create Payment Record
-    chars = string.ascii_letters + string.digits
-    new_id = f"pay_{''.join(random.choices(chars, k=16))}"
-    
-    new_payment = Payment(
-        id=new_id,
-        order_id=order.id,
-        merchant_id=merchant.id,
-        amount=order.amount,
-        currency=order.currency,
-        method=pay_data.method,
-        status="processing",
-        vpa=pay_data.vpa,
-        card_network=card_network,
-        card_last4=card_last4
-    )
-    db.add(new_payment)
-    db.commit()
-    db.refresh(new_payment)
-    
-    # Simulation (Async)
-    is_test = os.getenv("TEST_MODE", "false").lower() == "true"
-    if is_test:
-        await asyncio.sleep(int(os.getenv("TEST_PROCESSING_DELAY", "1000")) / 1000)
-        success = os.getenv("TEST_PAYMENT_SUCCESS", "true").lower() == "true"
-    else:
-        await asyncio.sleep(random.uniform(5, 8))
-        success = random.random() < (0.90 if pay_data.method == "upi" else 0.95)
-        
-    new_payment.status = "success" if success else "failed"
-    if not success:
-        new_payment.error_code = "PAYMENT_FAILED"
-        new_payment.error_description = "Declined"
-        
-    db.commit()
-    db.refresh(new_payment)
-    return new_payment
+    # 2. Same validation and settlement as the merchant API; the order carries the merchant
+    try:
+        return await payment_processor.create_payment(db, order, pay_data)
+    except PaymentError as e:
+        raise e.as_http(public=True)
     
 # Public Status Check
 @router.get("/payments/{payment_id}")
-def get_public_payment_status(payment_id: str, db: Session = Depends(get_db)):
-    payment = db.query(Payment).filter(Payment.id == payment_id).first()
+def get_public_payment_status(payment_id: str, db: Session = Depends(get_read_db)):
+    payment = first_or_primary(
+        db, lambda session: first_by_id(Payment, payment_id, lambda criteria: session.query(Payment).filter(*criteria).first())
+    )
     if not payment:
          raise HTTPException(status_code=404, detail="Payment not found")
-    return payment
\ No newline at end of file
+    return payment
+
+# Public Status Stream (Server-Sent Events)
+# One held connection per checkout instead of polling; no DB connection is held while parked.
+@router.get("/payments/{payment_id}/events")
+async def stream_public_payment_status(payment_id: str, request: Request):
+    # Subscribe before reading so a change landing in between is not missed
+    queue = payment_events.subscribe(payment_id)
+    try:
+        async with AsyncSessionLocal() as db:
+            async def fetch(criteria):
+                result = await db.execute(
+                    select(Payment.id, Payment.status, Payment.error_code, Payment.error_description).where(*criteria)
+                )
+                return result.first()
+
+            row = await first_by_id_async(Payment, payment_id, fetch)
+    except BaseException:
+        payment_events.unsubscribe(payment_id, queue)
+        raise
+    if not row:
+        payment_events.unsubscribe(payment_id, queue)
+        raise HTTPException(status_code=404, detail="Payment not found")
+
+    async def stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + PAYMENT_EVENTS_TIMEOUT
+        message = dict(row._mapping)
+        try:
+            yield f"event: status\ndata: {json.dumps(message)}\n\n"
+            while message["status"] == "processing" and loop.time() < deadline:
+                if await request.is_disconnected():
+                    break
+                try:
+                    wait = min(PAYMENT_EVENTS_HEARTBEAT, deadline - loop.time())
+                    message = await asyncio.wait_for(queue.get(), timeout=wait)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: status\ndata: {json.dumps(message)}\n\n"
+        finally:
+            payment_events.unsubscribe(payment_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
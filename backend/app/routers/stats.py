@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from ..replicas import get_read_db
+from ..models import PaymentStatsHourly
+from ..schemas import StatsResponse
+from ..auth import MerchantSnapshot, get_current_merchant
+from ..stats import bucket_start, bucket_end
+from typing import Optional
+from datetime import datetime
+
+router = APIRouter(prefix="/api/v1/stats", tags=["Stats"])
+
+def _summary(count: int, amount: int, success_count: int, failed_count: int, success_amount: int) -> dict:
+    settled = success_count + failed_count
+    return {
+        "count": count,
+        "amount": amount,
+        "volume": success_amount,
+        "success_count": success_count,
+        "failed_count": failed_count,
+        "success_rate": round(success_count / settled, 4) if settled else 0.0,
+    }
+
+@router.get("", response_model=StatsResponse)
+def get_stats(
+    created_from: Optional[datetime] = Query(None, alias="from"),
+    created_to: Optional[datetime] = Query(None, alias="to"),
+    merchant: MerchantSnapshot = Depends(get_current_merchant),
+    db: Session = Depends(get_read_db)
+):
+    # Reads hourly rollup rows, so the cost depends on the window length, not on
+    # how many payments it holds. Bounds are widened to whole hours.
+    table = PaymentStatsHourly
+    query = select(table.status, table.method, func.sum(table.count), func.sum(table.amount)).where(table.merchant_id == merchant.id)
+    window_from = bucket_start(created_from) if created_from else None
+    window_to = bucket_end(created_to) if created_to else None
+    if window_from:
+        query = query.where(table.bucket >= window_from)
+    if window_to:
+        query = query.where(table.bucket < window_to)
+    rows = db.execute(query.group_by(table.status, table.method)).all()
+
+    # Fold the (status, method) cells into overall, per-status and per-method figures
+    totals = {"count": 0, "amount": 0, "success_count": 0, "failed_count": 0, "success_amount": 0}
+    methods = {}
+    by_status = {}
+    for status, method, count, amount in rows:
+        count, amount = int(count or 0), int(amount or 0)
+        if not count:
+            continue
+        cell = methods.setdefault(method, {"count": 0, "amount": 0, "success_count": 0, "failed_count": 0, "success_amount": 0})
+        entry = by_status.setdefault(status, {"count": 0, "amount": 0})
+        entry["count"] += count
+        entry["amount"] += amount
+        for acc in (totals, cell):
+            acc["count"] += count
+            acc["amount"] += amount
+            if status == "success":
+                acc["success_count"] += count
+                acc["success_amount"] += amount
+            elif status == "failed":
+                acc["failed_count"] += count
+
+    return {
+        "from": window_from,
+        "to": window_to,
+        **_summary(**totals),
+        "by_status": by_status,
+        "by_method": {method: _summary(**cell) for method, cell in methods.items()},
+    }
@@ -1,8 +1,13 @@
-from pydantic import BaseModel, Field, validator
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, Field, model_validator, validator
+from typing import Optional, Dict, Any, List
 from datetime import datetime
+import os
 import uuid
 
+ORDER_BATCH_MAX = int(os.getenv("ORDER_BATCH_MAX", "1000"))
+CARD_BATCH_MAX = int(os.getenv("CARD_BATCH_MAX", "10000"))
+PAYMENT_LOOKUP_MAX = int(os.getenv("PAYMENT_LOOKUP_MAX", "1000"))
+
 # --- Order Schemas ---
 class OrderCreate(BaseModel):
     amount: int = Field(..., ge=100, description="Amount in paise (min 100)")
@@ -21,6 +26,18 @@ class OrderResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+class OrderBatchCreate(BaseModel):
+    # Items are validated one by one in the route so bad rows can be reported individually
+    orders: List[Dict[str, Any]] = Field(..., max_length=ORDER_BATCH_MAX)
+
+class OrderBatchError(BaseModel):
+    index: int
+    error: Dict[str, Any]
+
+class OrderBatchResponse(BaseModel):
+    orders: List[OrderResponse]
+    errors: List[OrderBatchError]
+
   # ... existing Order schemas ...
 
 # --- Payment Schemas ---
@@ -52,4 +69,65 @@ class PaymentResponse(BaseModel):
     created_at: datetime
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class PaymentLookup(BaseModel):
+    payment_ids: List[str] = Field([], max_length=PAYMENT_LOOKUP_MAX)
+    order_ids: List[str] = Field([], max_length=PAYMENT_LOOKUP_MAX) # every payment of these orders
+
+    @model_validator(mode="after")
+    def _at_most_max_ids(self):
+        if len(self.payment_ids) + len(self.order_ids) > PAYMENT_LOOKUP_MAX:
+            raise ValueError(f"At most {PAYMENT_LOOKUP_MAX} IDs per lookup")
+        return self
+
+class PaymentStatus(BaseModel):
+    id: str
+    order_id: str
+    status: str
+    amount: int
+    error_code: Optional[str]
+
+class PaymentLookupResponse(BaseModel):
+    payments: List[PaymentStatus]
+    unknown_payment_ids: List[str]
+    unknown_order_ids: List[str] # orders with no payment (or not this merchant's)
+
+# --- Card Validation Schemas ---
+class CardCheck(BaseModel):
+    number: str
+    expiry_month: Optional[str] = None
+    expiry_year: Optional[str] = None
+
+class CardValidateBatch(BaseModel):
+    cards: List[CardCheck] = Field(..., max_length=CARD_BATCH_MAX)
+
+class CardCheckResult(BaseModel):
+    index: int
+    valid: bool
+    last4: Optional[str]
+    network: str
+    issuer: Optional[str]
+    card_type: Optional[str]
+    country: Optional[str]
+    error: Optional[Dict[str, Any]] = None
+
+class CardValidateBatchResponse(BaseModel):
+    results: List[CardCheckResult]
+
+# --- Stats Schemas ---
+class StatsBucket(BaseModel):
+    count: int
+    amount: int
+
+class StatsSummary(StatsBucket):
+    volume: int # Amount of successful payments
+    success_count: int
+    failed_count: int
+    success_rate: float # success / (success + failed)
+
+class StatsResponse(StatsSummary):
+    window_from: Optional[datetime] = Field(None, alias="from")
+    window_to: Optional[datetime] = Field(None, alias="to")
+    by_status: Dict[str, StatsBucket]
+    by_method: Dict[str, StatsSummary]
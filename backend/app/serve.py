@@ -0,0 +1,67 @@
+"""Production entry point: run the startup tasks once, then serve with N worker processes.
+
+    python -m app.serve --workers 4 --port 8000
+
+Workers default to WEB_CONCURRENCY, else one per CPU. The supervisor
+migrates, provisions partitions and seeds (app.bootstrap) before any worker
+starts, then uvicorn's process manager starts the workers, restarts any
+that die and shuts them all down gracefully on SIGTERM/SIGINT. Each worker sizes its
+database pools from DB_CONNECTION_BUDGET / workers (see app.database).
+With more than one worker, PROMETHEUS_MULTIPROC_DIR (a fresh temporary
+directory unless set) lets /metrics report all of them (see app.metrics).
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1)
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    parser.add_argument("--access-log", action="store_true", help="log every request (off: /metrics has the counts)")
+    parser.add_argument("--skip-startup-tasks", action="store_true", help="already done by a release step (python -m app.bootstrap)")
+    opts = parser.parse_args(argv)
+
+    # Inherited by the workers: pool sizing divides the connection budget by this
+    os.environ["WEB_CONCURRENCY"] = str(opts.workers)
+    # Before anything imports prometheus_client, which picks its storage on import
+    if opts.workers > 1 or os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="gateway-metrics-"))
+        os.makedirs(metrics_dir, exist_ok=True)
+        for stale in glob.glob(os.path.join(metrics_dir, "*.db")): # a previous run's samples would add up with ours
+            os.remove(stale)
+
+    if not opts.skip_startup_tasks:
+        from . import bootstrap
+        from .database import engine
+
+        try:
+            bootstrap.run_startup_tasks()
+        except Exception as e:
+            print(f"❌ Startup tasks failed: {e}")
+            return 1
+        engine.dispose() # the supervisor serves nothing; don't sit on its connection
+        if opts.workers > 1 and os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            from prometheus_client import multiprocess
+
+            multiprocess.mark_process_dead(os.getpid()) # nor report gauges next to the workers'
+        bootstrap.RUN_STARTUP_TASKS = False # with --workers 1 the app is served from this same process
+    os.environ["RUN_STARTUP_TASKS"] = "false"
+
+    import uvicorn
+
+    print(f"🚀 Serving on {opts.host}:{opts.port} with {opts.workers} worker(s)")
+    uvicorn.run(
+        "app.main:app", host=opts.host, port=opts.port, workers=opts.workers,
+        log_level=opts.log_level, access_log=opts.access_log,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
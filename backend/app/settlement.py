@@ -0,0 +1,110 @@
+import asyncio
+import os
+from typing import Awaitable, Callable
+
+from .metrics import SETTLEMENT_QUEUE_DEPTH, metrics_sampler
+
+# "inline" keeps the request open until the bank responds (legacy behaviour),
+# "async" returns 201 with status=processing and settles in the worker pool.
+PROCESSING_MODE = os.getenv("PROCESSING_MODE", "inline").lower()
+SETTLEMENT_WORKERS = int(os.getenv("SETTLEMENT_WORKERS", "64"))
+SETTLEMENT_QUEUE_SIZE = int(os.getenv("SETTLEMENT_QUEUE_SIZE", "1000"))
+SETTLEMENT_DRAIN_TIMEOUT = float(os.getenv("SETTLEMENT_DRAIN_TIMEOUT", "10"))
+
+
+# --- Settlement Worker Pool ---
+class SettlementQueue:
+    """Bounded queue of processing payments drained by a pool of asyncio workers.
+
+    Routes reserve a slot *before* inserting the payment so a full queue is
+    reported as backpressure (503) instead of leaving an unsettled row behind.
+    Workers hand each payment to the `settle(payment_id, method)` coroutine
+    given to start().
+    """
+
+    def __init__(self, workers: int, max_depth: int):
+        self.workers = workers
+        self.max_depth = max_depth
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._settle: Callable[[str, str], Awaitable[None]] | None = None
+        self._reserved = 0
+        self.in_flight = 0
+        self.settled = 0
+        self.errors = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return PROCESSING_MODE == "async" and self._queue is not None
+
+    @property
+    def depth(self) -> int:
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return queued + self._reserved
+
+    def try_reserve(self) -> bool:
+        if self.depth >= self.max_depth:
+            self.rejected += 1
+            return False
+        self._reserved += 1
+        return True
+
+    def release(self):
+        self._reserved -= 1
+
+    def submit(self, payment_id: str, method: str):
+        """Hand a reserved slot over to the workers."""
+        self._reserved -= 1
+        self._queue.put_nowait((payment_id, method))
+
+    async def start(self, settle: Callable[[str, str], Awaitable[None]]):
+        if PROCESSING_MODE != "async" or self._queue is not None:
+            return
+        self._settle = settle
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        if self._queue is None:
+            return
+        # Give queued payments a chance to settle; anything left stays "processing"
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=SETTLEMENT_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Settlement stopped with {self._queue.qsize()} payments still queued")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def _worker(self):
+        while True:
+            payment_id, method = await self._queue.get()
+            self.in_flight += 1
+            try:
+                await self._settle(payment_id, method)
+                self.settled += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Settlement failed for {payment_id}: {e}")
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "mode": PROCESSING_MODE,
+            "workers": self.workers,
+            "queue_depth": self.depth,
+            "queue_capacity": self.max_depth,
+            "in_flight": self.in_flight,
+            "settled": self.settled,
+            "errors": self.errors,
+            "rejected": self.rejected,
+        }
+
+
+settlement_queue = SettlementQueue(SETTLEMENT_WORKERS, SETTLEMENT_QUEUE_SIZE)
+metrics_sampler.track(SETTLEMENT_QUEUE_DEPTH, lambda: settlement_queue.depth)
@@ -0,0 +1,132 @@
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, event, func, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .models import Payment, PaymentStatsHourly
+
+# Payment counters are kept per (merchant, hour of created_at, status, method).
+# Every flush that inserts a payment or changes its status moves the counts
+# between buckets in the same transaction, so GET /api/v1/stats reads a few
+# rollup rows instead of scanning payments.
+BUCKET = timedelta(hours=1)
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None: # SQLite hands back naive UTC datetimes; naive query params are read as UTC too
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def bucket_start(value: datetime) -> datetime:
+    return _as_utc(value).replace(minute=0, second=0, microsecond=0)
+
+
+def bucket_end(value: datetime) -> datetime:
+    """First bucket boundary at or after `value`."""
+    value = _as_utc(value)
+    start = bucket_start(value)
+    return start if start == value else start + BUCKET
+
+
+def _upsert(dialect_name: str):
+    table = PaymentStatsHourly.__table__
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=["merchant_id", "bucket", "status", "method"],
+        set_={
+            "count": table.c.count + stmt.excluded.count,
+            "amount": table.c.amount + stmt.excluded.amount,
+        },
+    )
+
+
+def _add(deltas: dict, payment: Payment, status: str | None, sign: int):
+    created_at = payment.created_at or datetime.now(timezone.utc)
+    key = (payment.merchant_id, bucket_start(created_at), status or "created", payment.method)
+    count, amount = deltas.get(key, (0, 0))
+    deltas[key] = (count + sign, amount + sign * payment.amount)
+
+
+@event.listens_for(Session, "after_flush")
+def _roll_up_payment_changes(session, flush_context):
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, Payment):
+            _add(deltas, obj, obj.status, 1)
+    for obj in session.dirty:
+        if isinstance(obj, Payment):
+            history = inspect(obj).attrs.status.history
+            for old in history.deleted:
+                _add(deltas, obj, old, -1)
+            for new in history.added:
+                _add(deltas, obj, new, 1)
+
+    _apply(session, deltas)
+
+
+def record_status_change(session, payment: Payment, old_status: str, new_status: str):
+    """Move a payment between buckets after a Core UPDATE, which the flush listener does not see.
+
+    Takes a sync Session; from an AsyncSession use `await db.run_sync(record_status_change, ...)`.
+    """
+    deltas = {}
+    _add(deltas, payment, old_status, -1)
+    _add(deltas, payment, new_status, 1)
+    _apply(session, deltas)
+
+
+def _apply(session, deltas: dict):
+    rows = [
+        {"merchant_id": merchant_id, "bucket": bucket, "status": status, "method": method, "count": count, "amount": amount}
+        for (merchant_id, bucket, status, method), (count, amount) in sorted(deltas.items(), key=lambda item: str(item[0]))
+        if count or amount
+    ]
+    if rows:
+        # Sorted so concurrent transactions lock bucket rows in the same order
+        connection = session.connection()
+        connection.execute(_upsert(connection.dialect.name), rows)
+
+
+# --- Backfill ---
+def rebuild(db: Session):
+    """Recompute every rollup row from the payments table.
+
+    Needed once for payments written before the rollup existed. Run it while
+    nothing else is writing payments.
+    """
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        # Truncate in UTC whatever the session time zone is
+        bucket = func.timezone("UTC", func.date_trunc("hour", func.timezone("UTC", Payment.created_at)))
+    else:
+        bucket = func.strftime("%Y-%m-%d %H:00:00.000000", Payment.created_at) # Same text form as the ORM writes
+    source = select(
+        Payment.merchant_id, bucket, func.coalesce(Payment.status, "created"), Payment.method,
+        func.count(), func.sum(Payment.amount)
+    ).group_by(Payment.merchant_id, bucket, Payment.status, Payment.method)
+
+    table = PaymentStatsHourly.__table__
+    db.execute(delete(table))
+    db.execute(table.insert().from_select(["merchant_id", "bucket", "status", "method", "count", "amount"], source))
+    db.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Payment stats rollup maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+
+    from .bootstrap import run_startup_tasks
+    from .database import SessionLocal
+
+    run_startup_tasks()
+    db = SessionLocal()
+    try:
+        rebuild(db)
+        print("✅ Payment stats rebuilt")
+    finally:
+        db.close()
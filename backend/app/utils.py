@@ -1,5 +1,6 @@
 import re
 from datetime import datetime
+from .bins import bin_table
 
 # --- UPI Validation ---
 def validate_vpa(vpa: str) -> bool:
@@ -7,52 +8,37 @@ def validate_vpa(vpa: str) -> bool:
     pattern = r"^[a-zA-Z0-9._-]+@[a-zA-Z0-9]+$"
     return bool(re.match(pattern, vpa))
 
+# --- Card Number Cleaning ---
+_NON_DIGITS = re.compile(r"\D")
+
+def card_digits(card_number: str) -> str:
+    """Strip spaces/dashes once; the digit-only helpers below take the result."""
+    if card_number.isascii() and card_number.isdigit():
+        return card_number
+    return _NON_DIGITS.sub("", card_number)
+
 # --- Card Validation (Luhn Algorithm) ---
-def validate_luhn(card_number: str) -> bool:
-    # Remove spaces/dashes
-    clean_num = re.sub(r"\D", "", card_number)
-    
-    if not 13 <= len(clean_num) <= 19:
+# Each digit mapped to its doubled value, minus 9 when that goes over 9
+_LUHN_DOUBLED = str.maketrans("0123456789", "0246813579")
+
+def luhn_ok(digits: str) -> bool:
+    if not 13 <= len(digits) <= 19 or not digits.isascii() or not digits.isdigit():
         return False
-        
-    digits = [int(d) for d in clean_num]
-    checksum = 0
-    
-    # Process from right to left
-    # Double every second digit
-    for i in range(len(digits) - 2, -1, -2):
-        doubled = digits[i] * 2
-        if doubled > 9:
-            doubled -= 9
-        digits[i] = doubled
-        
-    checksum = sum(digits)
-    return checksum % 10 == 0
+    # From the right: odd positions as-is, every second digit doubled. Summing the
+    # ASCII bytes and subtracting ord("0") per digit avoids an int() per character.
+    weighted = (digits[-1::-2] + digits[-2::-2].translate(_LUHN_DOUBLED)).encode()
+    return (sum(weighted) - 48 * len(weighted)) % 10 == 0
+
+def validate_luhn(card_number: str) -> bool:
+    return luhn_ok(card_digits(card_number))
 
 # --- Card Network Detection ---
 def get_card_network(card_number: str) -> str:
-    clean_num = re.sub(r"\D", "", card_number)
-    
-    if clean_num.startswith("4"):
-        return "visa"
-    
-    # Mastercard: 51-55
-    if 51 <= int(clean_num[:2]) <= 55:
-        return "mastercard"
-    
-    # Amex: 34 or 37
-    if clean_num[:2] in ["34", "37"]:
-        return "amex"
-    
-    # RuPay: 60, 65, 81-89
-    prefix_2 = int(clean_num[:2])
-    if prefix_2 in [60, 65] or (81 <= prefix_2 <= 89):
-        return "rupay"
-        
-    return "unknown"
+    # Longest-prefix match in the BIN table (app/data/bin_ranges.csv)
+    return bin_table.lookup(card_digits(card_number)).network
 
 # --- Expiry Validation ---
-def validate_expiry(month: str, year: str) -> bool:
+def validate_expiry(month: str, year: str, now: datetime | None = None) -> bool:
     try:
         m = int(month)
         y = int(year)
@@ -65,7 +51,7 @@ def validate_expiry(month: str, year: str) -> bool:
         if y < 100:
             y += 2000
             
-        current_date = datetime.now()
+        current_date = now or datetime.now()
         current_y = current_date.year
         current_m = current_date.month
         
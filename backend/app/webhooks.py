@@ -0,0 +1,343 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from sqlalchemy import JSON, insert, literal, select, update
+
+from .database import AsyncSessionLocal
+from .ids import new_id
+from .metrics import WEBHOOK_LAG, metrics_sampler
+from .models import Merchant, Payment, WebhookEvent
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "32"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "1"))
+WEBHOOK_MERCHANT_CONCURRENCY = int(os.getenv("WEBHOOK_MERCHANT_CONCURRENCY", "4"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_BACKOFF_BASE = float(os.getenv("WEBHOOK_BACKOFF_BASE", "10"))
+WEBHOOK_BACKOFF_MAX = float(os.getenv("WEBHOOK_BACKOFF_MAX", "3600"))
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+# Claimed events are hidden from other dispatchers for this long
+WEBHOOK_LEASE = float(os.getenv("WEBHOOK_LEASE", "120"))
+# Claimed events one merchant may hold, per delivery slot (WEBHOOK_MERCHANT_CONCURRENCY)
+_CLAIMED_PER_SLOT = 4
+
+
+# --- Outbox ---
+def payment_event_payload(payment: Payment) -> dict:
+    return {
+        "payment": {
+            "id": payment.id,
+            "order_id": payment.order_id,
+            "amount": payment.amount,
+            "currency": payment.currency,
+            "method": payment.method,
+            "status": payment.status,
+            "vpa": payment.vpa,
+            "card_network": payment.card_network,
+            "card_last4": payment.card_last4,
+            "error_code": payment.error_code,
+            "error_description": payment.error_description,
+        }
+    }
+
+
+async def enqueue_payment_webhook(db, payment: Payment):
+    """Add a payment.<status> event to the outbox in `db`'s transaction.
+
+    Single INSERT ... SELECT: no row is written when the merchant has no webhook_url.
+    """
+    event_type = f"payment.{payment.status}"
+    source = select(
+        literal(new_id("evt")), Merchant.id, literal(event_type),
+        literal(payment_event_payload(payment), JSON()), literal("pending"), literal(0),
+        literal(datetime.now(timezone.utc))
+    ).where(Merchant.id == payment.merchant_id, Merchant.webhook_url.is_not(None))
+    await db.execute(insert(WebhookEvent).from_select(
+        ["id", "merchant_id", "event_type", "payload", "status", "attempts", "next_attempt_at"], source
+    ))
+
+
+def sign(secret: str, timestamp: str, body: bytes) -> str:
+    """HMAC-SHA256 over "<timestamp>.<body>", hex encoded."""
+    return hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+
+
+def valid_webhook_url(url: str | None) -> bool:
+    """An absolute http(s) URL with a host; anything else can never be delivered."""
+    try:
+        parsed = httpx.URL(url)
+    except (httpx.InvalidURL, TypeError):
+        return False
+    return parsed.scheme in ("http", "https") and bool(parsed.host)
+
+
+def backoff(attempts: int) -> float:
+    # Exponential with full jitter, capped
+    return random.uniform(0, min(WEBHOOK_BACKOFF_MAX, WEBHOOK_BACKOFF_BASE * 2 ** (attempts - 1)))
+
+
+@dataclass
+class Delivery:
+    id: str
+    merchant_id: object
+    event_type: str
+    payload: dict
+    attempts: int
+    created_at: datetime | None
+    url: str
+    secret: str
+
+
+# --- Dispatcher ---
+class WebhookDispatcher:
+    """Claims due outbox rows in batches and delivers them with a worker pool.
+
+    Claims use FOR UPDATE SKIP LOCKED plus a lease, so several processes can
+    dispatch from the same table. Results are written back in batches.
+
+    Workers only ever take deliveries whose merchant is below
+    WEBHOOK_MERCHANT_CONCURRENCY, so a slow endpoint cannot tie up workers
+    that other merchants' events are waiting for; a merchant's extra events
+    wait in its own queue. A claim only leases what each merchant has room
+    for (_CLAIMED_PER_SLOT per slot), so one merchant's backlog cannot fill
+    the batch either; the rest stays due in the outbox and is claimed as
+    soon as that merchant has room again. Merchants are forgotten as soon as
+    they have nothing claimed.
+    """
+
+    def __init__(self):
+        self._ready: asyncio.Queue | None = None # deliveries a worker may start now
+        self._tasks: list[asyncio.Task] = []
+        self._client: httpx.AsyncClient | None = None
+        self._active: dict = {} # merchant_id -> deliveries in the ready queue or in flight
+        self._waiting: dict[object, deque] = {} # merchant_id -> deliveries over its concurrency
+        self._room = asyncio.Event() # a merchant freed half its claim limit
+        self._held_back = False # the last claim left due rows for lack of room
+        self._results: list[dict] = []
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.dead = 0
+        self.in_flight = 0
+        self.lag_seconds = 0.0
+
+    @property
+    def queued(self) -> int:
+        if self._ready is None:
+            return 0
+        return self._ready.qsize() + sum(len(waiting) for waiting in self._waiting.values())
+
+    async def start(self):
+        if self._ready is not None:
+            return
+        self._ready = asyncio.Queue()
+        limits = httpx.Limits(max_connections=WEBHOOK_WORKERS, max_keepalive_connections=WEBHOOK_WORKERS)
+        self._client = httpx.AsyncClient(timeout=WEBHOOK_TIMEOUT, limits=limits)
+        self._tasks = [asyncio.create_task(self._claim_forever())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(WEBHOOK_WORKERS)]
+
+    async def stop(self):
+        if self._ready is None:
+            return
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # Anything claimed but not delivered becomes due again when its lease runs out
+        await self._flush_results()
+        await self._client.aclose()
+        self._tasks, self._ready, self._client = [], None, None
+        self._active.clear()
+        self._waiting.clear()
+
+    def room(self, merchant_id) -> int:
+        """How many more claimed deliveries `merchant_id` may hold."""
+        claimed = self._active.get(merchant_id, 0) + len(self._waiting.get(merchant_id, ()))
+        return WEBHOOK_MERCHANT_CONCURRENCY * _CLAIMED_PER_SLOT - claimed
+
+    async def claim(self, limit: int) -> list[Delivery]:
+        now = datetime.now(timezone.utc)
+        full = [merchant_id for merchant_id in self._active if self.room(merchant_id) <= 0]
+        self._held_back = bool(full)
+        async with AsyncSessionLocal() as db:
+            query = (
+                select(WebhookEvent, Merchant.webhook_url, Merchant.api_secret)
+                .join(Merchant, Merchant.id == WebhookEvent.merchant_id)
+                .where(WebhookEvent.status == "pending", WebhookEvent.next_attempt_at <= now)
+                .order_by(WebhookEvent.next_attempt_at)
+                .limit(limit)
+                .with_for_update(of=WebhookEvent, skip_locked=True)
+            )
+            if full:
+                query = query.where(WebhookEvent.merchant_id.not_in(full))
+            rows = (await db.execute(query)).all()
+            if not rows:
+                self._held_back = False # nothing else is due for the full merchants either
+                return []
+            # Read before the lease UPDATE, which also rewrites the loaded objects
+            oldest_due = min(event.next_attempt_at for event, _, _ in rows)
+            # Lease only what each merchant has room for; the other rows are unlocked untouched
+            room = {}
+            leased = []
+            for event, url, secret in rows:
+                room.setdefault(event.merchant_id, self.room(event.merchant_id))
+                if room[event.merchant_id] > 0:
+                    room[event.merchant_id] -= 1
+                    leased.append((event, url, secret))
+            self._held_back = self._held_back or len(leased) < len(rows)
+            rows = leased
+            await db.execute(
+                update(WebhookEvent)
+                .where(WebhookEvent.id.in_([event.id for event, _, _ in rows]))
+                .values(next_attempt_at=now + timedelta(seconds=WEBHOOK_LEASE))
+            )
+            await db.commit()
+
+        if oldest_due.tzinfo is None: # SQLite hands back naive datetimes
+            oldest_due = oldest_due.replace(tzinfo=timezone.utc)
+        self.lag_seconds = max(0.0, (now - oldest_due).total_seconds())
+        return [
+            Delivery(event.id, event.merchant_id, event.event_type, event.payload, event.attempts, event.created_at, url, secret)
+            for event, url, secret in rows
+        ]
+
+    async def _claim_forever(self):
+        while True:
+            try:
+                await self._flush_results()
+                self._room.clear()
+                free = WEBHOOK_BATCH_SIZE - self.queued
+                batch = await self.claim(free) if free > 0 else []
+                for delivery in batch:
+                    self._schedule(delivery)
+                if len(batch) < WEBHOOK_BATCH_SIZE // 2:
+                    if not batch and not self._held_back:
+                        self.lag_seconds = 0.0
+                    await self._idle()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Webhook claim failed: {e}")
+                await asyncio.sleep(WEBHOOK_POLL_INTERVAL)
+
+    async def _idle(self):
+        if not self._held_back:
+            await asyncio.sleep(WEBHOOK_POLL_INTERVAL)
+            return
+        # Due rows were left for merchants at their limit: go again once one has room
+        try:
+            await asyncio.wait_for(self._room.wait(), WEBHOOK_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+    def _schedule(self, delivery: Delivery):
+        merchant_id = delivery.merchant_id
+        if self._active.get(merchant_id, 0) < WEBHOOK_MERCHANT_CONCURRENCY:
+            self._active[merchant_id] = self._active.get(merchant_id, 0) + 1
+            self._ready.put_nowait(delivery)
+        else:
+            self._waiting.setdefault(merchant_id, deque()).append(delivery)
+
+    def _finished(self, merchant_id):
+        # Hand the merchant's slot to its next waiting delivery, or free it
+        waiting = self._waiting.get(merchant_id)
+        if waiting:
+            self._ready.put_nowait(waiting.popleft())
+            if not waiting:
+                del self._waiting[merchant_id]
+            return
+        self._active[merchant_id] -= 1
+        if not self._active[merchant_id]:
+            del self._active[merchant_id]
+        if self.room(merchant_id) * 2 >= WEBHOOK_MERCHANT_CONCURRENCY * _CLAIMED_PER_SLOT:
+            self._room.set()
+
+    async def _worker(self):
+        while True:
+            delivery = await self._ready.get()
+            self.in_flight += 1
+            try:
+                # Resolve self._results only after delivery: a flush may swap the list meanwhile
+                result = await self.deliver(delivery)
+            except Exception as e:
+                # Never let one delivery end the worker; count it as a failed attempt
+                print(f"❌ Webhook delivery {delivery.id} crashed: {e!r}")
+                result = self._failed(delivery, f"{type(e).__name__}: {e}")
+            finally:
+                self.in_flight -= 1
+                self._finished(delivery.merchant_id)
+            self._results.append(result)
+
+    async def deliver(self, delivery: Delivery) -> dict:
+        if not valid_webhook_url(delivery.url):
+            # Retrying cannot help until the merchant fixes the URL
+            return self._failed(delivery, f"Invalid webhook_url: {delivery.url!r}", final=True)
+        timestamp = str(int(time.time()))
+        body = json.dumps({
+            "id": delivery.id,
+            "event": delivery.event_type,
+            "created_at": delivery.created_at.isoformat() if delivery.created_at else None,
+            "data": delivery.payload,
+        }).encode()
+        headers = {
+            "Content-Type": "application/json",
+            "X-Webhook-Id": delivery.id,
+            "X-Webhook-Timestamp": timestamp,
+            "X-Webhook-Signature": sign(delivery.secret, timestamp, body),
+        }
+        try:
+            res = await self._client.post(delivery.url, content=body, headers=headers)
+        except Exception as e: # httpx.HTTPError, but also InvalidURL and anything unexpected
+            return self._failed(delivery, f"{type(e).__name__}: {e}")
+        if res.status_code < 300:
+            self.delivered += 1
+            return {"id": delivery.id, "status": "delivered", "attempts": delivery.attempts + 1,
+                    "delivered_at": datetime.now(timezone.utc), "last_error": None}
+        return self._failed(delivery, f"HTTP {res.status_code}")
+
+    def _failed(self, delivery: Delivery, error: str, final: bool = False) -> dict:
+        """Result row for a failed attempt: retried with backoff, or failed for good."""
+        attempts = delivery.attempts + 1
+        self.failed_attempts += 1
+        if final or attempts >= WEBHOOK_MAX_ATTEMPTS:
+            self.dead += 1
+            return {"id": delivery.id, "status": "failed", "attempts": attempts, "last_error": error}
+        next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=backoff(attempts))
+        return {"id": delivery.id, "status": "pending", "attempts": attempts,
+                "next_attempt_at": next_attempt_at, "last_error": error}
+
+    async def _flush_results(self):
+        if not self._results:
+            return
+        results, self._results = self._results, []
+        # Group by key set: each group is one executemany UPDATE by primary key
+        groups: dict[tuple, list[dict]] = {}
+        for row in results:
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+        async with AsyncSessionLocal() as db:
+            for rows in groups.values():
+                await db.execute(update(WebhookEvent), rows)
+            await db.commit()
+
+    def stats(self) -> dict:
+        return {
+            "workers": WEBHOOK_WORKERS,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "merchants": len(self._active),
+            "delivered": self.delivered,
+            "failed_attempts": self.failed_attempts,
+            "dead": self.dead,
+            "lag_seconds": round(self.lag_seconds, 3),
+        }
+
+
+webhook_dispatcher = WebhookDispatcher()
+metrics_sampler.track(WEBHOOK_LAG, lambda: webhook_dispatcher.lag_seconds)
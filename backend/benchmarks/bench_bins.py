@@ -0,0 +1,103 @@
+"""Card checks per second: the old regex/startswith helpers vs the BIN prefix index.
+
+    python -m benchmarks.bench_bins --count 200000 --batch 5000
+
+Times network lookup and Luhn over a mix of card numbers (with and without
+spaces), then sends one POST /api/v1/cards/validate/batch of --batch cards
+to a local server.
+"""
+import argparse
+import json
+import random
+import re
+import time
+import timeit
+
+import httpx
+
+from app.bins import bin_table
+from app.utils import card_digits, luhn_ok
+from benchmarks.common import API_HEADERS, start_server
+
+
+def legacy_luhn(card_number: str) -> bool:
+    clean_num = re.sub(r"\D", "", card_number)
+    if not 13 <= len(clean_num) <= 19:
+        return False
+    digits = [int(d) for d in clean_num]
+    for i in range(len(digits) - 2, -1, -2):
+        doubled = digits[i] * 2
+        if doubled > 9:
+            doubled -= 9
+        digits[i] = doubled
+    return sum(digits) % 10 == 0
+
+
+def legacy_network(card_number: str) -> str:
+    clean_num = re.sub(r"\D", "", card_number)
+    if clean_num.startswith("4"):
+        return "visa"
+    if 51 <= int(clean_num[:2]) <= 55:
+        return "mastercard"
+    if clean_num[:2] in ["34", "37"]:
+        return "amex"
+    prefix_2 = int(clean_num[:2])
+    if prefix_2 in [60, 65] or (81 <= prefix_2 <= 89):
+        return "rupay"
+    return "unknown"
+
+
+def sample_numbers(count: int) -> list[str]:
+    prefixes = ["4242", "4111", "5555", "5200", "2223", "3782", "3714", "6080", "6521", "8100", "9999"]
+    numbers = []
+    for _ in range(count):
+        number = random.choice(prefixes) + "".join(random.choices("0123456789", k=12))
+        if random.random() < 0.5: # as typed into a checkout form
+            number = " ".join(number[i:i + 4] for i in range(0, 16, 4))
+        numbers.append(number)
+    return numbers
+
+
+def per_second(fn, numbers: list[str]) -> int:
+    seconds = min(timeit.repeat(lambda: [fn(n) for n in numbers], number=1, repeat=3))
+    return round(len(numbers) / seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=5_000)
+    opts = parser.parse_args()
+
+    numbers = sample_numbers(opts.count)
+    results = {
+        "bin_prefixes_loaded": len(bin_table),
+        "network_lookups_per_sec": {
+            "legacy_get_card_network": per_second(legacy_network, numbers),
+            "bin_table_lookup": per_second(lambda n: bin_table.lookup(card_digits(n)), numbers),
+        },
+        "luhn_checks_per_sec": {
+            "legacy_validate_luhn": per_second(legacy_luhn, numbers),
+            "luhn_ok": per_second(lambda n: luhn_ok(card_digits(n)), numbers),
+        },
+        # Clean once, then Luhn + BIN on the same digits (what payment creation now does)
+        "full_card_checks_per_sec": {
+            "legacy": per_second(lambda n: (legacy_luhn(n), legacy_network(n)), numbers),
+            "current": per_second(lambda n: (luhn_ok(d := card_digits(n)), bin_table.lookup(d)), numbers),
+        },
+    }
+
+    cards = [{"number": n, "expiry_month": "12", "expiry_year": "2030"} for n in numbers[:opts.batch]]
+    with start_server() as base_url, httpx.Client(base_url=base_url, timeout=60) as client:
+        client.post("/api/v1/cards/validate/batch", json={"cards": cards[:10]}, headers=API_HEADERS).raise_for_status()
+        started = time.perf_counter()
+        res = client.post("/api/v1/cards/validate/batch", json={"cards": cards}, headers=API_HEADERS)
+        elapsed = time.perf_counter() - started
+        res.raise_for_status()
+        results["http_batch"] = {"cards": len(cards), "ms": round(elapsed * 1000, 1), "cards_per_sec": round(len(cards) / elapsed)}
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Hot checkout link: GET /api/v1/public/orders/{id} under concurrent load.
+
+    python -m benchmarks.bench_checkout --concurrency 100 --requests 20000 --orders 5
+
+Spreads --requests over a handful of orders (a flash-sale link shared widely)
+and reports throughput, latency and how many SQL statements the server ran,
+read from /metrics. With the checkout cache, statements stay at one or two per
+order, not one per request.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from .common import create_orders, database_url, percentiles, reset_sqlite, start_server
+
+
+def sql_statements(metrics_text: str) -> float:
+    return sum(
+        float(line.rsplit(" ", 1)[1])
+        for line in metrics_text.splitlines()
+        if line.startswith("db_statement_duration_seconds_count")
+    )
+
+
+async def drive(base_url: str, concurrency: int, total: int, orders: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency + 10)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        order_ids = await create_orders(client, orders)
+        before = sql_statements((await client.get("/metrics")).text)
+        latency, errors = [], 0
+        remaining = total
+
+        async def user():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                res = await client.get(f"/api/v1/public/orders/{order_ids[remaining % len(order_ids)]}")
+                if res.status_code == 200:
+                    latency.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        after = sql_statements((await client.get("/metrics")).text)
+        caches = (await client.get("/health/caches")).json()
+
+    return {
+        "requests_per_sec": round(len(latency) / elapsed, 2),
+        "errors": errors,
+        "latency": percentiles(latency),
+        "sql_statements": int(after - before),
+        "checkout_cache": caches["checkout_orders"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--orders", type=int, default=5)
+    parser.add_argument("--ttl", type=float, default=30, help="CHECKOUT_CACHE_TTL; 0 disables caching")
+    opts = parser.parse_args()
+
+    reset_sqlite(database_url())
+    with start_server({"CHECKOUT_CACHE_TTL": str(opts.ttl)}) as base_url:
+        result = asyncio.run(drive(base_url, opts.concurrency, opts.requests, opts.orders))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
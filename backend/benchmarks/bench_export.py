@@ -0,0 +1,81 @@
+"""Streaming export throughput and server memory on a large payments table (Postgres).
+
+    DATABASE_URL=postgresql+psycopg2://... python -m benchmarks.bench_export --rows 10000000
+
+Seeds with the bench_pagination seeder (skipped when the table is already that
+big), then downloads GET /api/v1/payments/export for the largest merchant in
+both formats and reports rows/s and the server's RSS before and after. For
+comparison it also pages through GET /api/v1/payments for --page-rows rows.
+"""
+import argparse
+import json
+import time
+
+import httpx
+from sqlalchemy import text
+
+from app.database import engine
+from benchmarks.bench_pagination import seed
+from benchmarks.common import server_process, rss_mb
+
+
+def largest_merchant() -> dict:
+    with engine.connect() as conn:
+        row = conn.execute(text(
+            "SELECT m.api_key, m.api_secret, count(*) FROM payments p JOIN merchants m ON m.id = p.merchant_id "
+            "GROUP BY m.id ORDER BY count(*) DESC LIMIT 1"
+        )).one()
+    return {"X-Api-Key": row[0], "X-Api-Secret": row[1]}
+
+
+def export(client: httpx.Client, headers: dict, fmt: str) -> dict:
+    started = time.perf_counter()
+    rows = size = 0
+    with client.stream("GET", "/api/v1/payments/export", params={"format": fmt}, headers=headers) as res:
+        res.raise_for_status()
+        for chunk in res.iter_bytes():
+            rows += chunk.count(b"\n")
+            size += len(chunk)
+    elapsed = time.perf_counter() - started
+    rows -= 1 if fmt == "csv" else 0 # header line
+    return {"rows": rows, "mb": round(size / 2**20, 1), "seconds": round(elapsed, 2), "rows_per_s": round(rows / elapsed)}
+
+
+def page_through(client: httpx.Client, headers: dict, limit_rows: int) -> dict:
+    started = time.perf_counter()
+    rows, cursor = 0, None
+    while rows < limit_rows:
+        params = {"limit": 100, **({"starting_after": cursor} if cursor else {})}
+        res = client.get("/api/v1/payments", params=params, headers=headers)
+        res.raise_for_status()
+        rows += len(res.json())
+        cursor = res.headers.get("X-Next-Cursor")
+        if res.headers.get("X-Has-More") != "true":
+            break
+    elapsed = time.perf_counter() - started
+    return {"rows": rows, "seconds": round(elapsed, 2), "rows_per_s": round(rows / elapsed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--merchants", type=int, default=10)
+    parser.add_argument("--page-rows", type=int, default=100_000)
+    opts = parser.parse_args()
+
+    seed(opts.rows, opts.merchants)
+    headers = largest_merchant()
+
+    results = {}
+    with server_process() as (base_url, proc), httpx.Client(base_url=base_url, timeout=None) as client:
+        client.get("/api/v1/payments", params={"limit": 1}, headers=headers).raise_for_status()
+        results["server_idle"] = rss_mb(proc.pid)
+        for fmt in ("csv", "ndjson"):
+            results[f"export_{fmt}"] = {**export(client, headers, fmt), **rss_mb(proc.pid)}
+        results["list_payments_paging"] = {**page_through(client, headers, opts.page_rows), **rss_mb(proc.pid)}
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
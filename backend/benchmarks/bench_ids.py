@@ -0,0 +1,38 @@
+"""IDs/sec: the old random.choices generator vs app.ids.new_id.
+
+    python -m benchmarks.bench_ids --count 1000000
+"""
+import argparse
+import json
+import random
+import string
+import timeit
+
+from app.ids import new_id
+
+
+def legacy_id(prefix: str) -> str:
+    chars = string.ascii_letters + string.digits
+    return f"{prefix}_{''.join(random.choices(chars, k=16))}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1_000_000)
+    opts = parser.parse_args()
+
+    results = {}
+    for name, fn in (("legacy_random_choices", legacy_id), ("time_ordered_csprng", new_id)):
+        seconds = min(timeit.repeat(lambda: fn("pay"), number=opts.count, repeat=3))
+        results[name] = {"ids_per_sec": round(opts.count / seconds), "ns_per_id": round(seconds / opts.count * 1e9, 1)}
+
+    # Share of consecutive IDs whose time prefix never goes backwards (B-tree right-edge inserts)
+    sample = [new_id("pay")[4:12] for _ in range(100_000)]
+    results["time_ordered_csprng"]["ordered_fraction"] = round(
+        sum(a <= b for a, b in zip(sample, sample[1:])) / (len(sample) - 1), 4
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
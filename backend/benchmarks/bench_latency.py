@@ -0,0 +1,76 @@
+"""p50/p99 latency of create_payment under concurrent load.
+
+    python -m benchmarks.bench_latency --concurrency 200 --requests 5000
+
+A second client probes GET / while the payments are in flight: when DB calls
+block the event loop, probe latency climbs with payment concurrency. Run it on
+two checkouts (e.g. before/after a change) and compare the JSON output.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from .common import API_HEADERS, UPI_PAYMENT, create_orders, database_url, percentiles, reset_sqlite, start_server
+
+
+async def drive(base_url: str, concurrency: int, total: int, orders: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency + 10)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        order_ids = await create_orders(client, orders)
+        payment_latency, probe_latency, errors = [], [], 0
+        remaining = total
+        done = asyncio.Event()
+
+        async def user():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                body = {"order_id": order_ids[remaining % len(order_ids)], **UPI_PAYMENT}
+                started = time.perf_counter()
+                res = await client.post("/api/v1/payments", json=body, headers=API_HEADERS)
+                if res.status_code == 201:
+                    payment_latency.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/")
+                probe_latency.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        started = time.perf_counter()
+        prober = asyncio.create_task(probe())
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await prober
+
+    return {
+        "payments_per_sec": round(len(payment_latency) / elapsed, 2),
+        "errors": errors,
+        "create_payment": percentiles(payment_latency),
+        "probe": percentiles(probe_latency),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--delay-ms", type=int, default=100, help="simulated bank delay (TEST_PROCESSING_DELAY)")
+    parser.add_argument("--orders", type=int, default=50)
+    opts = parser.parse_args()
+
+    reset_sqlite(database_url())
+    with start_server({"TEST_PROCESSING_DELAY": str(opts.delay_ms)}) as base_url:
+        result = asyncio.run(drive(base_url, opts.concurrency, opts.requests, opts.orders))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Mixed API load test with saved results and a regression gate.
+
+    python -m benchmarks.bench_load --merchants 10 --orders 2000 --concurrency 50 \\
+        --requests 20000 --mix create_order=20,create_payment=30,get_payment=30,list_payments=20 \\
+        --out baseline.json
+    python -m benchmarks.bench_load ... --out current.json --compare baseline.json --threshold 10
+    python -m benchmarks.bench_load --current current.json --compare baseline.json
+
+Recreates the schema in DATABASE_URL (a throwaway SQLite file by default; use a
+scratch Postgres database for real numbers), seeds --merchants merchants with
+--orders orders and one payment each, then boots app.main:app with
+TEST_MODE=true and TEST_PROCESSING_DELAY=0. --concurrency clients each pick
+operations from --mix (weights) until --requests have been sent. The first
+--warmup requests are not measured.
+
+Reports throughput and p50/p95/p99 per operation. With --compare, exits 1 when
+any operation's throughput falls, or its p95/p99 rises, by more than
+--threshold percent against the baseline file, when its error rate rises by
+more than --threshold percentage points, or when it no longer succeeds at all.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from .common import BACKEND_DIR, DEFAULT_DATABASE_URL, UPI_PAYMENT, drop_schema, percentiles, reset_sqlite, start_server
+
+OPERATIONS = ("create_order", "create_payment", "get_payment", "list_payments")
+DEFAULT_MIX = "create_order=20,create_payment=30,get_payment=30,list_payments=20"
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}, expected one of {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def merchant_headers(i: int) -> dict:
+    return {"X-Api-Key": f"key_load_{i}", "X-Api-Secret": f"secret_load_{i}"}
+
+
+# --- Seeding ---
+def seed(merchants: int, orders: int) -> list[dict]:
+    """Fresh schema with `merchants` merchants, `orders` orders and a payment per order.
+
+    Returns per merchant: its index, order ids and payment ids.
+    """
+    from app import stats # noqa: F401 (keep the rollup consistent with the seeded payments)
+    from app.bootstrap import run_startup_tasks
+    from app.database import SessionLocal
+    from app.ids import new_order_id, new_payment_id
+    from app.models import Merchant, Order, Payment
+
+    drop_schema()
+    run_startup_tasks()
+    seeded = []
+    db = SessionLocal()
+    try:
+        for i in range(merchants):
+            merchant = Merchant(
+                name=f"Load {i}", email=f"load{i}@example.com",
+                api_key=f"key_load_{i}", api_secret=f"secret_load_{i}", is_active=True
+            )
+            db.add(merchant)
+            db.flush()
+            seeded.append({"index": i, "id": merchant.id, "orders": [], "payments": []})
+
+        now = datetime.now(timezone.utc)
+        for n in range(orders):
+            owner = seeded[n % merchants]
+            order = Order(id=new_order_id(), merchant_id=owner["id"], amount=50000, currency="INR", status="created")
+            payment = Payment(
+                id=new_payment_id(), order_id=order.id, merchant_id=owner["id"], amount=50000, currency="INR",
+                method="upi", status="success", vpa=UPI_PAYMENT["vpa"], created_at=now
+            )
+            db.add_all([order, payment])
+            owner["orders"].append(order.id)
+            owner["payments"].append(payment.id)
+            if n % 1000 == 999:
+                db.flush()
+        db.commit()
+    finally:
+        db.close()
+    return seeded
+
+
+# --- Load ---
+async def drive(base_url: str, seeded: list[dict], mix: dict, concurrency: int, total: int, warmup: int, rng: random.Random) -> dict:
+    names, weights = list(mix), list(mix.values())
+    latency = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    sent = 0
+    measure_from = None
+
+    async def run_one(client: httpx.AsyncClient, name: str, merchant: dict) -> bool:
+        headers = merchant_headers(merchant["index"])
+        if name == "create_order":
+            res = await client.post("/api/v1/orders", json={"amount": 50000, "receipt": "load"}, headers=headers)
+            if res.status_code == 201:
+                merchant["orders"].append(res.json()["id"])
+            return res.status_code == 201
+        if name == "create_payment":
+            body = {"order_id": rng.choice(merchant["orders"]), **UPI_PAYMENT}
+            res = await client.post("/api/v1/payments", json=body, headers=headers)
+            if res.status_code == 201:
+                merchant["payments"].append(res.json()["id"])
+            return res.status_code == 201
+        if name == "get_payment":
+            res = await client.get(f"/api/v1/payments/{rng.choice(merchant['payments'])}", headers=headers)
+            return res.status_code == 200
+        res = await client.get("/api/v1/payments", params={"limit": 20}, headers=headers)
+        return res.status_code == 200
+
+    async def user(client: httpx.AsyncClient):
+        nonlocal sent, measure_from
+        while sent < total + warmup:
+            sent += 1
+            measured = sent > warmup
+            if measured and measure_from is None:
+                measure_from = time.perf_counter()
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            ok = await run_one(client, name, rng.choice(seeded))
+            if not measured:
+                continue
+            if ok:
+                latency[name].append(time.perf_counter() - started)
+            else:
+                errors[name] += 1
+
+    limits = httpx.Limits(max_connections=concurrency + 10)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        await asyncio.gather(*(user(client) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - measure_from
+
+    operations = {
+        name: {"requests_per_sec": round(len(latency[name]) / elapsed, 2), "errors": errors[name], **percentiles(latency[name])}
+        for name in names
+    }
+    completed = sum(len(samples) for samples in latency.values())
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "requests_per_sec": round(completed / elapsed, 2),
+        "errors": sum(errors.values()),
+        "operations": operations,
+    }
+
+
+# --- Comparison ---
+def error_rate(operation: dict) -> float:
+    """Failed requests as a percentage of all measured requests."""
+    attempts = operation["count"] + operation["errors"]
+    return operation["errors"] / attempts * 100 if attempts else 0.0
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Regressions beyond `threshold` percent (error rate: percentage points), one line each."""
+    regressions = []
+    for name, now in current["operations"].items():
+        before = baseline.get("operations", {}).get(name)
+        if not before:
+            continue
+        if before["count"] and not now["count"]:
+            regressions.append(f"{name}: no successful requests ({now['errors']} errors, baseline {before['count']} ok)")
+            continue
+        rise = error_rate(now) - error_rate(before)
+        if rise > threshold:
+            regressions.append(f"{name}.error_rate: {error_rate(before):.1f}% -> {error_rate(now):.1f}% ({rise:+.1f} points)")
+        if not now["count"] or not before["count"]:
+            continue
+        checks = [("requests_per_sec", -1), ("p95_ms", 1), ("p99_ms", 1)] # -1: lower is worse
+        for metric, direction in checks:
+            change = (now[metric] - before[metric]) / before[metric] * 100 * direction
+            if change > threshold:
+                regressions.append(f"{name}.{metric}: {before[metric]} -> {now[metric]} ({change:+.1f}% worse)")
+    return regressions
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--merchants", type=int, default=10)
+    parser.add_argument("--orders", type=int, default=2000, help="seeded orders (each with one payment)")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=20_000, help="measured requests")
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for the operation sequence")
+    parser.add_argument("--out", help="write the results JSON here")
+    parser.add_argument("--compare", metavar="BASELINE", help="results JSON to compare against")
+    parser.add_argument("--current", help="compare this saved results JSON instead of running")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+    opts = parser.parse_args()
+
+    if opts.current:
+        with open(opts.current) as f:
+            result = json.load(f)
+    else:
+        os.environ.setdefault("DATABASE_URL", DEFAULT_DATABASE_URL)
+        reset_sqlite(os.environ["DATABASE_URL"])
+        seeded = seed(opts.merchants, opts.orders)
+        with start_server(workers=opts.workers) as base_url:
+            run = asyncio.run(drive(
+                base_url, seeded, opts.mix, opts.concurrency, opts.requests, opts.warmup, random.Random(opts.seed)
+            ))
+        result = {
+            "config": {
+                "database": os.environ["DATABASE_URL"].partition(":")[0],
+                "merchants": opts.merchants, "orders": opts.orders, "concurrency": opts.concurrency,
+                "requests": opts.requests, "warmup": opts.warmup, "mix": opts.mix, "workers": opts.workers,
+            },
+            "environment": {
+                "commit": git_commit(), "python": platform.python_version(),
+                "machine": platform.machine(), "cpus": os.cpu_count(),
+                "at": datetime.now(timezone.utc).isoformat(),
+            },
+            **run,
+        }
+        if opts.out:
+            with open(opts.out, "w") as f:
+                json.dump(result, f, indent=2)
+
+    print(json.dumps(result, indent=2))
+    if opts.compare:
+        with open(opts.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, result, opts.threshold)
+        for line in regressions:
+            print(f"❌ {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"✅ No regression beyond {opts.threshold}% against {opts.compare}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Payment statuses/sec: GET /api/v1/payments/{id} per ID vs POST /api/v1/payments/lookup.
+
+    python -m benchmarks.bench_lookup --payments 20000 --batch-size 1000 --concurrency 8
+
+Seeds one merchant with --payments orders and a payment each (bench_load's
+seed, so it recreates the schema in DATABASE_URL), then resolves every
+payment ID both ways at --concurrency. It reports IDs/sec, the speed-up and
+the SQL statements the server ran per ID (from /metrics).
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+from .bench_load import merchant_headers, seed
+from .bench_statements import route_statements
+from .common import DEFAULT_DATABASE_URL, reset_sqlite, start_server
+
+LOOKUP_ROUTE = "/api/v1/payments/lookup"
+GET_ROUTE = "/api/v1/payments/{payment_id}"
+
+
+async def per_id(client: httpx.AsyncClient, ids: list[str], headers: dict, concurrency: int) -> float:
+    queue = list(ids)
+
+    async def user():
+        while queue:
+            res = await client.get(f"/api/v1/payments/{queue.pop()}", headers=headers)
+            res.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def batched(client: httpx.AsyncClient, ids: list[str], headers: dict, batch_size: int, concurrency: int) -> float:
+    batches = [ids[start:start + batch_size] for start in range(0, len(ids), batch_size)]
+
+    async def user():
+        while batches:
+            batch = batches.pop()
+            res = await client.post(LOOKUP_ROUTE, json={"payment_ids": batch}, headers=headers)
+            res.raise_for_status()
+            body = res.json()
+            assert len(body["payments"]) == len(batch) and not body["unknown_payment_ids"], "lookup lost IDs"
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def statements(client: httpx.AsyncClient, route: str) -> float:
+    return route_statements((await client.get("/metrics")).text, route)[0]
+
+
+async def drive(base_url: str, ids: list[str], opts) -> dict:
+    headers = merchant_headers(0)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        # Warm up auth caches and pools
+        await per_id(client, ids[:50], headers, opts.concurrency)
+        await batched(client, ids[:opts.batch_size], headers, opts.batch_size, 1)
+
+        before = await statements(client, GET_ROUTE)
+        per_id_s = await per_id(client, ids, headers, opts.concurrency)
+        per_id_statements = (await statements(client, GET_ROUTE) - before) / len(ids)
+
+        before = await statements(client, LOOKUP_ROUTE)
+        batch_s = await batched(client, ids, headers, opts.batch_size, opts.concurrency)
+        batch_statements = (await statements(client, LOOKUP_ROUTE) - before) / len(ids)
+    return {
+        "ids": len(ids),
+        "batch_size": opts.batch_size,
+        "per_id_ids_per_sec": round(len(ids) / per_id_s, 1),
+        "lookup_ids_per_sec": round(len(ids) / batch_s, 1),
+        "speedup": round(per_id_s / batch_s, 1),
+        "per_id_statements_per_id": round(per_id_statements, 3),
+        "lookup_statements_per_id": round(batch_statements, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=1000, help="IDs per lookup (at most PAYMENT_LOOKUP_MAX)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    opts = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", DEFAULT_DATABASE_URL) # seed() imports the app, which reads it
+    reset_sqlite(os.environ["DATABASE_URL"])
+    seeded = seed(1, opts.payments)
+    with start_server() as base_url:
+        print(json.dumps(asyncio.run(drive(base_url, seeded[0]["payments"], opts)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
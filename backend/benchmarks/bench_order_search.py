@@ -0,0 +1,174 @@
+"""Order search (GET /api/v1/orders filters) on a large dataset: latency and query plans (Postgres only).
+
+    DATABASE_URL=postgresql+psycopg2://... python -m benchmarks.bench_order_search --rows 10000000
+
+Seeds --rows orders over --months months for --merchants merchants into the
+real orders table (migrated schema, monthly partitions). Each order gets a
+per-merchant sequential receipt (rcpt_000012345) and notes
+{"customer_id": "cus_N", "channel": "web|app|pos"}; every customer belongs to
+one merchant and has ~100 orders. Seeding is skipped when the table already
+holds --rows rows; --reset recreates the schema first.
+
+Every case calls the list_orders route function itself, so the SQL is
+exactly what the API runs, for one merchant:
+  newest          first page, no filter
+  status          status=created
+  page_deep       a page starting from a cursor in the middle of the history
+  receipt_exact   receipt=<one receipt>
+  receipt_prefix  receipt_prefix=<receipt minus 2 digits> (100 matches)
+  notes_customer  notes={"customer_id": ...} (selective, GIN)
+  notes_channel   notes={"channel": "web"} (a third of all orders)
+It reports the median milliseconds per case (ms: the route, serialisation
+included; db_ms: Postgres' execution time from EXPLAIN ANALYZE) and prints
+each EXPLAIN (ANALYZE, BUFFERS) plan to stderr. --unindexed repeats the receipt/notes cases with
+the receipt and GIN indexes dropped (inside a rolled-back transaction), for
+comparison.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import Response
+from sqlalchemy import event, text
+
+from app.auth import MerchantSnapshot
+from app.bootstrap import run_startup_tasks
+from app.database import SessionLocal, engine
+from app.models import Merchant
+from app.pagination import encode_cursor
+from app.partitions import ensure_partitions
+from app.routers.orders import list_orders
+
+from .common import drop_schema
+
+SEED_CHUNK = 1_000_000
+CUSTOMERS_PER_MERCHANT = 1000
+SEARCH_INDEXES = ("ix_orders_merchant_receipt", "ix_orders_notes")
+
+
+# --- Data ---
+def merchant_id(i: int) -> uuid.UUID:
+    return uuid.UUID(int=i + 1)
+
+
+def receipt(g: int, merchants: int) -> str:
+    return f"rcpt_{g // merchants:09d}"
+
+
+def seed(rows: int, months: int, merchants: int, reset: bool):
+    if reset:
+        drop_schema()
+    run_startup_tasks()
+    with engine.begin() as conn:
+        ensure_partitions(conn, since=datetime.now(timezone.utc) - timedelta(days=31 * months))
+        for i in range(merchants):
+            conn.execute(text(
+                "INSERT INTO merchants (id, name, email, api_key, api_secret, is_active) "
+                "VALUES (:id, :name, :email, :key, 'secret', true) ON CONFLICT DO NOTHING"
+            ), {"id": merchant_id(i), "name": f"Search {i}", "email": f"search{i}@example.com", "key": f"key_search_{i}"})
+        have = conn.execute(text("SELECT count(*) FROM orders WHERE id LIKE 'order_s%'")).scalar()
+    ids = [str(merchant_id(i)) for i in range(merchants)]
+    # Oldest first, like real traffic; receipts count up per merchant
+    for start in range(have + 1, rows + 1, SEED_CHUNK):
+        end = min(start + SEED_CHUNK - 1, rows)
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO orders (id, merchant_id, amount, currency, receipt, notes, status, created_at, updated_at)
+                SELECT 'order_s' || lpad(to_hex(g), 15, '0'), (:merchants)[1 + g % :merchant_count]::uuid, 50000, 'INR',
+                       'rcpt_' || lpad((g / :merchant_count)::text, 9, '0'),
+                       jsonb_build_object('customer_id', 'cus_' || (g % :customers), 'channel', (ARRAY['web', 'app', 'pos'])[1 + g % 3]),
+                       'created', t, t
+                FROM generate_series(:start, :end) AS g,
+                     LATERAL (SELECT now() - (:span)::interval * (1 - g::float8 / :rows) AS t) ts
+            """), {"merchants": ids, "merchant_count": merchants, "customers": merchants * CUSTOMERS_PER_MERCHANT,
+                   "start": start, "end": end, "rows": rows, "span": f"{months} months"})
+        print(f"🌱 orders: {end}/{rows} rows", file=sys.stderr)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE orders"))
+
+
+# --- Measurements ---
+class LastStatement:
+    """Remembers the last SQL the engine ran, to EXPLAIN it afterwards."""
+
+    def __init__(self):
+        self.statement, self.parameters = None, None
+        event.listen(engine, "before_cursor_execute", self.capture)
+
+    def capture(self, conn, cursor, statement, parameters, context, executemany):
+        self.statement, self.parameters = statement, parameters
+
+
+def cases(rows: int, merchants: int) -> dict[str, dict]:
+    middle = rows // 2 // merchants * merchants # an order of merchant 0
+    with engine.connect() as conn:
+        created_at = conn.execute(
+            text("SELECT created_at FROM orders WHERE id = :id"), {"id": f"order_s{middle:015x}"}
+        ).scalar()
+    return {
+        "newest": {},
+        "status": {"status": "created"},
+        "page_deep": {"starting_after": encode_cursor(created_at, f"order_s{middle:015x}")},
+        "receipt_exact": {"receipt": receipt(middle, merchants)},
+        "receipt_prefix": {"receipt_prefix": receipt(middle, merchants)[:-2]},
+        "notes_customer": {"notes": json.dumps({"customer_id": f"cus_{middle % (merchants * CUSTOMERS_PER_MERCHANT)}"})},
+        "notes_channel": {"notes": json.dumps({"channel": "web"})},
+    }
+
+
+def run_case(db, merchant: MerchantSnapshot, params: dict) -> int:
+    args = {"limit": 100, "starting_after": None, "ending_before": None, "status": None, "receipt": None,
+            "receipt_prefix": None, "notes": None, "created_from": None, "created_to": None, **params}
+    return len(list_orders(response=Response(), merchant=merchant, db=db, **args))
+
+
+def measure(db, merchant: MerchantSnapshot, params: dict, repeat: int, last: LastStatement) -> tuple[dict, list[str]]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = run_case(db, merchant, params)
+        samples.append(time.perf_counter() - started)
+    plan = db.connection().exec_driver_sql(
+        "EXPLAIN (ANALYZE, BUFFERS, COSTS OFF) " + last.statement, last.parameters
+    ).scalars().all()
+    db_ms = float(plan[-1].split(":")[1].split()[0]) # "Execution Time: 1.234 ms"
+    return {"ms": round(statistics.median(samples) * 1000, 3), "db_ms": db_ms, "rows": count}, plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--months", type=int, default=12, help="history the orders are spread over")
+    parser.add_argument("--merchants", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20, help="runs per case (median reported)")
+    parser.add_argument("--unindexed", action="store_true", help="also time receipt/notes cases without their indexes")
+    parser.add_argument("--reset", action="store_true", help="recreate the schema and reseed")
+    opts = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        parser.error("needs a postgresql DATABASE_URL")
+    seed(opts.rows, opts.months, opts.merchants, opts.reset)
+    last = LastStatement()
+    results = {"indexed": {}}
+    with SessionLocal() as db:
+        merchant = MerchantSnapshot.from_model(db.get(Merchant, merchant_id(0)))
+        searches = cases(opts.rows, opts.merchants)
+        for name, params in searches.items():
+            results["indexed"][name], plan = measure(db, merchant, params, opts.repeat, last)
+            print(f"\n--- {name} {params}\n" + "\n".join(plan), file=sys.stderr)
+        if opts.unindexed:
+            results["unindexed"] = {}
+            db.execute(text(f"DROP INDEX {', '.join(SEARCH_INDEXES)}"))
+            for name in ("receipt_exact", "receipt_prefix", "notes_customer"):
+                results["unindexed"][name], plan = measure(db, merchant, searches[name], max(1, opts.repeat // 5), last)
+                print(f"\n--- {name} (unindexed)\n" + "\n".join(plan), file=sys.stderr)
+            db.rollback()
+    print(json.dumps({"rows": opts.rows, "months": opts.months, "merchants": opts.merchants, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Orders/sec: one POST per order vs POST /api/v1/orders/batch.
+
+    python -m benchmarks.bench_orders_batch --orders 5000 --batch-size 500 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from .common import API_HEADERS, database_url, reset_sqlite, start_server
+
+
+async def single(client: httpx.AsyncClient, total: int, concurrency: int) -> float:
+    remaining = total
+
+    async def user():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            res = await client.post("/api/v1/orders", json={"amount": 50000, "receipt": f"single_{remaining}"}, headers=API_HEADERS)
+            res.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def batched(client: httpx.AsyncClient, total: int, batch_size: int, concurrency: int) -> float:
+    batches = [
+        [{"amount": 50000, "receipt": f"batch_{i}"} for i in range(start, min(start + batch_size, total))]
+        for start in range(0, total, batch_size)
+    ]
+
+    async def user():
+        while batches:
+            res = await client.post("/api/v1/orders/batch", json={"orders": batches.pop()}, headers=API_HEADERS)
+            res.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def drive(base_url: str, opts) -> dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        single_s = await single(client, opts.orders, opts.concurrency)
+        batch_s = await batched(client, opts.orders, opts.batch_size, opts.concurrency)
+    return {
+        "orders": opts.orders,
+        "single_orders_per_sec": round(opts.orders / single_s, 1),
+        "batch_orders_per_sec": round(opts.orders / batch_s, 1),
+        "speedup": round(single_s / batch_s, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    opts = parser.parse_args()
+
+    reset_sqlite(database_url())
+    with start_server() as base_url:
+        print(json.dumps(asyncio.run(drive(base_url, opts)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Keyset vs OFFSET pagination cost on a large payments table (Postgres only).
+
+    DATABASE_URL=postgresql+psycopg2://... python -m benchmarks.bench_pagination --rows 10000000
+
+Seeds --rows payments spread over --merchants merchants (skipped when the table
+already holds that many), then times page 1 and page N for the merchant with
+the most rows using both the cursor query behind list_payments and the old
+OFFSET query.
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from app.bootstrap import run_startup_tasks
+from app.database import SessionLocal, engine
+from app.models import Payment
+from app.pagination import encode_cursor, keyset_page
+from app.partitions import ensure_partitions
+
+
+def seed(rows: int, merchants: int):
+    run_startup_tasks()
+    with engine.begin() as conn:
+        have = conn.execute(text("SELECT count(*) FROM payments")).scalar()
+        if have >= rows:
+            return
+        # Rows go back `rows` seconds; their months need partitions
+        ensure_partitions(conn, since=datetime.now(timezone.utc) - timedelta(seconds=rows))
+        merchant_ids = [uuid.uuid4() for _ in range(merchants)]
+        for i, mid in enumerate(merchant_ids):
+            conn.execute(text(
+                "INSERT INTO merchants (id, name, email, api_key, api_secret, is_active) "
+                "VALUES (:id, :name, :email, :key, 'secret', true)"
+            ), {"id": mid, "name": f"Bench {i}", "email": f"bench{i}_{mid.hex[:8]}@example.com", "key": f"key_bench_{mid.hex}"})
+            conn.execute(text(
+                "INSERT INTO orders (id, merchant_id, amount, currency, status) VALUES (:id, :mid, 50000, 'INR', 'created')"
+            ), {"id": f"order_bench{mid.hex[:11]}", "mid": mid})
+        conn.execute(text("""
+            INSERT INTO payments (id, order_id, merchant_id, amount, currency, method, status, created_at, updated_at)
+            SELECT 'pay_b' || lpad(to_hex(g), 15, '0'),
+                   'order_bench' || substr(replace(m.id::text, '-', ''), 1, 11),
+                   m.id, 50000, 'INR',
+                   CASE WHEN g % 3 = 0 THEN 'card' ELSE 'upi' END,
+                   CASE WHEN g % 10 = 0 THEN 'failed' ELSE 'success' END,
+                   now() - (g || ' seconds')::interval,
+                   now() - (g || ' seconds')::interval
+            FROM generate_series(1, :rows) AS g
+            JOIN LATERAL (SELECT id FROM merchants ORDER BY id OFFSET (g % :merchants) LIMIT 1) m ON true
+        """), {"rows": rows - have, "merchants": merchants})
+        conn.execute(text("ANALYZE payments"))
+
+
+def timed(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return round(best * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--merchants", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1_000, 10_000, 100_000, 500_000])
+    opts = parser.parse_args()
+
+    seed(opts.rows, opts.merchants)
+    db = SessionLocal()
+    try:
+        merchant_id = db.execute(text(
+            "SELECT merchant_id FROM payments GROUP BY merchant_id ORDER BY count(*) DESC LIMIT 1"
+        )).scalar()
+        base = db.query(Payment).filter(Payment.merchant_id == merchant_id)
+
+        results = []
+        for depth in opts.depths:
+            # Cursor a client would hold after paging down to `depth`
+            cursor = None
+            if depth:
+                row = base.order_by(Payment.created_at.desc(), Payment.id.desc()).offset(depth - 1).limit(1).first()
+                if row is None:
+                    break
+                cursor = encode_cursor(row.created_at, row.id)
+
+            keyset_ms = timed(lambda: keyset_page(base, Payment, opts.limit, starting_after=cursor))
+            offset_ms = timed(lambda: base.order_by(Payment.created_at.desc()).offset(depth).limit(opts.limit).all())
+            results.append({"depth": depth, "keyset_ms": keyset_ms, "offset_ms": offset_ms})
+    finally:
+        db.close()
+
+    print(json.dumps({"rows": opts.rows, "limit": opts.limit, "pages": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Monthly-partitioned vs plain payments table on a large dataset (Postgres only).
+
+    DATABASE_URL=postgresql+psycopg2://... python -m benchmarks.bench_partitions --rows 50000000 --months 24
+
+Builds two copies of the payments table side by side: bench_flat_payments
+(one heap, primary key on id, the old layout) and bench_part_payments
+(RANGE partitioned by month on created_at, primary key (id, created_at), the
+layout app.partitions maintains). Both get the indexes declared on Payment and
+the same --rows rows spread evenly over the last --months months. Seeding is
+skipped when both already hold --rows rows; --reset drops them first.
+
+Then it times, on each layout:
+  insert          single-row INSERT of a new payment (autocommit)
+  recent_page     newest page for a merchant, bounded to the last 7 days
+  recent_failed   failed payments in the last 24 hours
+  month_export    every row of last month (the export / reporting query shape)
+  unbounded_page  newest page with no created_at bound (touches every partition)
+  by_id           lookup by id only (probes every partition's primary key)
+  drop_month      removing the oldest month: DELETE vs DETACH + DROP (rolled back)
+and reports median milliseconds plus table and index sizes.
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from app.database import Base, engine
+from app.models import Payment
+from app.partitions import add_months, month_start, partition_name
+
+FLAT = "bench_flat_payments"
+PART = "bench_part_payments"
+SEED_CHUNK = 1_000_000
+
+
+# --- Schema and data ---
+def create_tables(conn, months: int):
+    Base.metadata.create_all(bind=conn, tables=[Payment.__table__])
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {FLAT} (LIKE payments INCLUDING DEFAULTS, PRIMARY KEY (id))"))
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {PART} (LIKE payments INCLUDING DEFAULTS, PRIMARY KEY (id, created_at)) "
+        "PARTITION BY RANGE (created_at)"
+    ))
+    first = add_months(month_start(datetime.now(timezone.utc)), -months)
+    month = first
+    while month <= add_months(first, months + 1):
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(PART, month)} PARTITION OF {PART} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        ))
+        month = add_months(month, 1)
+    for table in (FLAT, PART):
+        for index in Payment.__table__.indexes:
+            columns = ", ".join(column.name for column in index.columns)
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {table}_{index.name[3:]} ON {table} ({columns})"))
+
+
+def seed(rows: int, months: int, merchants: int, reset: bool):
+    with engine.begin() as conn:
+        if reset:
+            conn.execute(text(f"DROP TABLE IF EXISTS {FLAT}, {PART}"))
+        create_tables(conn, months)
+    merchant_ids = [str(uuid.UUID(int=i + 1)) for i in range(merchants)]
+    span = f"{months} months"
+    for table in (FLAT, PART):
+        with engine.begin() as conn:
+            have = conn.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+        # Oldest first, ids rising with created_at as new_payment_id produces them
+        for start in range(have + 1, rows + 1, SEED_CHUNK):
+            end = min(start + SEED_CHUNK - 1, rows)
+            with engine.begin() as conn:
+                conn.execute(text(f"""
+                    INSERT INTO {table} (id, order_id, merchant_id, amount, currency, method, status, created_at, updated_at)
+                    SELECT 'pay_' || lpad(to_hex(g), 16, '0'), 'order_' || lpad(to_hex(g), 16, '0'),
+                           (:merchants)[1 + g % :merchant_count]::uuid, 50000, 'INR',
+                           CASE WHEN g % 3 = 0 THEN 'card' ELSE 'upi' END,
+                           CASE WHEN g % 10 = 0 THEN 'failed' ELSE 'success' END,
+                           t, t
+                    FROM generate_series(:start, :end) AS g,
+                         LATERAL (SELECT now() - (:span)::interval * (1 - g::float8 / :rows) AS t) ts
+                """), {"merchants": merchant_ids, "merchant_count": merchants, "start": start, "end": end,
+                       "rows": rows, "span": span})
+            print(f"🌱 {table}: {end}/{rows} rows")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in (FLAT, PART):
+            conn.execute(text(f"VACUUM ANALYZE {table}"))
+    return merchant_ids
+
+
+# --- Measurements ---
+def median_ms(cursor, sql: str, params: dict, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        if cursor.description is not None:
+            cursor.fetchall()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 3)
+
+
+def queries(table: str) -> dict[str, str]:
+    # Bounds are bound parameters as the API sends them, so the planner can prune at plan time
+    page = f"SELECT * FROM {table} WHERE merchant_id = %(merchant)s"
+    order = "ORDER BY created_at DESC, id DESC LIMIT 100"
+    return {
+        "recent_page": f"{page} AND created_at >= %(week_ago)s {order}",
+        "recent_failed": f"SELECT count(*) FROM {table} WHERE status = 'failed' AND created_at >= %(day_ago)s",
+        "month_export": f"SELECT * FROM {table} WHERE created_at >= %(month_from)s AND created_at < %(month_to)s",
+        "unbounded_page": f"{page} {order}",
+        "by_id": f"SELECT * FROM {table} WHERE id = %(id)s",
+    }
+
+
+def measure(table: str, merchant: str, rows: int, months: int, repeat: int, inserts: int) -> dict:
+    now = datetime.now(timezone.utc)
+    this_month = month_start(now)
+    params = {
+        "merchant": merchant,
+        "week_ago": now - timedelta(days=7),
+        "day_ago": now - timedelta(days=1),
+        "month_from": add_months(this_month, -1),
+        "month_to": this_month,
+        "id": "pay_" + format(rows // 2, "016x"),
+    }
+    raw = engine.raw_connection()
+    try:
+        raw.autocommit = True
+        cursor = raw.cursor()
+        result = {name: median_ms(cursor, sql, params, repeat) for name, sql in queries(table).items()}
+
+        samples = []
+        for i in range(inserts):
+            started = time.perf_counter()
+            cursor.execute(
+                f"INSERT INTO {table} (id, order_id, merchant_id, amount, currency, method, status, created_at, updated_at) "
+                "VALUES (%s, %s, %s, 50000, 'INR', 'upi', 'success', now(), now())",
+                (f"pay_new{uuid.uuid4().hex[:16]}", "order_bench", merchant),
+            )
+            samples.append(time.perf_counter() - started)
+        result["insert"] = round(statistics.median(samples) * 1000, 3)
+        result["insert_p99"] = round(sorted(samples)[int(len(samples) * 0.99) - 1] * 1000, 3)
+        cursor.execute(f"DELETE FROM {table} WHERE id LIKE 'pay_new%'")
+
+        # Retention: remove the oldest month, then roll back to keep the dataset
+        oldest = add_months(this_month, -months)
+        raw.autocommit = False
+        started = time.perf_counter()
+        if table == PART:
+            name = partition_name(PART, oldest)
+            cursor.execute(f"ALTER TABLE {PART} DETACH PARTITION {name}")
+            cursor.execute(f"DROP TABLE {name}")
+        else:
+            cursor.execute(f"DELETE FROM {FLAT} WHERE created_at < %s", (add_months(oldest, 1),))
+        result["drop_month"] = round((time.perf_counter() - started) * 1000, 3)
+        raw.rollback()
+
+        cursor.execute(
+            "SELECT pg_total_relation_size(relid), pg_indexes_size(relid) FROM ("
+            "  SELECT %s::regclass AS relid UNION ALL SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass"
+            ") r", (table, table)
+        )
+        sizes = cursor.fetchall()
+        raw.rollback()
+        result["total_mb"] = round(sum(s[0] for s in sizes) / 2**20, 1)
+        result["index_mb"] = round(sum(s[1] for s in sizes) / 2**20, 1)
+    finally:
+        raw.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000_000)
+    parser.add_argument("--months", type=int, default=24, help="history the rows are spread over")
+    parser.add_argument("--merchants", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20, help="runs per query (median reported)")
+    parser.add_argument("--inserts", type=int, default=2000)
+    parser.add_argument("--reset", action="store_true", help="drop and rebuild both tables")
+    opts = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        parser.error("needs a postgresql DATABASE_URL")
+    merchants = seed(opts.rows, opts.months, opts.merchants, opts.reset)
+    layouts = {
+        name: measure(table, merchants[0], opts.rows, opts.months, opts.repeat, opts.inserts)
+        for name, table in (("plain", FLAT), ("partitioned", PART))
+    }
+    print(json.dumps({"rows": opts.rows, "months": opts.months, "ms": layouts}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
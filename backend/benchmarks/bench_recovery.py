@@ -0,0 +1,111 @@
+"""Crash recovery: SIGKILL the API mid-payment, then time the recovery sweepers.
+
+    python -m benchmarks.bench_recovery --payments 200 --sweepers 3
+
+1. Boots one server whose simulated bank takes --kill-delay ms, fires
+   --payments inline payments at it and SIGKILLs it once every one of them
+   is committed as "processing" and waiting on the bank.
+2. Boots --sweepers servers on the same database (RECOVERY_STALE_AFTER=
+   --stale-after, RECOVERY_BATCH_SIZE=--batch-size, bank delay --bank-delay ms)
+   and waits until no payment is left processing.
+It reports the seconds to recover everything (from the kill), each sweeper's
+outcomes from /health/recovery and the final statuses. already_settled counts
+payments two sweepers claimed at once; SKIP LOCKED keeps it at 0 on Postgres,
+while SQLite has no row locks and relies on the conditional finalize alone.
+The schema in DATABASE_URL is recreated.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import time
+
+import httpx
+
+from .common import API_HEADERS, UPI_PAYMENT, create_orders, database_url, drop_schema, reset_sqlite, server_process
+
+
+def status_counts() -> dict[str, int]:
+    from sqlalchemy import func, select
+
+    from app.database import engine
+    from app.models import Payment
+
+    with engine.connect() as conn:
+        return dict(conn.execute(select(Payment.status, func.count()).group_by(Payment.status)).all())
+
+
+def wait_for(condition, timeout: float, interval: float = 0.1) -> float:
+    started = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - started > timeout:
+            raise RuntimeError(f"condition not met within {timeout}s: {status_counts()}")
+        time.sleep(interval)
+    return time.perf_counter() - started
+
+
+async def strand_payments(base_url: str, count: int, proc) -> int:
+    """Start `count` payments, kill the server while they wait on the bank; returns how many were stranded."""
+    limits = httpx.Limits(max_connections=count) # every payment in flight at once
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        order_ids = await create_orders(client, count)
+        pending = [
+            asyncio.create_task(client.post("/api/v1/payments", json={"order_id": order_id, **UPI_PAYMENT}, headers=API_HEADERS))
+            for order_id in order_ids
+        ]
+        await asyncio.to_thread(wait_for, lambda: status_counts().get("processing", 0) == count, 60)
+        proc.kill()
+        proc.wait()
+        await asyncio.gather(*pending, return_exceptions=True) # all cut off mid-request
+    return status_counts().get("processing", 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=200)
+    parser.add_argument("--sweepers", type=int, default=3, help="server processes recovering concurrently")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--stale-after", type=float, default=2, help="seconds")
+    parser.add_argument("--kill-delay", type=int, default=60_000, help="bank delay (ms) while payments get stranded")
+    parser.add_argument("--bank-delay", type=int, default=100, help="bank delay (ms) during recovery")
+    parser.add_argument("--port", type=int, default=8765)
+    opts = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", database_url())
+    reset_sqlite(os.environ["DATABASE_URL"])
+    drop_schema()
+
+    env = {"TEST_PROCESSING_DELAY": str(opts.kill_delay), "RECOVERY_INTERVAL": "0", "PAYMENT_MAX_IN_FLIGHT": str(opts.payments)}
+    with server_process(env, port=opts.port) as (base_url, proc):
+        stranded = asyncio.run(strand_payments(base_url, opts.payments, proc))
+    killed_at = time.perf_counter()
+    print(f"💥 Killed the server with {stranded} payments processing")
+
+    env = {
+        "TEST_PROCESSING_DELAY": str(opts.bank_delay), "RECOVERY_INTERVAL": "0.5",
+        "RECOVERY_STALE_AFTER": str(opts.stale_after), "RECOVERY_BATCH_SIZE": str(opts.batch_size),
+    }
+    with contextlib.ExitStack() as stack:
+        urls = [stack.enter_context(server_process(env, port=opts.port + 1 + i))[0] for i in range(opts.sweepers)]
+        wait_for(lambda: status_counts().get("processing", 0) == 0, timeout=opts.stale_after + 120)
+        recovery_s = time.perf_counter() - killed_at
+        sweepers = [httpx.get(f"{url}/health/recovery").json() for url in urls]
+
+    outcomes = {}
+    for sweeper in sweepers:
+        for outcome, count in sweeper["recovered"].items():
+            outcomes[outcome] = outcomes.get(outcome, 0) + count
+    print(json.dumps({
+        "database": os.environ["DATABASE_URL"].partition(":")[0],
+        "stranded": stranded,
+        "sweepers": opts.sweepers,
+        "recovery_s": round(recovery_s, 3),
+        "outcomes": outcomes,
+        "per_sweeper": [{"recovered": s["recovered"], "errors": s["errors"]} for s in sweepers],
+        "statuses": status_counts(),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
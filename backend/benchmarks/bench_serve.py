@@ -0,0 +1,124 @@
+"""Cold start and throughput of `python -m app.serve` from 1 to N worker processes.
+
+    python -m benchmarks.bench_serve --workers 1,2,4,8 --requests 20000 --concurrency 32 --loaders 4
+
+For each worker count:
+  cold_start_s    exec to the first 200 from /health against an empty database
+                  (startup tasks included: migrations, partitions, seeding)
+  all_workers_s   exec until /health/pools has answered from every worker
+  warm_start_s    exec to the first 200 with the schema already at head
+                  (a restart or a scale-out)
+then it seeds --merchants merchants with --orders orders and drives
+bench_load's request mix from --loaders client processes. It reports
+requests/s, the speed-up over the first worker count, and the worst p50/p95/p99
+any loader saw. Set DB_CONNECTION_BUDGET to run the workers under a budget.
+
+Scaling is bounded by the host: keep workers + loaders within the CPU count,
+or put the load generator on another machine.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import httpx
+
+from .bench_load import DEFAULT_MIX, drive, parse_mix, seed
+from .common import DEFAULT_DATABASE_URL, drop_schema, server_process
+
+
+def serve_command(workers: int, port: int) -> list[str]:
+    return [
+        sys.executable, "-m", "app.serve", "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning",
+    ]
+
+
+def wait_for_workers(base_url: str, workers: int, timeout: float = 60) -> set[int]:
+    """Poll /health/pools on fresh connections until every worker pid has answered."""
+    pids = set()
+    deadline = time.perf_counter() + timeout
+    while len(pids) < workers and time.perf_counter() < deadline:
+        try:
+            pids.add(httpx.get(f"{base_url}/health/pools", timeout=1).json()["pid"])
+        except httpx.HTTPError:
+            time.sleep(0.02)
+    if len(pids) < workers:
+        raise RuntimeError(f"only {len(pids)} of {workers} workers answered within {timeout}s")
+    return pids
+
+
+def start_times(workers: int, port: int) -> dict:
+    drop_schema()
+    started = time.perf_counter()
+    with server_process(port=port, args=serve_command(workers, port)) as (base_url, _):
+        cold = time.perf_counter() - started
+        wait_for_workers(base_url, workers)
+        all_workers = time.perf_counter() - started
+    started = time.perf_counter()
+    with server_process(port=port, args=serve_command(workers, port)):
+        warm = time.perf_counter() - started
+    return {"cold_start_s": round(cold, 3), "all_workers_s": round(all_workers, 3), "warm_start_s": round(warm, 3)}
+
+
+def _load(args) -> dict:
+    base_url, seeded, mix, concurrency, total, warmup, rng_seed = args
+    return asyncio.run(drive(base_url, seeded, mix, concurrency, total, warmup, random.Random(rng_seed)))
+
+
+def throughput(workers: int, port: int, opts) -> dict:
+    seeded = seed(opts.merchants, opts.orders)
+    with server_process(port=port, args=serve_command(workers, port)) as (base_url, _):
+        wait_for_workers(base_url, workers)
+        jobs = [
+            (base_url, seeded, opts.mix, max(1, opts.concurrency // opts.loaders), opts.requests // opts.loaders,
+             opts.warmup // opts.loaders, opts.seed + i)
+            for i in range(opts.loaders)
+        ]
+        with multiprocessing.get_context("spawn").Pool(opts.loaders) as pool:
+            runs = pool.map(_load, jobs)
+    latencies = [op for run in runs for op in run["operations"].values() if op["count"]]
+    return {
+        "requests_per_sec": round(sum(run["requests_per_sec"] for run in runs), 2),
+        "errors": sum(run["errors"] for run in runs),
+        **{q: max(op[q] for op in latencies) for q in ("p50_ms", "p95_ms", "p99_ms")},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--merchants", type=int, default=10)
+    parser.add_argument("--orders", type=int, default=2000, help="seeded orders (each with one payment)")
+    parser.add_argument("--concurrency", type=int, default=32, help="in-flight requests over all loaders")
+    parser.add_argument("--requests", type=int, default=20_000, help="measured requests over all loaders")
+    parser.add_argument("--warmup", type=int, default=1000)
+    parser.add_argument("--loaders", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="load generator processes")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--port", type=int, default=8765)
+    opts = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", DEFAULT_DATABASE_URL)
+    results = {}
+    for workers in (int(n) for n in opts.workers.split(",")):
+        results[workers] = {**start_times(workers, opts.port), **throughput(workers, opts.port, opts)}
+        print(f"⏱️ {workers} worker(s): {results[workers]}", file=sys.stderr)
+    base = next(iter(results.values()))["requests_per_sec"]
+    for result in results.values():
+        result["speedup"] = round(result["requests_per_sec"] / base, 2) if base else None
+    print(json.dumps({
+        "database": os.environ["DATABASE_URL"].partition(":")[0],
+        "cpus": os.cpu_count(),
+        "connection_budget": int(os.getenv("DB_CONNECTION_BUDGET", "0")) or None,
+        "loaders": opts.loaders,
+        "workers": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Sustained payments/sec: inline bank simulation vs the async settlement pool.
+
+    python -m benchmarks.bench_settlement --duration 20 --concurrency 50 --delay-ms 1000
+
+Each mode gets a fresh server. "accepted/s" counts 201 responses, "settled/s"
+counts payments that reached success/failed within the run plus the drain.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from .common import API_HEADERS, UPI_PAYMENT, create_orders, database_url, percentiles, reset_sqlite, start_server
+
+
+async def drive(base_url: str, duration: float, concurrency: int, orders: int) -> dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        order_ids = await create_orders(client, orders)
+        latencies, payment_ids, rejected, errors = [], [], 0, 0
+        deadline = time.perf_counter() + duration
+
+        async def user(n):
+            nonlocal rejected, errors
+            i = n
+            while time.perf_counter() < deadline:
+                body = {"order_id": order_ids[i % len(order_ids)], **UPI_PAYMENT}
+                started = time.perf_counter()
+                try:
+                    res = await client.post("/api/v1/payments", json=body, headers=API_HEADERS)
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if res.status_code == 201:
+                    payment_ids.append(res.json()["id"])
+                elif res.status_code == 503:
+                    rejected += 1
+                    await asyncio.sleep(float(res.headers.get("Retry-After", "1")))
+                else:
+                    errors += 1
+                i += concurrency
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        # Wait for the async pool to finish whatever it accepted
+        pending = set(payment_ids)
+        while pending and time.perf_counter() - started < duration * 4:
+            for pid in list(pending)[:200]:
+                res = await client.get(f"/api/v1/public/payments/{pid}")
+                if res.status_code == 200 and res.json()["status"] != "processing":
+                    pending.discard(pid)
+            if pending:
+                await asyncio.sleep(0.2)
+        settled_elapsed = time.perf_counter() - started
+
+    return {
+        "accepted": len(payment_ids),
+        "accepted_per_sec": round(len(payment_ids) / elapsed, 2),
+        "settled_per_sec": round((len(payment_ids) - len(pending)) / settled_elapsed, 2),
+        "unsettled": len(pending),
+        "rejected_503": rejected,
+        "errors": errors,
+        "post_latency": percentiles(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--delay-ms", type=int, default=1000, help="simulated bank delay (TEST_PROCESSING_DELAY)")
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=64, help="SETTLEMENT_WORKERS for async mode")
+    parser.add_argument("--queue-size", type=int, default=1000, help="SETTLEMENT_QUEUE_SIZE for async mode")
+    opts = parser.parse_args()
+
+    results = {}
+    for mode in ("inline", "async"):
+        reset_sqlite(database_url())
+        env = {
+            "PROCESSING_MODE": mode,
+            "TEST_PROCESSING_DELAY": str(opts.delay_ms),
+            "SETTLEMENT_WORKERS": str(opts.workers),
+            "SETTLEMENT_QUEUE_SIZE": str(opts.queue_size),
+        }
+        with start_server(env) as base_url:
+            results[mode] = asyncio.run(drive(base_url, opts.duration, opts.concurrency, opts.orders))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
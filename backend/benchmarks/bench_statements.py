@@ -0,0 +1,126 @@
+"""SQL statements per request on the write paths, checked against a budget.
+
+    python -m benchmarks.bench_statements --requests 50
+
+Sends --requests create_order and create_payment calls in each processing
+mode. It reads the per-route http_request_sql_statements histogram from
+/metrics and exits 1 if a path runs more statements than STATEMENT_BUDGET
+allows. Counts are cursor executions. COMMIT goes through the driver
+connection and adds one per transaction on top. In async mode the settlement
+worker's statements run outside any request, so they are counted from
+db_statement_duration_seconds.
+"""
+import argparse
+import asyncio
+import json
+import re
+import sys
+
+import httpx
+
+from .common import API_HEADERS, UPI_PAYMENT, create_orders, database_url, reset_sqlite, start_server
+
+# Statements per request (merchant auth served from cache)
+STATEMENT_BUDGET = {
+    "create_order": 1,              # INSERT ... RETURNING
+    "create_payment_inline": 6,     # order SELECT, INSERT ... RETURNING, rollup, UPDATE ... RETURNING, rollup, webhook outbox
+    "create_payment_async": 3,      # order SELECT, INSERT ... RETURNING, rollup
+    "settle_async": 3,              # UPDATE ... RETURNING, rollup, webhook outbox
+}
+PG_NOTIFY_STATEMENTS = 1 # payment status event on Postgres (SELECT pg_notify)
+
+
+def route_statements(metrics_text: str, route: str) -> tuple[float, float]:
+    """(sum, count) of http_request_sql_statements for one route."""
+    values = {}
+    for suffix in ("sum", "count"):
+        pattern = rf'^http_request_sql_statements_{suffix}{{route="{re.escape(route)}"}} (\S+)$'
+        match = re.search(pattern, metrics_text, re.MULTILINE)
+        values[suffix] = float(match.group(1)) if match else 0.0
+    return values["sum"], values["count"]
+
+
+def engine_statements(metrics_text: str) -> float:
+    return sum(
+        float(line.rsplit(" ", 1)[1])
+        for line in metrics_text.splitlines()
+        if line.startswith("db_statement_duration_seconds_count")
+    )
+
+
+def request_statements(metrics_text: str) -> float:
+    """Statements run inside any request, /metrics scrapes included."""
+    return sum(
+        float(line.rsplit(" ", 1)[1])
+        for line in metrics_text.splitlines()
+        if line.startswith("http_request_sql_statements_sum")
+    )
+
+
+async def measure(base_url: str, requests: int, queued: bool) -> dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        # Warm up auth caches and connection pools before counting
+        order_ids = await create_orders(client, 2)
+        for order_id in order_ids:
+            (await client.post("/api/v1/payments", json={"order_id": order_id, **UPI_PAYMENT}, headers=API_HEADERS)).raise_for_status()
+        await asyncio.sleep(0.5 if queued else 0)
+        before = (await client.get("/metrics")).text
+
+        order_ids = await create_orders(client, requests)
+        payment_ids = []
+        for order_id in order_ids:
+            res = await client.post("/api/v1/payments", json={"order_id": order_id, **UPI_PAYMENT}, headers=API_HEADERS)
+            res.raise_for_status()
+            payment_ids.append(res.json()["id"])
+        if queued:
+            # Wait for the worker pool to settle everything
+            for payment_id in payment_ids:
+                while (await client.get(f"/api/v1/payments/{payment_id}", headers=API_HEADERS)).json()["status"] == "processing":
+                    await asyncio.sleep(0.05)
+        after = (await client.get("/metrics")).text
+
+    result = {}
+    for name, route in (("create_order", "/api/v1/orders"), ("create_payment", "/api/v1/payments")):
+        sum_before, count_before = route_statements(before, route)
+        sum_after, count_after = route_statements(after, route)
+        result[name] = round((sum_after - sum_before) / (count_after - count_before), 2)
+    if queued:
+        # Whatever ran outside a request is the settlement worker
+        background = (engine_statements(after) - engine_statements(before)) - (request_statements(after) - request_statements(before))
+        result["settle"] = round(background / requests, 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    opts = parser.parse_args()
+
+    notify = PG_NOTIFY_STATEMENTS if database_url().startswith("postgresql") else 0
+    measured = {}
+    for mode in ("inline", "async"):
+        reset_sqlite(database_url())
+        # Webhook dispatcher polling and the metrics sampler's backlog count would be counted as settlement work
+        env = {"PROCESSING_MODE": mode, "WEBHOOK_POLL_INTERVAL": "3600", "METRICS_SAMPLE_INTERVAL": "3600"}
+        with start_server(env) as base_url:
+            measured[mode] = asyncio.run(measure(base_url, opts.requests, mode == "async"))
+
+    observed = {
+        "create_order": measured["inline"]["create_order"],
+        "create_payment_inline": measured["inline"]["create_payment"],
+        "create_payment_async": measured["async"]["create_payment"],
+        "settle_async": measured["async"]["settle"],
+    }
+    budget = {
+        name: limit + (notify if name in ("create_payment_inline", "settle_async") else 0)
+        for name, limit in STATEMENT_BUDGET.items()
+    }
+    # Rounded: the background figure picks up an occasional housekeeping query (webhook claim, sweeper)
+    over = {name: value for name, value in observed.items() if round(value) > budget[name]}
+    print(json.dumps({"statements_per_request": observed, "budget": budget, "over_budget": over}, indent=2))
+    if over:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""GET /api/v1/stats cost as the payments table grows (Postgres only).
+
+    DATABASE_URL=postgresql+psycopg2://... python -m benchmarks.bench_stats --rows 1000000 10000000
+
+For each size, empties the merchant/order/payment tables (use a scratch
+database), seeds them with the bench_pagination seeder, rebuilds the hourly
+rollups, then times the stats query for the largest merchant against the
+equivalent GROUP BY over payments.
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+from app.database import SessionLocal, engine
+from app.routers.stats import get_stats
+from app.stats import rebuild
+from benchmarks.bench_pagination import seed, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--merchants", type=int, default=10)
+    opts = parser.parse_args()
+
+    results = []
+    for rows in sorted(opts.rows):
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS payment_stats_hourly, webhook_events, payments, orders, merchants CASCADE"))
+        seed(rows, opts.merchants)
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            rebuild(db)
+            rebuild_s = round(time.perf_counter() - started, 2)
+            db.execute(text("ANALYZE payment_stats_hourly"))
+
+            merchant_id = db.execute(text(
+                "SELECT merchant_id FROM payment_stats_hourly GROUP BY merchant_id ORDER BY sum(count) DESC LIMIT 1"
+            )).scalar()
+            merchant = SimpleNamespace(id=merchant_id)
+            day_ago = datetime.now(timezone.utc) - timedelta(hours=24)
+            stats = get_stats(created_from=None, created_to=None, merchant=merchant, db=db)
+            naive = text("SELECT status, method, count(*), sum(amount) FROM payments WHERE merchant_id = :mid GROUP BY status, method")
+
+            results.append({
+                "payments": db.execute(text("SELECT count(*) FROM payments")).scalar(),
+                "merchant_payments": stats["count"],
+                "rollup_rows": db.execute(text("SELECT count(*) FROM payment_stats_hourly WHERE merchant_id = :mid"), {"mid": merchant_id}).scalar(),
+                "rebuild_s": rebuild_s,
+                "stats_all_time_ms": timed(lambda: get_stats(created_from=None, created_to=None, merchant=merchant, db=db)),
+                "stats_last_24h_ms": timed(lambda: get_stats(created_from=day_ago, created_to=None, merchant=merchant, db=db)),
+                "group_by_payments_ms": timed(lambda: db.execute(naive, {"mid": merchant_id}).all(), repeat=3),
+            })
+        finally:
+            db.close()
+        print(json.dumps(results[-1]))
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Webhook dispatcher throughput against a local stub HTTP receiver.
+
+    python -m benchmarks.bench_webhooks --events 10000 --fail-rate 0.05 --latency-ms 20 --merchant-concurrency 8
+
+Seeds the outbox directly, points the test merchant's webhook_url at an
+in-process keep-alive stub server (which checks every signature) and runs the
+dispatcher until the outbox is drained. Reports events/minute, attempts,
+bad signatures and the worst queue lag seen. All events belong to one merchant,
+so --merchant-concurrency bounds the delivery rate.
+
+--bad-url-events adds events for a second merchant whose webhook_url is
+malformed (http://[::1). They must end up failed after a single attempt
+without costing a worker; the run exits 1 otherwise.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select, update
+
+from app.database import AsyncSessionLocal
+from app.ids import new_id
+from app.bootstrap import run_startup_tasks
+from app.models import Merchant, WebhookEvent
+from app import webhooks
+
+TEST_MERCHANT_ID = uuid.UUID("550e8400-e29b-41d4-a716-446655440000")
+TEST_SECRET = "secret_test_xyz789"
+BAD_URL_MERCHANT_ID = uuid.UUID("550e8400-e29b-41d4-a716-446655440001")
+BAD_URL = "http://[::1"
+
+
+class StubReceiver:
+    """Minimal HTTP/1.1 keep-alive server that verifies webhook signatures."""
+
+    def __init__(self, fail_rate: float, latency: float):
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.received = 0
+        self.bad_signatures = 0
+        self.connections = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                headers = {}
+                for line in head.decode().split("\r\n")[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                self.received += 1
+                expected = webhooks.sign(TEST_SECRET, headers.get("x-webhook-timestamp", ""), body)
+                if headers.get("x-webhook-signature") != expected:
+                    self.bad_signatures += 1
+                await asyncio.sleep(self.latency)
+                status = "500 Internal Server Error" if random.random() < self.fail_rate else "200 OK"
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: keep-alive\r\n\r\n".encode())
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+
+async def seed_events(count: int, url: str, bad_url_count: int = 0):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Merchant).where(Merchant.id == TEST_MERCHANT_ID).values(webhook_url=url))
+        if bad_url_count and await db.get(Merchant, BAD_URL_MERCHANT_ID) is None:
+            db.add(Merchant(
+                id=BAD_URL_MERCHANT_ID, name="Bad URL Merchant", email="bad-url@example.com",
+                api_key="key_bench_bad_url", api_secret=TEST_SECRET, webhook_url=BAD_URL
+            ))
+            await db.flush()
+        now = datetime.now(timezone.utc)
+        owners = [TEST_MERCHANT_ID] * count + [BAD_URL_MERCHANT_ID] * bad_url_count
+        random.shuffle(owners)
+        rows = [{
+            "id": new_id("evt"), "merchant_id": merchant_id, "event_type": "payment.success",
+            "payload": {"payment": {"id": new_id("pay"), "amount": 50000, "status": "success"}},
+            "status": "pending", "attempts": 0, "next_attempt_at": now,
+        } for merchant_id in owners]
+        count = len(rows)
+        for start in range(0, count, 1000):
+            await db.execute(WebhookEvent.__table__.insert(), rows[start:start + 1000])
+        await db.commit()
+
+
+async def bad_url_outcomes() -> dict:
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(
+            select(WebhookEvent.status, WebhookEvent.attempts, func.count())
+            .where(WebhookEvent.merchant_id == BAD_URL_MERCHANT_ID)
+            .group_by(WebhookEvent.status, WebhookEvent.attempts)
+        )
+        return {f"{status}/{attempts}": n for status, attempts, n in rows}
+
+
+async def pending_count() -> int:
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(func.count()).select_from(WebhookEvent).where(WebhookEvent.status == "pending"))).scalar()
+
+
+async def run(opts) -> dict:
+    receiver = StubReceiver(opts.fail_rate, opts.latency_ms / 1000)
+    server = await asyncio.start_server(receiver.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    await seed_events(opts.events, f"http://127.0.0.1:{port}/webhooks", opts.bad_url_events)
+
+    # Retry quickly so failed attempts finish within the run
+    webhooks.WEBHOOK_BACKOFF_BASE = 0.05
+    webhooks.WEBHOOK_BACKOFF_MAX = 0.5
+    webhooks.WEBHOOK_POLL_INTERVAL = 0.05
+    webhooks.WEBHOOK_MERCHANT_CONCURRENCY = opts.merchant_concurrency
+    dispatcher = webhooks.WebhookDispatcher()
+    started = time.perf_counter()
+    await dispatcher.start()
+    max_lag = 0.0
+    while await pending_count():
+        max_lag = max(max_lag, dispatcher.lag_seconds)
+        await asyncio.sleep(0.2)
+    elapsed = time.perf_counter() - started
+    workers_alive = sum(not task.done() for task in dispatcher._tasks[1:])
+    await dispatcher.stop()
+    server.close()
+
+    return {
+        "events": opts.events,
+        "elapsed_s": round(elapsed, 2),
+        "events_per_minute": round(opts.events / elapsed * 60),
+        "http_attempts": receiver.received,
+        "keepalive_connections": receiver.connections,
+        "bad_signatures": receiver.bad_signatures,
+        "max_lag_s": round(max_lag, 3),
+        "workers_alive": workers_alive,
+        "bad_url_events": await bad_url_outcomes() if opts.bad_url_events else None, # "status/attempts": count
+        "dispatcher": dispatcher.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10_000)
+    parser.add_argument("--fail-rate", type=float, default=0.05)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--merchant-concurrency", type=int, default=webhooks.WEBHOOK_MERCHANT_CONCURRENCY)
+    parser.add_argument("--bad-url-events", type=int, default=0, help="events for a merchant with a malformed webhook_url")
+    opts = parser.parse_args()
+
+    run_startup_tasks()
+    result = asyncio.run(run(opts))
+    print(json.dumps(result, indent=2))
+    bad_url_ok = not opts.bad_url_events or result["bad_url_events"] == {"failed/1": opts.bad_url_events}
+    if result["workers_alive"] != webhooks.WEBHOOK_WORKERS or not bad_url_ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Shared helpers for the benchmark scripts.
+
+Run any benchmark from the backend directory, e.g.
+    python -m benchmarks.bench_settlement --help
+
+Servers are started as real uvicorn subprocesses against DATABASE_URL
+(defaults to a throwaway SQLite file; point it at Postgres for real numbers).
+"""
+import contextlib
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATABASE_URL = "sqlite:////tmp/gateway_bench.db"
+
+API_HEADERS = {
+    "X-Api-Key": "key_test_abc123",
+    "X-Api-Secret": "secret_test_xyz789",
+}
+
+UPI_PAYMENT = {"method": "upi", "vpa": "bench@upi"}
+
+
+def database_url() -> str:
+    return os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL)
+
+
+def reset_sqlite(url: str):
+    """Drop the SQLite stand-in between runs so each one starts empty."""
+    if url.startswith("sqlite:///"):
+        path = url[len("sqlite:///"):]
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def drop_schema():
+    """Drop every app table in DATABASE_URL, migration history included, so the next boot migrates from empty."""
+    from sqlalchemy import text
+
+    from app.database import Base, engine
+    from app import models # noqa: F401, registers the tables on Base.metadata
+
+    Base.metadata.drop_all(bind=engine) # partitions go with their parent table
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    engine.dispose()
+
+
+@contextlib.contextmanager
+def start_server(env: dict | None = None, port: int = 8765, workers: int = 1, args: list | None = None):
+    """Boot app.main:app in a uvicorn subprocess and yield its base URL."""
+    with server_process(env, port, workers, args) as (base_url, _):
+        yield base_url
+
+
+@contextlib.contextmanager
+def server_process(env: dict | None = None, port: int = 8765, workers: int = 1, args: list | None = None):
+    """Like start_server, but yields (base_url, Popen) for benchmarks that inspect the process."""
+    proc_env = os.environ.copy()
+    proc_env.setdefault("DATABASE_URL", database_url())
+    proc_env.setdefault("TEST_MODE", "true")
+    proc_env.setdefault("TEST_PROCESSING_DELAY", "0")
+    # Load generators come from one IP and a handful of merchants; measure the server, not the limiter
+    proc_env.setdefault("RATE_LIMIT_ENABLED", "false")
+    proc_env.update(env or {})
+
+    cmd = args or [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+    ]
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=proc_env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for_health(base_url, proc)
+        yield base_url, proc
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def wait_for_health(base_url: str, proc: subprocess.Popen | None = None, timeout: float = 60) -> float:
+    """Block until /health answers; returns the seconds it took."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode}")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"server at {base_url} did not become healthy")
+
+
+def rss_mb(pid: int) -> dict:
+    """Current and peak resident memory of a process (Linux /proc)."""
+    fields = {}
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            name, _, value = line.partition(":")
+            if name in ("VmRSS", "VmHWM"):
+                fields[name] = round(int(value.split()[0]) / 1024, 1)
+    return {"rss_mb": fields.get("VmRSS"), "peak_rss_mb": fields.get("VmHWM")}
+
+
+def percentiles(samples: list[float]) -> dict:
+    """p50/p95/p99/mean in milliseconds for a list of durations in seconds."""
+    if not samples:
+        return {"count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+async def create_orders(client: httpx.AsyncClient, count: int, amount: int = 50000) -> list[str]:
+    ids = []
+    for i in range(count):
+        res = await client.post("/api/v1/orders", json={"amount": amount, "receipt": f"bench_{i}"}, headers=API_HEADERS)
+        res.raise_for_status()
+        ids.append(res.json()["id"])
+    return ids
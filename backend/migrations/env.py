@@ -0,0 +1,42 @@
+"""Alembic environment: the app's models and DATABASE_URL.
+
+app.bootstrap passes its own connection (holding the setup lock) in
+config.attributes["connection"]; the alembic CLI connects by itself.
+"""
+import re
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+from app.database import DATABASE_URL, Base
+from app import models # noqa: F401 (registers the tables on Base.metadata)
+
+# Monthly partitions and tables parked by migration 0003 (app.partitions.migrate) belong
+# to app.partitions, not to the schema; autogenerate would offer to drop them
+_UNMANAGED_TABLE = re.compile(r"_p\d{4}_\d{2}$|_legacy$")
+
+
+def include_name(name, type_, parent_names):
+    return not (type_ == "table" and _UNMANAGED_TABLE.search(name))
+
+
+def run_migrations(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=Base.metadata,
+        include_name=include_name,
+        render_as_batch=connection.dialect.name == "sqlite", # SQLite can only ALTER by copying the table
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    context.configure(url=DATABASE_URL, target_metadata=Base.metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+elif context.config.attributes.get("connection") is not None:
+    run_migrations(context.config.attributes["connection"])
+else:
+    with create_engine(DATABASE_URL, poolclass=pool.NullPool).connect() as connection:
+        run_migrations(connection)
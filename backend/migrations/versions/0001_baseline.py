@@ -0,0 +1,72 @@
+"""Baseline: the schema the original create_all built, before migrations.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+Databases that predate migrations are stamped at this revision by
+app.bootstrap and brought forward by 0002 and 0003, which only add what is
+missing: deployments ran create_all at several versions before migrations
+existed, and it created new tables but never changed existing ones.
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "merchants",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("email", sa.String(255), nullable=False, unique=True),
+        sa.Column("api_key", sa.String(64), nullable=False, unique=True),
+        sa.Column("api_secret", sa.String(64), nullable=False),
+        sa.Column("webhook_url", sa.Text(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_table(
+        "orders",
+        sa.Column("id", sa.String(64), primary_key=True),
+        sa.Column("merchant_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("merchants.id"), nullable=False),
+        sa.Column("amount", sa.Integer(), nullable=False),
+        sa.Column("currency", sa.String(3), nullable=True),
+        sa.Column("receipt", sa.String(255), nullable=True),
+        sa.Column("notes", sa.JSON(), nullable=True),
+        sa.Column("status", sa.String(20), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.CheckConstraint("amount >= 100", name="check_min_amount"),
+    )
+    op.create_index("ix_orders_merchant_id", "orders", ["merchant_id"])
+    op.create_table(
+        "payments",
+        sa.Column("id", sa.String(64), primary_key=True),
+        sa.Column("order_id", sa.String(64), sa.ForeignKey("orders.id"), nullable=False),
+        sa.Column("merchant_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("merchants.id"), nullable=False),
+        sa.Column("amount", sa.Integer(), nullable=False),
+        sa.Column("currency", sa.String(3), nullable=True),
+        sa.Column("method", sa.String(20), nullable=False),
+        sa.Column("status", sa.String(20), nullable=True),
+        sa.Column("vpa", sa.String(255), nullable=True),
+        sa.Column("card_network", sa.String(20), nullable=True),
+        sa.Column("card_last4", sa.String(4), nullable=True),
+        sa.Column("error_code", sa.String(50), nullable=True),
+        sa.Column("error_description", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_index("ix_payments_order_id", "payments", ["order_id"])
+    op.create_index("ix_payments_status", "payments", ["status"])
+
+
+def downgrade():
+    for table in ("payments", "orders", "merchants"):
+        op.drop_table(table)
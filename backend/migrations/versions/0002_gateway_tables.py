@@ -0,0 +1,91 @@
+"""Idempotency keys, payment stats rollup, webhook outbox and the payment list indexes.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+Databases stamped at 0001 may already have some of these from create_all
+(it added missing tables, never indexes on existing ones), so each table and
+index is created only if it is missing. A newly created rollup table is
+filled from the existing payments.
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+PAYMENT_INDEXES = {
+    "ix_payments_merchant_created": ["merchant_id", "created_at", "id"],
+    "ix_payments_merchant_status_created": ["merchant_id", "status", "created_at", "id"],
+    "ix_payments_merchant_method_created": ["merchant_id", "method", "created_at", "id"],
+    "ix_payments_order_created": ["order_id", "created_at", "id"],
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if "idempotency_keys" not in tables:
+        op.create_table(
+            "idempotency_keys",
+            sa.Column("scope", sa.String(64), primary_key=True),
+            sa.Column("key", sa.String(255), primary_key=True),
+            sa.Column("request_hash", sa.String(64), nullable=False),
+            sa.Column("status_code", sa.Integer(), nullable=True),
+            sa.Column("response_body", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        )
+        op.create_index("ix_idempotency_keys_expires_at", "idempotency_keys", ["expires_at"])
+
+    if "payment_stats_hourly" not in tables:
+        op.create_table(
+            "payment_stats_hourly",
+            sa.Column("merchant_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("merchants.id"), primary_key=True),
+            sa.Column("bucket", sa.DateTime(timezone=True), primary_key=True),
+            sa.Column("status", sa.String(20), primary_key=True),
+            sa.Column("method", sa.String(20), primary_key=True),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.Column("amount", sa.BigInteger(), nullable=False),
+        )
+        from app.stats import rebuild
+
+        rebuild(Session(bind=op.get_bind()))
+
+    if "webhook_events" not in tables:
+        op.create_table(
+            "webhook_events",
+            sa.Column("id", sa.String(64), primary_key=True),
+            sa.Column("merchant_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("merchants.id"), nullable=False),
+            sa.Column("event_type", sa.String(50), nullable=False),
+            sa.Column("payload", sa.JSON(), nullable=False),
+            sa.Column("status", sa.String(20), nullable=True),
+            sa.Column("attempts", sa.Integer(), nullable=True),
+            sa.Column("next_attempt_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("last_error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("delivered_at", sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index("ix_webhook_events_due", "webhook_events", ["status", "next_attempt_at"])
+
+    # Keyset pagination for list_payments; ix_payments_order_created replaces ix_payments_order_id
+    existing = {index["name"] for index in inspector.get_indexes("payments")}
+    for name, columns in PAYMENT_INDEXES.items():
+        if name not in existing:
+            op.create_index(name, "payments", columns)
+    if "ix_payments_order_id" in existing:
+        op.drop_index("ix_payments_order_id", table_name="payments")
+
+
+def downgrade():
+    op.create_index("ix_payments_order_id", "payments", ["order_id"])
+    for name in PAYMENT_INDEXES:
+        op.drop_index(name, table_name="payments")
+    for table in ("webhook_events", "payment_stats_hourly", "idempotency_keys"):
+        op.drop_table(table)
@@ -0,0 +1,108 @@
+"""Monthly RANGE partitions on created_at for orders and payments (Postgres).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+Existing tables become the `<table>_legacy` partition for everything before
+next month (app.partitions.migrate), so no rows are copied, but both tables
+are locked while their primary keys are rebuilt as (id, created_at): apply
+it in a maintenance window. Tables that are already partitioned are left
+alone. On SQLite only payments.order_id loses its foreign key; the tables
+keep their id primary key, and downgrading puts the foreign key back.
+
+On Postgres this revision is irreversible on purpose: undoing it means
+copying every row back into plain tables, and months archived since
+(app.partitions) only exist as CSV files. Restore by hand, per table,
+payments first:
+  1. ALTER TABLE <table> DETACH PARTITION <table>_legacy (the rows from
+     before this migration; absent if the table was empty), or create a
+     plain copy with CREATE TABLE ... (LIKE <table>).
+  2. INSERT INTO it the rows of each <table>_pYYYY_MM partition, and COPY
+     in each archived month from PARTITION_ARCHIVE_DIR/<table>_pYYYY_MM.csv.gz.
+  3. DROP TABLE <table>, rename the copy back to <table>, make (id) its
+     primary key again and recreate the 0002 indexes and the
+     payments.order_id foreign key, then stamp 0002.
+"""
+import sqlalchemy as sa
+from alembic import op
+from alembic.util import CommandError
+from sqlalchemy.dialects import postgresql
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def parents() -> dict[str, sa.Table]:
+    """The partitioned tables as of this revision (later ones change them)."""
+    metadata = sa.MetaData()
+    sa.Table("merchants", metadata, sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True))
+    orders = sa.Table(
+        "orders", metadata,
+        sa.Column("id", sa.String(64), nullable=False),
+        sa.Column("merchant_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("merchants.id"), nullable=False),
+        sa.Column("amount", sa.Integer(), nullable=False),
+        sa.Column("currency", sa.String(3), nullable=True),
+        sa.Column("receipt", sa.String(255), nullable=True),
+        sa.Column("notes", sa.JSON(), nullable=True),
+        sa.Column("status", sa.String(20), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint("id", "created_at"),
+        sa.CheckConstraint("amount >= 100", name="check_min_amount"),
+        sa.Index("ix_orders_merchant_id", "merchant_id"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    payments = sa.Table(
+        "payments", metadata,
+        sa.Column("id", sa.String(64), nullable=False),
+        sa.Column("order_id", sa.String(64), nullable=False),
+        sa.Column("merchant_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("merchants.id"), nullable=False),
+        sa.Column("amount", sa.Integer(), nullable=False),
+        sa.Column("currency", sa.String(3), nullable=True),
+        sa.Column("method", sa.String(20), nullable=False),
+        sa.Column("status", sa.String(20), nullable=True),
+        sa.Column("vpa", sa.String(255), nullable=True),
+        sa.Column("card_network", sa.String(20), nullable=True),
+        sa.Column("card_last4", sa.String(4), nullable=True),
+        sa.Column("error_code", sa.String(50), nullable=True),
+        sa.Column("error_description", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint("id", "created_at"),
+        sa.Index("ix_payments_status", "status"),
+        sa.Index("ix_payments_merchant_created", "merchant_id", "created_at", "id"),
+        sa.Index("ix_payments_merchant_status_created", "merchant_id", "status", "created_at", "id"),
+        sa.Index("ix_payments_merchant_method_created", "merchant_id", "method", "created_at", "id"),
+        sa.Index("ix_payments_order_created", "order_id", "created_at", "id"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    return {"orders": orders, "payments": payments}
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        from app.partitions import migrate
+
+        for table in migrate(bind, parents()):
+            print(f"🗂️ Partitioned {table}")
+        return
+    if any(fk["referred_table"] == "orders" for fk in sa.inspect(bind).get_foreign_keys("payments")):
+        # The baseline's foreign key is unnamed on SQLite; name it so batch mode can drop it
+        naming = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+        with op.batch_alter_table("payments", naming_convention=naming) as batch:
+            batch.drop_constraint("fk_payments_order_id_orders", type_="foreignkey")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        raise CommandError(
+            "0003 cannot be downgraded automatically on Postgres: rebuild plain orders/payments tables from "
+            "<table>_legacy, the <table>_pYYYY_MM partitions and PARTITION_ARCHIVE_DIR as described in "
+            "migrations/versions/0003_partition_orders_payments.py, then stamp 0002"
+        )
+    with op.batch_alter_table("payments") as batch:
+        batch.create_foreign_key("fk_payments_order_id_orders", "orders", ["order_id"], ["id"])
@@ -0,0 +1,51 @@
+"""Order search: notes as JSONB with a GIN index, receipt and keyset indexes.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+On Postgres this rewrites every orders partition (notes json -> jsonb) and
+builds the indexes under an exclusive lock on orders; plan a maintenance
+window for large tables. ix_orders_merchant_created replaces
+ix_orders_merchant_id, which it covers. A database created by create_all
+is stamped 0001 (app.bootstrap) and may already have any of this, so only
+what is missing is changed.
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing = {index["name"] for index in inspector.get_indexes("orders")}
+    if bind.dialect.name == "postgresql":
+        notes = next(column for column in inspector.get_columns("orders") if column["name"] == "notes")
+        if not isinstance(notes["type"], postgresql.JSONB):
+            op.alter_column("orders", "notes", type_=postgresql.JSONB(), postgresql_using="notes::jsonb")
+        if "ix_orders_notes" not in existing:
+            op.create_index("ix_orders_notes", "orders", ["notes"], postgresql_using="gin", postgresql_ops={"notes": "jsonb_path_ops"})
+    if "ix_orders_merchant_created" not in existing:
+        op.create_index("ix_orders_merchant_created", "orders", ["merchant_id", "created_at", "id"])
+    if "ix_orders_merchant_receipt" not in existing:
+        op.create_index(
+            "ix_orders_merchant_receipt", "orders", ["merchant_id", "receipt", "created_at", "id"],
+            postgresql_ops={"receipt": "varchar_pattern_ops"},
+        )
+    if "ix_orders_merchant_id" in existing:
+        op.drop_index("ix_orders_merchant_id", table_name="orders")
+
+
+def downgrade():
+    op.create_index("ix_orders_merchant_id", "orders", ["merchant_id"])
+    op.drop_index("ix_orders_merchant_receipt", table_name="orders")
+    op.drop_index("ix_orders_merchant_created", table_name="orders")
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index("ix_orders_notes", table_name="orders")
+        op.alter_column("orders", "notes", type_=sa.JSON(), postgresql_using="notes::json")
@@ -59,8 +59,13 @@ export default function App() {
       const res = await axios.post(`${API_URL}/payments`, payload);
       const payId = res.data.id;
       
-      // 3. Poll for Status
-      pollStatus(payId);
+      // 3. Wait for the final status (server push, polling as fallback)
+      if (res.data.status === 'success' || res.data.status === 'failed') {
+        setStatus(res.data.status);
+        setLoading(false);
+      } else {
+        watchStatus(payId);
+      }
       
     } catch (err) {
       setStatus("failed");
@@ -68,6 +73,24 @@ export default function App() {
     }
   };
 
+  const watchStatus = (payId) => {
+    if (!window.EventSource) return pollStatus(payId);
+
+    const source = new EventSource(`${API_URL}/payments/${payId}/events`);
+    source.addEventListener('status', (e) => {
+      const data = JSON.parse(e.data);
+      if (data.status === 'success' || data.status === 'failed') {
+        source.close();
+        setStatus(data.status);
+        setLoading(false);
+      }
+    });
+    source.onerror = () => {
+      source.close();
+      pollStatus(payId);
+    };
+  };
+
   const pollStatus = (payId) => {
     const interval = setInterval(async () => {
       try {
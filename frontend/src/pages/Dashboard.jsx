@@ -10,22 +10,23 @@ export default function Dashboard() {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const res = await axios.get('http://localhost:8000/api/v1/payments', {
-          headers: { 'X-Api-Key': 'key_test_abc123', 'X-Api-Secret': 'secret_test_xyz789' }
-        });
-        const payments = Array.isArray(res.data) ? res.data : [];
-        const successPay = payments.filter(p => p.status === 'success');
-        const totalAmount = successPay.reduce((sum, p) => sum + (p.amount || 0), 0);
+        const headers = { 'X-Api-Key': 'key_test_abc123', 'X-Api-Secret': 'secret_test_xyz789' };
+        // Totals come pre-aggregated from the server; only the recent list is fetched as rows
+        const [statsRes, recentRes] = await Promise.all([
+          axios.get('http://localhost:8000/api/v1/stats', { headers }),
+          axios.get('http://localhost:8000/api/v1/payments', { headers, params: { limit: 6 } })
+        ]);
+        const summary = statsRes.data || {};
+        const count = summary.count || 0;
 
         setStats({
-          count: payments.length,
-          total: totalAmount,
-          successRate: payments.length ? Math.round((successPay.length / payments.length) * 100) : 0
+          count,
+          total: summary.volume || 0,
+          successRate: count ? Math.round(((summary.success_count || 0) / count) * 100) : 0
         });
 
-        // recent transactions (most recent first)
-        const recentSorted = payments.slice().sort((a, b) => new Date(b.created_at) - new Date(a.created_at)).slice(0, 6);
-        setRecent(recentSorted);
+        // recent transactions (API returns newest first)
+        setRecent(Array.isArray(recentRes.data) ? recentRes.data : []);
         setLoading(false);
       } catch (err) { console.error(err); }
     };